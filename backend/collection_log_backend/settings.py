@@ -136,6 +136,58 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "log_importer", "static"),  # Ensure Django can find static files
 ]
 
+# TempleOSRS upstream client. ASYNC_COLLECTION_LOG routes collection-log/ to the async view,
+# meant for ASGI deployments (e.g. gunicorn -k uvicorn.workers.UvicornWorker collection_log_backend.asgi).
+TEMPLE_LOG_URL = env('TEMPLE_LOG_URL', default='https://templeosrs.com/api/collection-log/player_collection_log.php')
+TEMPLE_CONNECT_TIMEOUT = env.float('TEMPLE_CONNECT_TIMEOUT', default=5.0)
+TEMPLE_READ_TIMEOUT = env.float('TEMPLE_READ_TIMEOUT', default=10.0)
+# Most async upstream calls in flight per event loop (the async client's connection pool)
+TEMPLE_MAX_CONNECTIONS = env.int('TEMPLE_MAX_CONNECTIONS', default=512)
+ASYNC_COLLECTION_LOG = env.bool('ASYNC_COLLECTION_LOG', default=False)
+
+# TempleOSRS player log cache (seconds / entries)
+TEMPLE_LOG_CACHE_TTL = env.int('TEMPLE_LOG_CACHE_TTL', default=300)
+TEMPLE_LOG_CACHE_STALE_TTL = env.int('TEMPLE_LOG_CACHE_STALE_TTL', default=600)
+TEMPLE_LOG_CACHE_MAX_ENTRIES = env.int('TEMPLE_LOG_CACHE_MAX_ENTRIES', default=512)
+# Ranking sessions (rank-activities state kept per client while it ticks items off)
+RANKING_SESSION_TTL = env.int('RANKING_SESSION_TTL', default=1800)
+RANKING_SESSION_MAX_ENTRIES = env.int('RANKING_SESSION_MAX_ENTRIES', default=1000)
+# Monte Carlo completion simulation: size of the one process pool all requests share
+# (1 simulates in the request's own thread) and request limits
+SIMULATION_WORKERS = env.int('SIMULATION_WORKERS', default=1)
+SIMULATION_MAX_TRIALS = env.int('SIMULATION_MAX_TRIALS', default=20000)
+SIMULATION_MAX_SLOTS = env.int('SIMULATION_MAX_SLOTS', default=200)
+# rank-players/: most usernames per request and logs loaded at once
+BATCH_RANKING_MAX_PLAYERS = env.int('BATCH_RANKING_MAX_PLAYERS', default=200)
+BATCH_RANKING_CONCURRENCY = env.int('BATCH_RANKING_CONCURRENCY', default=8)
+# Longest schedule plan-route/ builds (steps)
+PLAN_MAX_STEPS = env.int('PLAN_MAX_STEPS', default=2000)
+# Stored player snapshots younger than this (seconds) are served without asking TempleOSRS
+PLAYER_SNAPSHOT_FRESH_AGE = env.int('PLAYER_SNAPSHOT_FRESH_AGE', default=300)
+# Directory for the lock files that coalesce player log fetches across worker processes
+# (must be shared by all workers; leave empty to coalesce within each process only).
+TEMPLE_LOG_SHARED_DIR = env('TEMPLE_LOG_SHARED_DIR', default='')
+
+# Browser cache lifetime for /log_importer/items-json/ (revalidated through its ETag)
+ITEMS_JSON_MAX_AGE = env.int('ITEMS_JSON_MAX_AGE', default=86400)
+
+# Directory for the memory-mapped activity tables shared by all worker processes
+# (one per activities data version; leave empty to build them in each process instead)
+ACTIVITY_TABLE_DIR = env('ACTIVITY_TABLE_DIR', default=os.path.join(BASE_DIR, '.activity_tables'))
+
+# JSON encoder for log_importer responses: auto (orjson when installed), orjson, stdlib,
+# or the dotted path of a dumps(data) -> bytes callable
+JSON_ENCODER = env('JSON_ENCODER', default='auto')
+# Stream collection logs out as they are encoded instead of caching each snapshot's
+# encoded sections (lower peak memory per request, no Content-Length)
+STREAM_LOG_RESPONSES = env.bool('STREAM_LOG_RESPONSES', default=False)
+JSON_STREAM_CHUNK_SIZE = env.int('JSON_STREAM_CHUNK_SIZE', default=16384)
+# Encoded sections kept per process, by snapshot hash
+ENCODED_LOG_CACHE_SIZE = env.int('ENCODED_LOG_CACHE_SIZE', default=256)
+
+# How often (seconds) each process re-reads dataset versions bumped by the import commands
+DATA_VERSION_CHECK_INTERVAL = env.float('DATA_VERSION_CHECK_INTERVAL', default=5.0)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -0,0 +1,115 @@
+import threading
+import time
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from .models import CompletionRate, ActivityMap, DataVersion
+from .static_data import EncodedPayload
+
+ACTIVITIES = "activities"
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def data_version(key):
+    """
+    Current version number for a dataset. The DB is only consulted once every
+    DATA_VERSION_CHECK_INTERVAL seconds per process; in between this is a dict read.
+    """
+    now = time.monotonic()
+    cached = _versions.get(key)
+    if cached is not None and now - cached[1] < settings.DATA_VERSION_CHECK_INTERVAL:
+        return cached[0]
+    with _versions_lock:
+        version = DataVersion.objects.filter(key=key).values_list("version", flat=True).first() or 0
+        _versions[key] = (version, now)
+    return version
+
+
+def bump_data_version(key, source_hash=None):
+    """
+    Increments a dataset's version so every process rebuilds what it derived from it.
+    `source_hash` optionally records the hash of the files the dataset was imported from.
+    """
+    changes = {"version": F("version") + 1, "updated_at": timezone.now()}
+    if source_hash is not None:
+        changes["source_hash"] = source_hash
+    if not DataVersion.objects.filter(key=key).update(**changes):
+        DataVersion.objects.get_or_create(key=key, defaults={"version": 1, "source_hash": source_hash or ""})
+    with _versions_lock:
+        _versions.pop(key, None)
+    return data_version(key)
+
+
+def data_source_hash(key):
+    """ The source_hash recorded by the last bump_data_version for a dataset ("" if none). """
+    return DataVersion.objects.filter(key=key).values_list("source_hash", flat=True).first() or ""
+
+
+class VersionedValue:
+    """ A value derived from a dataset, rebuilt whenever the dataset's version moves. """
+
+    def __init__(self, key, build):
+        self.key = key
+        self.build = build
+        self.version = None
+        self.value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        version = data_version(self.key)
+        if self.version != version:
+            with self._lock:
+                if self.version != version:
+                    self.value = self.build(version)
+                    self.version = version
+        return self.value
+
+    def reset(self):
+        with self._lock:
+            self.version = None
+            self.value = None
+
+
+def build_activities_data():
+    """
+    The get_activities_data rows, built from two ordered scans instead of one
+    ActivityMap query per activity.
+    """
+    maps_by_activity = {}
+    for m in ActivityMap.objects.order_by("sequence", "id").values(
+            "completion_rate_id", "item_id", "item_name", "drop_rate_attempts", "neither_inverse"):
+        maps_by_activity.setdefault(m.pop("completion_rate_id"), []).append(m)
+
+    data = []
+    for activity in CompletionRate.objects.order_by("id").values(
+            "id", "activity_index", "activity_name", "completions_per_hour_main", "completions_per_hour_iron"):
+        data.append({
+            "activity_index": activity["activity_index"],
+            "activity_name": activity["activity_name"],
+            "completions_per_hour_main": activity["completions_per_hour_main"],
+            "completions_per_hour_iron": activity["completions_per_hour_iron"],
+            "maps": maps_by_activity.get(activity["id"], [])
+        })
+    return data
+
+
+def _build_activities_payload(version):
+    return EncodedPayload({"status": "success", "data": build_activities_data()}, tag=f"activities-v{version}")
+
+
+def _build_completion_rates_payload(version):
+    completion_rates = list(CompletionRate.objects.values(
+        "activity_name",
+        "completions_per_hour_main",
+        "completions_per_hour_iron",
+        "extra_time_to_first_completion",
+        "notes",
+        "verification_source"
+    ))
+    return EncodedPayload({"status": "success", "data": completion_rates}, tag=f"completion-rates-v{version}")
+
+
+activities_payload = VersionedValue(ACTIVITIES, _build_activities_payload)
+completion_rates_payload = VersionedValue(ACTIVITIES, _build_completion_rates_payload)
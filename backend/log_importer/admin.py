@@ -1,9 +1,11 @@
 from django.contrib import admin
-from .models import Tab, LogEntry, Item, KillCount, CompletionRate, ActivityMap
+from .models import Player, Tab, LogEntry, Item, KillCount, CompletionRate, ActivityMap, DataVersion
 
+admin.site.register(Player)
 admin.site.register(Tab)
 admin.site.register(LogEntry)
 admin.site.register(Item)
 admin.site.register(KillCount)
 admin.site.register(CompletionRate)
 admin.site.register(ActivityMap)
+admin.site.register(DataVersion)
@@ -1,6 +1,17 @@
+import logging
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
 
 class LogImporterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'log_importer'
+
+    def ready(self):
+        # Build the sections.json index once per process; it reloads itself if the file changes.
+        from .static_data import sections_index
+        try:
+            sections_index.load()
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load sections.json at startup: %s", e)
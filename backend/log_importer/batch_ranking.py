@@ -0,0 +1,126 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from django.db import connections
+from .obtained import ObtainedSet, slot_map
+from .ranking import _resolve_rates, activity_arrays, activity_result, next_fastest_item, row_obtained_mask, score_players
+from .snapshots import load_snapshot, normalize_username, with_snapshot_meta
+from .upstream import UPSTREAM_UNAVAILABLE, UPSTREAM_UNAVAILABLE_MESSAGE, UpstreamError, player_log_cache
+
+logger = logging.getLogger(__name__)
+
+
+def load_member(username):
+    """
+    (player_log, cache_status) for one player through the player log cache, so
+    cached logs, fresh snapshots and in-flight fetches are all reused. Falls back to
+    the stored snapshot when TempleOSRS is unavailable, like collection-log/.
+    """
+    try:
+        player_log, cache_status, _ = player_log_cache.get(username)
+        return player_log, cache_status
+    except UpstreamError as e:
+        if e.status_code < 500:
+            raise
+        error = e
+    except UPSTREAM_UNAVAILABLE as e:
+        error = e
+    snapshot = load_snapshot(username)
+    if snapshot is None:
+        raise error
+    return with_snapshot_meta(*snapshot), "snapshot"
+
+
+def _load_member_thread(username, slots):
+    """ load_member reduced to what scoring needs: (obtained, accountType, cache_status). """
+    try:
+        player_log, cache_status = load_member(username)
+        return player_obtained_set(slots, player_log), player_log.get("accountType"), cache_status
+    finally:
+        # Pool threads are not request threads, so Django will not close their connections
+        connections.close_all()
+
+
+def member_error(username, error):
+    """
+    The error entry for a player whose log could not be loaded. Upstream failures get
+    the messages collection-log/ gives; anything else is logged and reported generically.
+    """
+    if isinstance(error, UpstreamError):
+        message = str(error)
+    elif isinstance(error, UPSTREAM_UNAVAILABLE):
+        message = UPSTREAM_UNAVAILABLE_MESSAGE
+    else:
+        logger.error("Could not load the collection log of %s", username, exc_info=error)
+        message = "Could not load this player's collection log"
+    return {"username": username, "status": "error", "message": message}
+
+
+def player_obtained_set(slots, player_log):
+    if player_log.get("obtained"):
+        return ObtainedSet.from_json(slots, player_log["obtained"])
+    return ObtainedSet.from_player_log(slots, player_log)
+
+
+def rank_players(usernames, is_iron=None, user_completion_rates=None, disabled_activities=(), top=10, concurrency=8):
+    """
+    Yields a result dict per player as their logs come in: {"username", "status",
+    "data": top activities, "next_fastest_item", "cache"}, or an error entry.
+
+    Logs are loaded on a pool of `concurrency` threads. Whatever has finished
+    whenever the pool is checked is scored together in one score_players pass over
+    the shared ActivityArrays. is_iron=None takes each player's account type
+    (accountType "IRONMAN", as the frontend does). Disabled activities sort last.
+    """
+    arrays = activity_arrays.get()
+    slots = slot_map.get()
+    main_rates, main_extra = _resolve_rates(arrays, False, user_completion_rates)
+    iron_rates, iron_extra = _resolve_rates(arrays, True, user_completion_rates)
+    disabled = np.array([name in disabled_activities for name in arrays.activity_names], dtype=bool)
+
+    def score(batch):
+        masks = np.stack([row_obtained_mask(arrays, obtained) for _, obtained, _, _ in batch])
+        iron = np.array([is_iron if is_iron is not None else account_type == "IRONMAN"
+                         for _, _, account_type, _ in batch])[:, None]
+        rates = np.where(iron, iron_rates, main_rates)
+        extra = np.where(iron, iron_extra, main_extra)
+        days, status, fastest_row = score_players(arrays, masks, rates, extra)
+        # rank_activities' order: by time, non-numeric last, ties by activity order
+        keys = np.where((status == 0) & ~disabled, days, np.inf)
+        order = np.argsort(keys, axis=1, kind="stable")[:, :top]
+        for p, (username, _, _, cache_status) in enumerate(batch):
+            ranked = [
+                activity_result(arrays, i, status[p, i], days[p, i], fastest_row[p, i], rates[p, i], extra[p, i])
+                for i in order[p]
+            ]
+            yield {
+                "username": username,
+                "status": "success",
+                "data": ranked,
+                "next_fastest_item": next_fastest_item(ranked),
+                "cache": cache_status,
+            }
+
+    # One entry per player, however their name is spelled in the request
+    unique = {}
+    for username in usernames:
+        unique.setdefault(normalize_username(username), username)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        pending = {pool.submit(_load_member_thread, username, slots): username for username in unique.values()}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                batch = []
+                for future in done:
+                    username = pending.pop(future)
+                    try:
+                        batch.append((username, *future.result()))
+                    except Exception as e:
+                        yield member_error(username, e)
+                if batch:
+                    yield from score(batch)
+        finally:
+            # The client went away: don't start fetches nobody will read
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,279 @@
+from functools import lru_cache
+import numpy as np
+from .activity_data import ACTIVITIES, VersionedValue
+from .ranking import _resolve_rates, activity_arrays, row_obtained_mask
+from .simulation import SimulationTables
+
+# Activities with at most this many random slots (and no exact ones left) get an
+# exact table over every obtained subset; larger ones are integrated numerically.
+DP_MAX_ITEMS = 15
+QUADRATURE_POINTS = 2049
+
+
+class ActivityModel:
+    """
+    The ActivityMap rows of one activity, split the way the completion engine uses them.
+
+    Random slots drop at 1 / drop_rate_attempts per completion. Exclusive ("neither")
+    slots share a drop table and independent ones roll on their own, but both are
+    modeled as independent Poisson arrivals in completions, which is exact for a
+    shared table (by Wald's identity, expected completions equal the expected
+    Poissonized time) and keeps multi-roll activities whose rates sum past 1 defined.
+    Exact slots take a fixed number of completions: exact-only ones one after another,
+    exact-and-independent ones alongside each other. A requires_previous slot can only
+    drop once the slot before it (of the same kind) is obtained. Random slots with no
+    drop rate cannot be scheduled and are only counted.
+
+    The sheet's E&I, E and I columns only repeat drop_rate_attempts per class (exact
+    and independent, exact only, independent only; import_completion_rates checks
+    they agree), so they are not read here. Mains and irons share one model: the
+    sheet has no per-account drop rates, only per-account completions per hour.
+    """
+
+    def __init__(self, arrays, i):
+        self.index = i
+        start, end = int(arrays.row_offsets[i]), int(arrays.row_offsets[i + 1])
+        rows = range(start, end)
+        drop = arrays.drop_rate_attempts
+
+        self.random_rows, self.rates, self.pred = [], [], []
+        self.exact_rows, self.exact_attempts, self.exact_parallel, self.exact_pred = [], [], [], []
+        self.unknown_rows = []
+        last_random = last_exact = None
+        for row in rows:
+            follows = bool(arrays.requires_previous[row])
+            if arrays.exact[row]:
+                self.exact_pred.append(last_exact if follows and last_exact is not None else -1)
+                last_exact = len(self.exact_rows)
+                self.exact_rows.append(row)
+                self.exact_attempts.append(max(float(drop[row]), 0.0))
+                self.exact_parallel.append(bool(arrays.independent[row]))
+                last_random = None
+            elif drop[row] > 0:
+                self.pred.append(last_random if follows and last_random is not None else -1)
+                last_random = len(self.random_rows)
+                self.random_rows.append(row)
+                self.rates.append(1.0 / float(drop[row]))
+                last_exact = None
+            else:
+                self.unknown_rows.append(row)
+                last_random = last_exact = None
+
+        self.random_rows = np.array(self.random_rows, dtype=np.int64)
+        self.rates = np.array(self.rates, dtype=np.float64)
+        self.pred = np.array(self.pred, dtype=np.int64)
+        self.exact_rows = np.array(self.exact_rows, dtype=np.int64)
+        self.exact_attempts = np.array(self.exact_attempts, dtype=np.float64)
+        self.exact_parallel = np.array(self.exact_parallel, dtype=bool)
+        self.exact_pred = np.array(self.exact_pred, dtype=np.int64)
+        self.unknown_rows = np.array(self.unknown_rows, dtype=np.int64)
+
+    def exact_completions(self, obtained_mask):
+        """ Completions the missing exact slots still need. """
+        missing = ~obtained_mask[self.exact_rows]
+        attempts = np.where(missing, self.exact_attempts, 0.0)
+        sequential = attempts[~self.exact_parallel].sum()
+        # exact-and-independent chains run side by side, each as long as its missing links
+        chains = {}
+        for k in np.flatnonzero(self.exact_parallel):
+            head = k
+            while self.exact_pred[head] >= 0 and self.exact_parallel[self.exact_pred[head]]:
+                head = self.exact_pred[head]
+            chains[head] = chains.get(head, 0.0) + attempts[k]
+        return max(sequential, max(chains.values(), default=0.0))
+
+    def next_slot(self, obtained_mask, progress=0.0):
+        """
+        The race to the next missing slot: the random slots that can drop now race as
+        one Poisson stream at their summed rate, cut short by the next exact slot,
+        `progress` completions of which are already done. Returns (expected
+        completions, row, probability) with the row most likely to win the race and
+        its chance of doing so, or None if no slot can drop.
+        """
+        missing = ~obtained_mask[self.random_rows]
+        unlocked = np.where(self.pred >= 0, ~missing[np.maximum(self.pred, 0)], True)
+        racing = missing & unlocked
+        total_rate = float(self.rates[racing].sum())
+
+        exact_missing = ~obtained_mask[self.exact_rows]
+        ready = exact_missing & self.exact_parallel
+        ready &= np.where(self.exact_pred >= 0, ~exact_missing[np.maximum(self.exact_pred, 0)], True)
+        # Exact-only slots come one after another, so only the first missing one is due
+        sequential = np.flatnonzero(exact_missing & ~self.exact_parallel)[:1]
+        due = np.concatenate([np.flatnonzero(ready), sequential])
+        if len(due):
+            first_due = due[np.argmin(self.exact_attempts[due])]
+            deadline = max(float(self.exact_attempts[first_due]) - progress, 0.0)
+            # Chance that no random slot drops before the exact one comes in
+            exact_first = float(np.exp(-total_rate * deadline))
+        elif total_rate > 0:
+            deadline, exact_first = None, 0.0
+        else:
+            return None
+
+        if total_rate > 0:
+            completions = 1.0 / total_rate if deadline is None else float(-np.expm1(-total_rate * deadline)) / total_rate
+            k = int(np.argmax(np.where(racing, self.rates, -1.0)))
+            random_first = (1.0 - exact_first) * float(self.rates[k]) / total_rate
+            if random_first >= exact_first:
+                return completions, int(self.random_rows[k]), random_first
+        else:
+            completions = deadline
+        return completions, int(self.exact_rows[first_due]), exact_first
+
+    def expected_completions(self, obtained_mask):
+        """ Expected completions until every schedulable slot is obtained. """
+        exact = self.exact_completions(obtained_mask)
+        obtained = obtained_mask[self.random_rows]
+        if obtained.all():
+            return exact
+        if exact == 0 and len(self.random_rows) <= DP_MAX_ITEMS:
+            bits = int(np.dot(obtained.astype(np.int64), 1 << np.arange(len(obtained), dtype=np.int64)))
+            return float(subset_table(self)[bits])
+        return integrate_completions(self, obtained.tobytes(), exact)
+
+
+@lru_cache(maxsize=512)
+def subset_table(model):
+    """
+    Expected completions from every obtained subset of the activity's random slots,
+    by DP over bitmasks: E[s] = (1 + sum of r_j * E[s | j]) / sum of r_j over the
+    slots j that can drop in s. Filled a popcount layer at a time, each layer in one
+    vectorized step, so one table answers every player for this activity.
+    """
+    n = len(model.rates)
+    masks = np.arange(1 << n, dtype=np.int64)
+    have = (masks[:, None] >> np.arange(n)) & 1 == 1
+    unlocked = np.where(model.pred >= 0, have[:, np.maximum(model.pred, 0)], True)
+    available = ~have & unlocked
+    total_rate = available @ model.rates
+    popcount = have.sum(axis=1)
+
+    table = np.zeros(1 << n, dtype=np.float64)
+    for k in range(n - 1, -1, -1):
+        layer = masks[popcount == k]
+        successors = table[layer[:, None] | (1 << np.arange(n))]
+        flow = (available[layer] * model.rates * successors).sum(axis=1)
+        table[layer] = (1.0 + flow) / total_rate[layer]
+    return table
+
+
+def _expm(blocks):
+    """ Matrix exponential of a stack of small matrices by scaling and squaring. """
+    norm = np.abs(blocks).sum(axis=-1).max()
+    squarings = max(0, int(np.ceil(np.log2(norm))) + 1) if norm > 0 else 0
+    scaled = blocks / (1 << squarings)
+    result = np.broadcast_to(np.eye(blocks.shape[-1]), blocks.shape).copy()
+    term = result.copy()
+    for k in range(1, 18):
+        term = term @ scaled / k
+        result = result + term
+    for _ in range(squarings):
+        result = result @ result
+    return result
+
+
+def chain_cdf(rates, t):
+    """ P(a requires_previous chain with these per-completion rates is done by completion t). """
+    m = len(rates)
+    generator = np.diag(-np.asarray(rates)) + np.diag(np.asarray(rates[:-1]), k=1)
+    survival = _expm(generator[None] * t[:, None, None])[:, 0, :].sum(axis=1)
+    return np.clip(1.0 - survival, 0.0, 1.0) if m else np.ones_like(t)
+
+
+@lru_cache(maxsize=4096)
+def integrate_completions(model, obtained_key, exact):
+    """
+    E[max(completion time of the missing random slots, exact)], integrating the
+    survival 1 - prod(CDF) with Simpson's rule on a geometric grid. Slots are independent Poisson
+    arrivals, so the CDF is a product over single slots (1 - exp(-r t)) and over
+    requires_previous chains (sums of exponentials).
+    """
+    obtained = np.frombuffer(obtained_key, dtype=bool)
+    missing = np.flatnonzero(~obtained)
+    members = set(missing.tolist())
+    followers = {int(p): q for q, p in enumerate(model.pred) if p >= 0}
+    chains = []
+    for j in members:
+        if model.pred[j] >= 0 and model.pred[j] in members:
+            continue  # not the head of its missing chain
+        chain, k = [j], j
+        while followers.get(k) in members:
+            k = followers[k]
+            chain.append(k)
+        chains.append(model.rates[chain])
+
+    singles = np.array([rates[0] for rates in chains if len(rates) == 1])
+    linked = [rates for rates in chains if len(rates) > 1]
+    slowest = max(float(np.sum(1.0 / rates)) for rates in chains)
+    start = exact if exact > 0 else 1e-6 / float(max(rates.max() for rates in chains))
+    t = np.geomspace(start, max(start, exact) + 60 * slowest, QUADRATURE_POINTS)
+
+    with np.errstate(divide="ignore"):
+        log_cdf = np.log1p(-np.exp(-np.outer(t, singles))).sum(axis=1) if len(singles) else np.zeros_like(t)
+        for rates in linked:
+            log_cdf += np.log(chain_cdf(rates, t))
+    survival = 1.0 - np.exp(log_cdf)
+    # Simpson's rule in u = ln t, where the grid is uniform: dt = t du
+    integrand = survival * t
+    step = np.log(t[1] / t[0])
+    area = float(step / 3 * (integrand[0] + integrand[-1] + 4 * integrand[1:-1:2].sum() + 2 * integrand[2:-1:2].sum()))
+    # Below `start` nothing has dropped yet (or the exact slots are not done), so survival is 1
+    return start + area
+
+
+def _build_activity_models(version):
+    # The cached tables are keyed by model, so the outgoing models' entries would only
+    # linger until LRU pressure pushed them out
+    subset_table.cache_clear()
+    integrate_completions.cache_clear()
+    arrays = activity_arrays.get()
+    return [ActivityModel(arrays, i) for i in range(arrays.activity_count)]
+
+
+activity_models = VersionedValue(ACTIVITIES, _build_activity_models)
+
+
+def expected_completion_times(completed_items, is_iron=False, user_completion_rates=None):
+    """
+    Expected completions and hours to finish every missing slot of each activity, for
+    an ObtainedSet or a list of obtained item ids. Rows come fastest first; finished
+    activities and ones without a usable rate come last.
+    """
+    arrays = activity_arrays.get()
+    models = activity_models.get()
+    obtained_mask = row_obtained_mask(arrays, completed_items)
+    rates, extra = _resolve_rates(arrays, is_iron, user_completion_rates)
+
+    results = []
+    for model in models:
+        i = model.index
+        rows = slice(arrays.row_offsets[i], arrays.row_offsets[i + 1])
+        remaining = int((~obtained_mask[rows]).sum())
+        unknown = int((~obtained_mask[model.unknown_rows]).sum())
+        completions = model.expected_completions(obtained_mask) if remaining > unknown else 0.0
+        if completions == 0:
+            hours = 0.0
+        elif rates[i] > 0:
+            hours = float(completions / rates[i] + extra[i])
+        else:
+            hours = None
+        results.append({
+            "activity_name": arrays.activity_names[i],
+            "remaining_slots": remaining,
+            "unknown_slots": unknown,
+            "expected_completions": float(completions),
+            "expected_hours": hours,
+        })
+
+    results.sort(key=lambda r: (not r["expected_hours"], r["expected_hours"] or 0.0))
+    return results
+
+
+def simulation_tables(completed_items, is_iron=False, user_completion_rates=None, disabled=()):
+    """ SimulationTables for a player, with the same inputs as expected_completion_times. """
+    arrays = activity_arrays.get()
+    rates, extra = _resolve_rates(arrays, is_iron, user_completion_rates)
+    return SimulationTables.build(
+        arrays, activity_models.get(), row_obtained_mask(arrays, completed_items), rates, extra, disabled
+    )
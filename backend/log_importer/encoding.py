@@ -0,0 +1,151 @@
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is always available
+    orjson = None
+
+_django_encoder = DjangoJSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+
+def stdlib_dumps(data):
+    return _django_encoder.encode(data).encode("utf-8")
+
+
+def orjson_dumps(data):
+    # Datetimes, Decimals, lazy strings etc. go through Django's encoder, so they come
+    # out the way JsonResponse has always written them
+    return orjson.dumps(
+        data, default=_django_encoder.default,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME,
+    )
+
+
+ENCODERS = {"stdlib": stdlib_dumps}
+if orjson is not None:
+    ENCODERS["orjson"] = orjson_dumps
+
+
+def get_encoder(name):
+    """
+    A `dumps(data) -> bytes` by JSON_ENCODER name: "auto" (orjson when installed,
+    else stdlib), "orjson", "stdlib", or the dotted path of any such callable.
+    """
+    if name == "auto":
+        return ENCODERS.get("orjson", stdlib_dumps)
+    if name in ENCODERS:
+        return ENCODERS[name]
+    if name == "orjson":
+        raise ImproperlyConfigured("JSON_ENCODER is orjson, but orjson is not installed")
+    return import_string(name)
+
+
+_dumps = get_encoder(settings.JSON_ENCODER)
+
+
+def dumps(data):
+    """
+    `data` as compact UTF-8 JSON bytes through the configured encoder. With orjson,
+    NaN and infinities come out as null rather than the stdlib's NaN/Infinity
+    (which are not JSON anyway).
+    """
+    return _dumps(data)
+
+
+class Encoded(bytes):
+    """ Already encoded JSON, written out as is wherever iter_json() meets it. """
+
+
+def iter_json(data, depth=1):
+    """
+    Encodes `data` piecewise: dicts and lists in the top `depth` levels are written
+    member by member, anything below in one dumps() call. Encoded values within
+    those levels are copied verbatim. Yields many small chunks; see chunked().
+    """
+    if isinstance(data, Encoded):
+        yield data
+    elif depth > 0 and isinstance(data, dict) and data:
+        separator = b"{"
+        for key, value in data.items():
+            yield separator + dumps(key if isinstance(key, str) else str(key)) + b":"
+            yield from iter_json(value, depth - 1)
+            separator = b","
+        yield b"}"
+    elif depth > 0 and isinstance(data, (list, tuple)) and data:
+        separator = b"["
+        for value in data:
+            yield separator
+            yield from iter_json(value, depth - 1)
+            separator = b","
+        yield b"]"
+    else:
+        yield dumps(data)
+
+
+def chunked(chunks, size):
+    """ Joins a stream of small chunks into pieces of at least `size` bytes. """
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+class JsonResponse(HttpResponse):
+    """
+    django.http.JsonResponse through the configured encoder. With `depth`, `data`
+    may hold Encoded values (e.g. cached sections) up to that many levels down.
+    """
+
+    def __init__(self, data, depth=0, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        content = dumps(data) if depth == 0 else b"".join(iter_json(data, depth))
+        super().__init__(content=content, **kwargs)
+
+
+class StreamingJsonResponse(StreamingHttpResponse):
+    """
+    A JSON document sent as it is encoded, `depth` levels piecewise (see iter_json)
+    in pieces of about JSON_STREAM_CHUNK_SIZE bytes, so a large section tree is never
+    held as one encoded body.
+    """
+
+    def __init__(self, data, depth=3, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(chunked(iter_json(data, depth), settings.JSON_STREAM_CHUNK_SIZE), **kwargs)
+
+
+class EncodedCache:
+    """
+    Encoded bytes of immutable values by key (e.g. a snapshot's sections by its
+    content hash), least recently used evicted past `max_entries`.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, value):
+        """ The Encoded form of `value`, which must be the same whenever `key` is. """
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                return encoded
+        encoded = Encoded(dumps(value))
+        with self._lock:
+            self._entries[key] = encoded
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return encoded
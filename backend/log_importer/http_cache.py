@@ -0,0 +1,204 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import requests
+from django.conf import settings
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+CACHEABLE_STATUSES = frozenset([200, 203, 300, 301, 404, 410])
+
+
+class OfflineCacheMiss(requests.ConnectionError):
+    """ Raised in offline mode when a request has no cached response to replay. """
+
+
+class HttpCache:
+    """
+    SQLite-backed store of GET responses keyed by the fully prepared URL (params included).
+
+    Each entry keeps the status, final URL (after redirects), headers and body. Streamed
+    requests only store status and headers, since callers only look at the status.
+    Once the total body size passes `max_size` bytes, the least recently used entries
+    are evicted.
+    """
+
+    def __init__(self, path, max_size=200 * 1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " status INTEGER NOT NULL,"
+            " final_url TEXT NOT NULL,"
+            " headers TEXT NOT NULL,"
+            " body BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._stores_since_evict = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, final_url, headers, body, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        status, final_url, headers, body, fetched_at = row
+        return {
+            "status": status,
+            "final_url": final_url,
+            "headers": json.loads(headers),
+            "body": bytes(body),
+            "fetched_at": fetched_at,
+        }
+
+    def put(self, key, status, final_url, headers, body):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, status, final_url, json.dumps(dict(headers)), body, len(body), now, now)
+            )
+            self._conn.commit()
+            self._stores_since_evict += 1
+            if self._stores_since_evict >= 50:
+                self._evict()
+
+    def touch(self, key):
+        """ Marks an entry as freshly validated (after a 304). """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+            self._conn.commit()
+
+    def _evict(self):
+        self._stores_since_evict = 0
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_size:
+            return
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            doomed.append((key,))
+            freed += size
+            if total - freed <= self.max_size:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._conn.close()
+
+
+class CachedSession:
+    """
+    Session-like wrapper that answers GETs from an HttpCache.
+
+    Entries younger than `max_age` seconds are replayed without touching the network.
+    Older ones are revalidated with If-None-Match / If-Modified-Since when the server
+    sent an ETag or Last-Modified, and refetched otherwise. With `offline=True` every
+    request is replayed from the cache regardless of age, and a miss raises
+    OfflineCacheMiss.
+    """
+
+    def __init__(self, session, cache, max_age=7 * 24 * 3600, offline=False):
+        self.session = session
+        self.cache = cache
+        self.max_age = max_age
+        self.offline = offline
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def get(self, url, params=None, headers=None, stream=False, **kwargs):
+        key = requests.Request("GET", url, params=params).prepare().url
+        entry = self.cache.get(key)
+
+        if self.offline:
+            if entry is None:
+                raise OfflineCacheMiss(f"Not in cache (offline): {key}")
+            self.hits += 1
+            return self._replay(entry)
+
+        if entry is not None and time.time() - entry["fetched_at"] < self.max_age:
+            self.hits += 1
+            return self._replay(entry)
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            cached_headers = CaseInsensitiveDict(entry["headers"])
+            if cached_headers.get("ETag"):
+                request_headers["If-None-Match"] = cached_headers["ETag"]
+            if cached_headers.get("Last-Modified"):
+                request_headers["If-Modified-Since"] = cached_headers["Last-Modified"]
+
+        response = self.session.get(url, params=params, headers=request_headers, stream=stream, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            response.close()
+            self.cache.touch(key)
+            self.revalidated += 1
+            return self._replay(entry)
+
+        self.misses += 1
+        if response.status_code in CACHEABLE_STATUSES:
+            body = b"" if stream else response.content
+            self.cache.put(key, response.status_code, response.url, response.headers, body)
+        return response
+
+    def _replay(self, entry):
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.url = entry["final_url"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry["body"]
+        response._content_consumed = True
+        response.from_cache = True
+        return response
+
+    def stats(self):
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
+
+    def close(self):
+        self.session.close()
+        self.cache.close()
+
+
+def add_cache_arguments(parser, max_age=7 * 24 * 3600):
+    """
+    The cache options shared by the scraping management commands. `max_age` is the
+    default --cache-max-age; 0 revalidates every request, so the cache only serves
+    304s and --offline replays.
+    """
+    parser.add_argument("--cache-path", default=None,
+                        help="SQLite file for the HTTP response cache (default: backend/.http_cache.sqlite3).")
+    parser.add_argument("--cache-max-age", type=float, default=max_age,
+                        help=f"Seconds a cached response is replayed before being revalidated (default {max_age:g}).")
+    parser.add_argument("--cache-max-size", type=int, default=200,
+                        help="Cache size limit in MB; least recently used entries are evicted (default 200).")
+    parser.add_argument("--offline", action="store_true",
+                        help="Replay every request from the cache and never touch the network.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the HTTP response cache entirely.")
+
+
+def wrap_with_cache(session, options):
+    """ Wraps a session in a CachedSession according to add_cache_arguments options. """
+    if options.get("no_cache"):
+        return session
+    default_path = os.path.join(settings.BASE_DIR, ".http_cache.sqlite3")
+    cache = HttpCache(options.get("cache_path") or default_path, max_size=options["cache_max_size"] * 1024 * 1024)
+    return CachedSession(session, cache, max_age=options["cache_max_age"], offline=options.get("offline", False))
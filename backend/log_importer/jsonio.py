@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+
+
+def atomic_write_json(path, data, indent=2):
+    """
+    Writes JSON to a temp file in the same directory, fsyncs it and renames it over
+    `path`, so readers (and a crash mid-write) only ever see the old or the new file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JsonJournal:
+    """
+    Append-only log of per-key updates to a JSON object file.
+
+    Each line is {"key": ..., "changes": {...}}. replay() applies the lines to the
+    loaded document (ignoring a torn last line), and compact() writes the merged
+    document atomically and then truncates the journal.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self.pending = 0
+
+    def replay(self, data):
+        """ Applies journaled changes to `data` in place and returns how many were applied. """
+        if not os.path.exists(self.path):
+            return 0
+        applied = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # a crash mid-append leaves at most one partial line at the end
+                if entry["key"] in data:
+                    data[entry["key"]].update(entry["changes"])
+                    applied += 1
+        self.pending = applied
+        return applied
+
+    def append(self, key, changes):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps({"key": key, "changes": changes}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.pending += 1
+
+    def compact(self, target_path, data):
+        """ Writes `data` to target_path atomically, then empties the journal. """
+        atomic_write_json(target_path, data)
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.pending = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
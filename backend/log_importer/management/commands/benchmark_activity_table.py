@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+
+
+def _memory():
+    """ (RssAnon, RssFile) of this process in KB from /proc, or (maxrss, 0) elsewhere. """
+    try:
+        with open("/proc/self/status", "r") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return int(fields["RssAnon"].split()[0]), int(fields["RssFile"].split()[0])
+    except (OSError, KeyError):
+        import resource  # not on Windows, which has no /proc either
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 0
+
+
+def _worker_memory(label, path):
+    """ Memory a fresh process gains by building the table one way (run in a spawned child). """
+    import django
+    django.setup()
+    import numpy as np
+    from log_importer.ranking import ActivityArrays
+    from log_importer.models import ActivityMap
+
+    before = _memory()
+    if label == "orm instances":
+        table = list(ActivityMap.objects.select_related("completion_rate"))
+    elif label == "orm values":
+        table = ActivityArrays.from_db()
+    else:
+        table = ActivityArrays.load(path)
+        # Touch every column, as scoring does
+        sum(float(np.asarray(getattr(table, name), dtype=np.float64).sum()) for name in ("item_ids", "drop_rate_attempts"))
+    after = _memory()
+    del table
+    return after[0] - before[0], after[1] - before[1]
+
+
+class Command(BaseCommand):
+    help = """
+    Compare ways a worker can get the activity tables: ActivityMap model instances
+    (select_related, as the import does), ActivityArrays.from_db() over .values(),
+    and ActivityArrays.load() memory-mapping the saved table.
+
+    Reports the time to construct each (best of --runs), the Python heap it keeps
+    (tracemalloc), and the private and file-backed RSS a fresh spawned process
+    gains. File-backed pages of the mapped table are shared by every worker.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Runs per path (default 5).")
+
+    def handle(self, *args, **options):
+        from log_importer.activity_data import ACTIVITIES, data_version
+        from log_importer.models import ActivityMap
+        from log_importer.ranking import ActivityArrays, activity_table_path, load_activity_arrays
+
+        version = data_version(ACTIVITIES)
+        path = activity_table_path(version)
+        if path is None:  # ACTIVITY_TABLE_DIR is unset: benchmark a throwaway copy
+            path = os.path.join(tempfile.mkdtemp(), "table")
+            ActivityArrays.from_db().save(path)
+        else:
+            load_activity_arrays(version)
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        rows = ActivityMap.objects.count()
+        self.stdout.write(f"{rows} ActivityMap rows; table file {size / 1024:.0f} KB at {path}")
+
+        paths = [
+            ("orm instances", lambda: list(ActivityMap.objects.select_related("completion_rate"))),
+            ("orm values", ActivityArrays.from_db),
+            ("mmap table", lambda: ActivityArrays.load(path)),
+        ]
+        context = multiprocessing.get_context("spawn")
+        for label, build in paths:
+            durations = []
+            for _ in range(max(1, options["runs"])):
+                started = time.perf_counter()
+                table = build()
+                durations.append(time.perf_counter() - started)
+                del table
+            # Traced separately: tracemalloc slows allocation-heavy paths down several times
+            tracemalloc.start()
+            table = build()
+            retained = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del table
+            with context.Pool(1) as pool:
+                private, shared = pool.apply(_worker_memory, (label, path))
+            self.stdout.write(
+                f"{label:>13}: {min(durations) * 1000:7.2f} ms, heap {retained / 1024:7.0f} KB, "
+                f"worker RSS +{private:6d} KB private, +{shared:5d} KB file-backed"
+            )
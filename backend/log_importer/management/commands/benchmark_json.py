@@ -0,0 +1,82 @@
+import json
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from log_importer.encoding import ENCODERS, EncodedCache, chunked, dumps, iter_json
+from log_importer.static_data import STATIC_DIR
+from log_importer.tests.temple_stub import synthetic_player_log
+from log_importer.upstream import build_player_log
+
+
+def _best(function, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    return min(durations) * 1000
+
+
+def view_payloads(obtained_ratio):
+    """ (view, payload, depth) for what each log_importer view encodes; depth is where a streamed body splits. """
+    from log_importer.activity_data import _build_completion_rates_payload, build_activities_data
+    from log_importer.completion import expected_completion_times
+    from log_importer.planner import plan_route
+    from log_importer.ranking import next_fastest_item, rank_activities
+    from log_importer.snapshots import snapshot_hash
+
+    player_log = build_player_log(synthetic_player_log(obtained_ratio=obtained_ratio))
+    player_log["hash"] = snapshot_hash(player_log)
+    completed = [item["id"] for subcats in player_log["sections"].values() for entry in subcats.values()
+                 for item in entry["items"] if item.get("count")]
+    ranked = rank_activities(completed)
+    with open(os.path.join(STATIC_DIR, "items.json"), "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return [
+        ("collection-log", {"status": "success", "data": {"username": "stub", **player_log}, "cache": "miss", "coalesced": 0}, 4),
+        ("get-activities-data", {"status": "success", "data": build_activities_data()}, 2),
+        ("get-completion-rates", json.loads(_build_completion_rates_payload(0).body), 2),
+        ("rank-activities", {"status": "success", "data": ranked, "next_fastest_item": next_fastest_item(ranked)}, 2),
+        ("expected-completion", {"status": "success", "data": expected_completion_times(completed)}, 2),
+        ("plan-route", {"status": "success", "data": plan_route(completed, target_slots=500)}, 2),
+        ("rank-players (line)", {"username": "stub", "status": "success", "data": ranked[:10],
+                                 "next_fastest_item": next_fastest_item(ranked), "cache": "hit"}, 1),
+        ("items-json", items, 1),
+    ]
+
+
+class Command(BaseCommand):
+    help = """
+    Micro-benchmark JSON encoding of each log_importer view's payload with every
+    installed encoder (stdlib, orjson), streamed through iter_json in
+    JSON_STREAM_CHUNK_SIZE pieces with the configured JSON_ENCODER, and for the collection log with its sections
+    already in the encoded-sections cache (a repeat request for the same snapshot).
+
+    The collection log is a synthetic one with --obtained-ratio of the items
+    obtained; rankings, expected completion and the plan are computed for it.
+    Reports the best of --runs.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--obtained-ratio", type=float, default=0.5, help="Share of items obtained (default 0.5).")
+        parser.add_argument("--runs", type=int, default=20, help="Runs per measurement (default 20).")
+
+    def handle(self, *args, **options):
+        runs = max(1, options["runs"])
+        self.stdout.write(f"Encoders: {', '.join(ENCODERS)}; configured: {settings.JSON_ENCODER}")
+        for view, payload, depth in view_payloads(options["obtained_ratio"]):
+            size = len(dumps(payload))
+            timings = [f"{name} {_best(lambda: encode(payload), runs):7.3f}" for name, encode in ENCODERS.items()]
+            streamed = _best(lambda: list(chunked(iter_json(payload, depth), settings.JSON_STREAM_CHUNK_SIZE)), runs)
+            timings.append(f"streamed {streamed:7.3f}")
+            if view == "collection-log":
+                # As views.with_encoded_sections does on a repeat request for the same snapshot
+                cache, data = EncodedCache(), payload["data"]
+
+                def cached():
+                    sections = cache.get(data["hash"], data["sections"])
+                    return b"".join(iter_json({**payload, "data": {**data, "sections": sections}}, 2))
+
+                timings.append(f"cached {_best(cached, runs):7.3f}")
+            self.stdout.write(f"{view:>21}: {size / 1024:7.1f} KB; ms: {', '.join(timings)}")
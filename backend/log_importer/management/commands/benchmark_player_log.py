@@ -0,0 +1,52 @@
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from log_importer.tests.temple_stub import StubTempleServer, synthetic_player_log
+from log_importer.upstream import build_player_log, request_player_log, stream_player_log
+
+
+class Command(BaseCommand):
+    help = """
+    Measure peak memory and time per collection log request, buffered vs streaming.
+
+    A stub server replays --fixture (a saved TempleOSRS collection log response, e.g.
+    from curl) or a synthetic log built from sections.json/items.json. The buffered path
+    is request_player_log + build_player_log (response.json() and then the regroup); the
+    streaming path is stream_player_log. Peak memory is traced with tracemalloc.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fixture", help="Recorded TempleOSRS response to replay.")
+        parser.add_argument("--runs", type=int, default=5, help="Requests per path (default 5).")
+
+    def handle(self, *args, **options):
+        if options["fixture"]:
+            with open(options["fixture"], "rb") as f:
+                body = f.read()
+        else:
+            body = synthetic_player_log()
+
+        paths = [
+            ("buffered", lambda username: build_player_log(request_player_log(username))),
+            ("streaming", stream_player_log),
+        ]
+        with StubTempleServer(body, latency=0) as stub, override_settings(TEMPLE_LOG_URL=stub.url):
+            self.stdout.write(f"Payload: {len(stub.body) / 1024:.0f} KB")
+            for label, load in paths:
+                load("warmup")
+                peaks, retained, durations = [], [], []
+                for run in range(options["runs"]):
+                    tracemalloc.start()
+                    started = time.perf_counter()
+                    result = load(f"player{run}")
+                    durations.append(time.perf_counter() - started)
+                    current, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    peaks.append(peak)
+                    retained.append(current)
+                    del result
+                self.stdout.write(
+                    f"{label:>9}: peak {max(peaks) / 1024:8.0f} KB, result {max(retained) / 1024:6.0f} KB, "
+                    f"{min(durations) * 1000:6.1f} ms"
+                )
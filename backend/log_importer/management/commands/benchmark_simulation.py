@@ -0,0 +1,84 @@
+import random
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from log_importer.completion import expected_completion_times, simulation_tables
+from log_importer.obtained import ObtainedSet, slot_map
+from log_importer.ranking import activity_arrays
+from log_importer.simulation import DEFAULT_CHUNK_SIZE, default_workers, run_simulation
+
+
+class Command(BaseCommand):
+    help = """
+    Measure Monte Carlo completion simulation throughput and check it against the
+    exact engine.
+
+    Throughput is trials/s (and per core) for a random player with --obtained items
+    simulated to --target new slots, with one worker and with --workers processes.
+    The convergence check runs activities of at most --max-rows rows on their own
+    (every other activity disabled) from an empty log to their last slot, and compares
+    the mean hours with expected-completion's exact answer.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--trials", type=int, default=4096, help="Trials per measurement (default 4096).")
+        parser.add_argument("--target", type=int, default=50, help="New slots to simulate to (default 50).")
+        parser.add_argument("--obtained", type=int, default=700, help="Items the random player has (default 700).")
+        parser.add_argument("--workers", type=int, default=default_workers(), help="Processes for the parallel run.")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--activities", type=int, default=8, help="Activities in the convergence check (default 8).")
+        parser.add_argument("--max-rows", type=int, default=12)
+
+    def handle(self, *args, **options):
+        slots = slot_map.get()
+        rng = random.Random(options["seed"])
+        obtained = ObtainedSet.from_ids(slots, rng.sample(slots.item_ids.tolist(), min(options["obtained"], slots.size)))
+        tables = simulation_tables(obtained)
+
+        for workers in sorted({1, max(1, options["workers"])}):
+            started = time.perf_counter()
+            hours = np.concatenate([h for _, h in run_simulation(
+                tables, options["target"], options["trials"], options["chunk_size"], workers, options["seed"],
+            )])
+            elapsed = time.perf_counter() - started
+            rate = options["trials"] / elapsed
+            reached = hours[:, -1][np.isfinite(hours[:, -1])]
+            self.stdout.write(
+                f"{workers:>2} worker(s): {rate:8.0f} trials/s, {rate / workers:8.0f} per core, "
+                f"mean {reached.mean() if len(reached) else float('nan'):.3f} h to {options['target']} slots"
+            )
+
+        self.check_convergence(options)
+
+    def check_convergence(self, options):
+        arrays = activity_arrays.get()
+        empty = ObtainedSet(slot_map.get())
+        exact = {row["activity_name"]: row for row in expected_completion_times(empty)}
+        candidates = []
+        for i in range(arrays.activity_count):
+            rows = slice(arrays.row_offsets[i], arrays.row_offsets[i + 1])
+            item_ids = arrays.item_ids[rows]
+            row = exact[arrays.activity_names[i]]
+            # Repeated ids would make "every slot" mean fewer items than rows
+            if 0 < len(item_ids) <= options["max_rows"] and len(set(item_ids.tolist())) == len(item_ids) \
+                    and row["expected_hours"] and row["unknown_slots"] == 0:
+                candidates.append(i)
+        rng = random.Random(options["seed"])
+        chosen = sorted(rng.sample(candidates, min(options["activities"], len(candidates))))
+
+        self.stdout.write(f"\nConvergence against the exact engine ({options['trials']} trials each):")
+        for i in chosen:
+            name = arrays.activity_names[i]
+            disabled = set(arrays.activity_names) - {name}
+            tables = simulation_tables(empty, disabled=disabled)
+            target = int(arrays.map_counts[i])
+            hours = np.concatenate([h for _, h in run_simulation(
+                tables, target, options["trials"], options["chunk_size"], 1, options["seed"],
+            )])[:, -1]
+            expected = exact[name]["expected_hours"]
+            error = hours.std() / np.sqrt(len(hours))
+            self.stdout.write(
+                f"  {name[:32]:<32} {target:>3} slots: simulated {hours.mean():9.3f} h, exact {expected:9.3f} h, "
+                f"diff {100 * (hours.mean() / expected - 1):+6.2f}%, z {(hours.mean() - expected) / error:+5.2f}"
+            )
@@ -0,0 +1,96 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from log_importer.tests.temple_stub import StubTempleServer, synthetic_player_log
+from log_importer.upstream import player_log_cache, request_player_log, request_player_log_async
+
+
+class Command(BaseCommand):
+    help = """
+    Compare the sync and async TempleOSRS fetch paths against a local stub server.
+
+    The stub answers every request with a synthetic player log after --latency seconds.
+    The sync path runs request_player_log on --sync-workers threads (a WSGI worker's
+    thread pool); the async path runs --concurrency request_player_log_async calls at once
+    on one event loop (up to TEMPLE_MAX_CONNECTIONS of them talk to the stub at a time).
+    Throughput and latency percentiles are printed for both.
+
+    Finally --burst concurrent requests for one player go through the player log cache,
+    to show how many upstream calls single-flight coalescing leaves.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Requests per run (default 500).")
+        parser.add_argument("--latency", type=float, default=0.2,
+                            help="Seconds the stub waits before answering (default 0.2).")
+        parser.add_argument("--sync-workers", type=int, default=16,
+                            help="Threads for the sync run (default 16).")
+        parser.add_argument("--concurrency", type=int, default=200,
+                            help="In-flight requests for the async run (default 200).")
+        parser.add_argument("--burst", type=int, default=50,
+                            help="Concurrent requests for the same player in the coalescing run (default 50).")
+
+    def handle(self, *args, **options):
+        body = synthetic_player_log()
+        with StubTempleServer(body, latency=options["latency"]) as stub, override_settings(TEMPLE_LOG_URL=stub.url):
+            self.stdout.write(f"Stub at {stub.url}, {len(stub.body)} byte payload, {options['latency']}s latency")
+            sync_elapsed, sync_latencies = self.run_sync(options["requests"], options["sync_workers"])
+            self.report(f"sync  ({options['sync_workers']} threads)", sync_elapsed, sync_latencies)
+            async_elapsed, async_latencies = asyncio.run(self.run_async(options["requests"], options["concurrency"]))
+            self.report(f"async ({options['concurrency']} in flight)", async_elapsed, async_latencies)
+            self.run_burst(stub, options["burst"])
+        self.stdout.write(self.style.SUCCESS(f"Async speedup: {sync_elapsed / async_elapsed:.1f}x"))
+
+    def run_sync(self, count, workers):
+        def timed(i):
+            started = time.perf_counter()
+            request_player_log(f"player{i}")
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            latencies = list(executor.map(timed, range(count)))
+        return time.perf_counter() - started, latencies
+
+    async def run_async(self, count, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed(i):
+            async with semaphore:
+                started = time.perf_counter()
+                await request_player_log_async(f"player{i}")
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(timed(i) for i in range(count)))
+        elapsed = time.perf_counter() - started
+        return elapsed, latencies
+
+    def run_burst(self, stub, count):
+        player_log_cache.invalidate()
+        served_before = stub.requests
+        barrier = threading.Barrier(count)
+
+        def fetch(i):
+            barrier.wait()
+            return player_log_cache.get("Burst Player", force_refresh=True)[1]
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            statuses = list(executor.map(fetch, range(count)))
+        self.stdout.write(
+            f"burst ({count} requests, one player): {stub.requests - served_before} upstream call(s), "
+            f"{statuses.count('coalesced')} coalesced"
+        )
+
+    def report(self, label, elapsed, latencies):
+        latencies = sorted(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f"{label}: {len(latencies) / elapsed:8.1f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, "
+            f"total {elapsed:.2f}s"
+        )
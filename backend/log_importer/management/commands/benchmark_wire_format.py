@@ -0,0 +1,82 @@
+import gzip
+import json
+import time
+from django.core.management.base import BaseCommand
+from log_importer.static_data import brotli
+from log_importer.tests.temple_stub import synthetic_player_log
+from log_importer.upstream import build_player_log
+from log_importer.wire import (
+    build_dictionary, compact_activities, compact_log_body, encode, expand_player_log, items_index, msgpack,
+)
+
+
+def _best(function, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    return min(durations) * 1000
+
+
+class Command(BaseCommand):
+    help = """
+    Compare the wire formats of collection-log/ and get-activities-data/: the
+    current JSON, the compact columnar form as JSON, and the compact form as
+    MessagePack (when installed).
+
+    The log is a synthetic one built from sections.json/items.json with
+    --obtained-ratio of the items obtained (default: all of them). Reports the body
+    size raw, gzipped and brotli-compressed, and the best of --runs encode and
+    decode times. "compact+expand" also rebuilds the full log from the dictionary,
+    which clients fetch once from wire-dictionary/.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--obtained-ratio", type=float, default=1.0, help="Share of items obtained (default 1).")
+        parser.add_argument("--runs", type=int, default=20, help="Runs per measurement (default 20).")
+
+    def handle(self, *args, **options):
+        from log_importer.activity_data import build_activities_data
+        from log_importer.obtained import slot_map
+
+        runs = max(1, options["runs"])
+        slots = slot_map.get()
+        activities = build_activities_data()
+        dictionary = build_dictionary(slots, items_index.get(), activities)
+        player_log = build_player_log(synthetic_player_log(obtained_ratio=options["obtained_ratio"]))
+        log_body = {"status": "success", "data": {"username": "stub", **player_log}, "cache": "miss", "coalesced": 0}
+        activities_body = {"status": "success", "data": activities}
+
+        self.write_row("dictionary", encode(dictionary, "compact"))
+        for label, body, compact in [
+            ("collection log", log_body, lambda: compact_log_body(log_body)),
+            ("activities", activities_body, lambda: {"status": "success", "data": compact_activities(activities, slots)}),
+        ]:
+            self.stdout.write(f"\n{label}")
+            encoded = json.dumps(body, separators=(",", ":")).encode("utf-8")
+            self.write_row("json", encoded, _best(lambda: json.dumps(body, separators=(",", ":")).encode("utf-8"), runs),
+                           _best(lambda: json.loads(encoded), runs))
+            fmts = ["compact"] + (["msgpack"] if msgpack is not None else [])
+            for fmt in fmts:
+                encoded_compact = encode(compact(), fmt)
+                decode = json.loads if fmt == "compact" else msgpack.unpackb
+                self.write_row(fmt, encoded_compact, _best(lambda: encode(compact(), fmt), runs),
+                               _best(lambda: decode(encoded_compact), runs))
+                if label == "collection log":
+                    self.write_row(f"{fmt}+expand", encoded_compact, None, _best(
+                        lambda: expand_player_log(decode(encoded_compact)["data"], dictionary), runs
+                    ))
+        if msgpack is None:
+            self.stdout.write(self.style.WARNING("\nmsgpack is not installed; MessagePack was skipped."))
+
+    def write_row(self, label, body, encode_ms=None, decode_ms=None):
+        sizes = f"{len(body) / 1024:7.1f} KB raw, {len(gzip.compress(body, compresslevel=9)) / 1024:6.1f} KB gzip"
+        if brotli is not None:
+            sizes += f", {len(brotli.compress(body, quality=11)) / 1024:6.1f} KB br"
+        timings = ""
+        if encode_ms is not None:
+            timings += f", encode {encode_ms:6.2f} ms"
+        if decode_ms is not None:
+            timings += f", decode {decode_ms:6.2f} ms"
+        self.stdout.write(f"{label:>16}: {sizes}{timings}")
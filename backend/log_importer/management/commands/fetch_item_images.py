@@ -1,11 +1,14 @@
 import json
 import os
-import time
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 from bs4 import BeautifulSoup
 from difflib import SequenceMatcher
 from django.core.management.base import BaseCommand
+from log_importer.http_client import TokenBucket, RateLimitedSession, build_session
+from log_importer.jsonio import JsonJournal, atomic_write_json
+from log_importer.http_cache import CachedSession, add_cache_arguments, wrap_with_cache
 
 class Command(BaseCommand):
     help = (
@@ -14,18 +17,47 @@ class Command(BaseCommand):
         "2) Guess-based direct .png using the unique wiki page title\n"
         "3) Parse infobox HTML to find main sprite\n"
         "4) Fuzzy approach (with ratio >= 0.7) using the unique wiki page title\n"
-        "If all fail, add the item to manual_updates.json for later correction."
+        "If all fail, add the item to manual_updates.json for later correction.\n"
+        "Items are processed concurrently (--concurrency) behind a shared, rate-limited session (--rate).\n"
+        "Updates are journaled to items.json.journal and compacted into items.json every --checkpoint-every\n"
+        "updates; an interrupted run resumes from the journal.\n"
+        "Wiki responses are kept in an on-disk cache; --offline replays a run entirely from it."
     )
 
-    WIKI_LOOKUP_URL = "https://oldschool.runescape.wiki/w/Special:Lookup?type=item&id={item_id}"
-    WIKI_BASE_PAGE = "https://oldschool.runescape.wiki/w/"  # For the HTML parse
-    WIKI_API_URL = "https://oldschool.runescape.wiki/api.php"
-
-    REQUEST_DELAY = 0.0005
+    WIKI_ROOT = "https://oldschool.runescape.wiki"
+    API_BATCH_SIZE = 50  # MediaWiki's titles= limit for regular clients
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=8,
+                            help="Number of items processed at once (default 8).")
+        parser.add_argument("--rate", type=float, default=10.0,
+                            help="Maximum wiki requests per second across all workers, 0 for no limit (default 10).")
+        parser.add_argument("--retries", type=int, default=3,
+                            help="Retries for connection errors and 429/5xx responses (default 3).")
+        parser.add_argument("--wiki-url", default=self.WIKI_ROOT,
+                            help="Wiki root URL, e.g. a local stub server for testing.")
+        parser.add_argument("--checkpoint-every", type=int, default=100,
+                            help="Compact the journal into items.json after this many updates (default 100).")
+        parser.add_argument("--static-dir", default=None,
+                            help="Directory holding items.json and manual_updates.json (default: backend/static).")
+        add_cache_arguments(parser)
+
+    def configure_wiki(self, wiki_root):
+        self.wiki_root = wiki_root.rstrip("/")
+        self.WIKI_LOOKUP_URL = self.wiki_root + "/w/Special:Lookup?type=item&id={item_id}"
+        self.WIKI_BASE_PAGE = self.wiki_root + "/w/"  # For the HTML parse
+        self.WIKI_API_URL = self.wiki_root + "/api.php"
 
     def handle(self, *args, **options):
+        concurrency = max(1, options.get("concurrency") or 1)
+        self.configure_wiki(options.get("wiki_url") or self.WIKI_ROOT)
+        # Cache hits are answered before the rate limiter, so reruns don't wait on tokens.
+        self.http = wrap_with_cache(RateLimitedSession(
+            build_session(pool_size=concurrency, retries=options.get("retries", 3)),
+            TokenBucket(options.get("rate", 10.0), burst=concurrency),
+        ), options)
         current_dir = os.path.dirname(os.path.abspath(__file__))
-        static_dir = os.path.abspath(os.path.join(current_dir, "..", "..", "static"))
+        static_dir = options.get("static_dir") or os.path.abspath(os.path.join(current_dir, "..", "..", "static"))
         items_json_path = os.path.join(static_dir, "items.json")
         manual_updates_path = os.path.join(static_dir, "manual_updates.json")
 
@@ -37,6 +69,15 @@ class Command(BaseCommand):
         with open(items_json_path, "r", encoding="utf-8") as f:
             items_data = json.load(f)
 
+        # Resume: fold in updates journaled by an interrupted run.
+        self.items_json_path = items_json_path
+        self.checkpoint_every = max(1, options.get("checkpoint_every") or 1)
+        self.journal = JsonJournal(items_json_path + ".journal")
+        resumed = self.journal.replay(items_data)
+        if resumed:
+            self.stdout.write(f"Resumed {resumed} updates from {self.journal.path}.")
+            self.journal.compact(items_json_path, items_data)
+
         # Load manual_updates.json if it exists; otherwise, start with an empty dict.
         if os.path.exists(manual_updates_path):
             with open(manual_updates_path, "r", encoding="utf-8") as f:
@@ -50,6 +91,7 @@ class Command(BaseCommand):
 
         updated_count = 0
         default_wiki_url = "https://oldschool.runescape.wiki/"
+        pending = []
 
         for idx, key in enumerate(all_keys, start=1):
             item = items_data[key]
@@ -61,10 +103,12 @@ class Command(BaseCommand):
             # ----------------------------------------------------------------
             manual_override = manual_updates.get(str(item_id)) or manual_updates.get(item_id)
             if manual_override:
+                changes = {}
                 if manual_override.get("imageUrl"):
-                    item["imageUrl"] = manual_override["imageUrl"]
+                    changes["imageUrl"] = manual_override["imageUrl"]
                 if manual_override.get("wikiPageUrl"):
-                    item["wikiPageUrl"] = manual_override["wikiPageUrl"]
+                    changes["wikiPageUrl"] = manual_override["wikiPageUrl"]
+                self.record_update(items_data, key, changes)
                 updated_count += 1
                 self.stdout.write(self.style.SUCCESS(
                     f"[{idx}/{total_items}] {item_name} => [Manual Override] Applied updates: imageUrl: {manual_override.get('imageUrl')}, wikiPageUrl: {manual_override.get('wikiPageUrl')}"
@@ -74,7 +118,6 @@ class Command(BaseCommand):
                     del manual_updates[str(item_id)]
                 elif item_id in manual_updates:
                     del manual_updates[item_id]
-                self.save_items_json(items_json_path, items_data)
                 continue
 
             # ----------------------------------------------------------------
@@ -86,75 +129,62 @@ class Command(BaseCommand):
                 )
                 continue
 
-            self.stdout.write(f"\n[{idx}/{total_items}] Processing ID={item_id}, name='{item_name}'...")
-
-            # ----------------------------------------------------------------
-            # STEP 2) Lookup page title and URL from item ID.
-            # ----------------------------------------------------------------
-            page_title, final_url = self.get_page_title_for_item(item_id)
-            if final_url:
-                item["wikiPageUrl"] = final_url
-            else:
-                self.stdout.write(self.style.WARNING(
-                    f" => No wiki page found for {item_id} ({item_name})."
-                ))
-                if not (manual_updates.get(str(item_id)) or manual_updates.get(item_id)):
-                    manual_updates[str(item_id)] = {
-                        "name": item_name,
-                        "imageUrl": "",
-                        "wikiPageUrl": ""
-                    }
-                continue
+            pending.append((idx, key))
+
+        # --------------------------------------------------------------------
+        # STEPS 2-4 run concurrently per item; results are applied (and journaled)
+        # on this thread only, so items_data has a single writer.
+        # --------------------------------------------------------------------
+        self.stdout.write(f"Resolving {len(pending)} items with concurrency={concurrency}.")
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {
+                pool.submit(self.resolve_item, idx, total_items, items_data[key]["id"], items_data[key]["name"]): key
+                for idx, key in pending
+            }
+            fuzzy_pending = {}
+            for future in as_completed(futures):
+                key = futures[future]
+                result = future.result()
+                changes = {field: result[field] for field in ("wikiPageUrl", "imageUrl") if result[field]}
+                if changes:
+                    self.record_update(items_data, key, changes)
+                if result["imageUrl"]:
+                    updated_count += 1
+                elif result["pageTitle"]:
+                    fuzzy_pending[key] = result["pageTitle"]
+                else:
+                    self.add_manual_update(manual_updates, items_data[key], "")
 
             # ----------------------------------------------------------------
-            # STEP 3) Guess-based approach using page_title.
+            # STEP 5) Fuzzy approach (with higher threshold), batched across all
+            # items that are still missing an image.
             # ----------------------------------------------------------------
-            guess_url = self.try_guess_url(page_title)
-            if guess_url:
-                item["imageUrl"] = guess_url
-                updated_count += 1
-                self.stdout.write(self.style.SUCCESS(f" => [Guess-Based] Found: {guess_url}"))
-                self.save_items_json(items_json_path, items_data)
-                continue
-
-            # ----------------------------------------------------------------
-            # STEP 4) HTML Infobox parse.
-            # ----------------------------------------------------------------
-            infobox_url = self.parse_infobox_image(page_title)
-            if infobox_url:
-                item["imageUrl"] = infobox_url
-                updated_count += 1
-                self.stdout.write(self.style.SUCCESS(f" => [HTML Infobox] Found: {infobox_url}"))
-                self.save_items_json(items_json_path, items_data)
-                continue
-
-            # ----------------------------------------------------------------
-            # STEP 5) Fuzzy approach (with higher threshold) using page_title.
-            # ----------------------------------------------------------------
-            fuzzy_url = self.fuzzy_lookup(page_title, item_name, min_ratio=0.7)
-            if fuzzy_url:
-                item["imageUrl"] = fuzzy_url
-                updated_count += 1
-                self.stdout.write(self.style.SUCCESS(f" => [Fuzzy Approach] Found: {fuzzy_url}"))
-                self.save_items_json(items_json_path, items_data)
-                continue
-
-            # If all automated methods fail, add/update an entry in manual_updates.
-            self.stdout.write(self.style.WARNING(" => [NO IMAGE FOUND]"))
-            if not (manual_updates.get(str(item_id)) or manual_updates.get(item_id)):
-                manual_updates[str(item_id)] = {
-                    "name": item_name,
-                    "imageUrl": "",
-                    "wikiPageUrl": item.get("wikiPageUrl", "")
-                }
+            fuzzy_urls = self.batch_fuzzy_lookup(sorted(set(fuzzy_pending.values())), pool, min_ratio=0.7)
+            for key, page_title in fuzzy_pending.items():
+                item = items_data[key]
+                fuzzy_url = fuzzy_urls.get(page_title)
+                if fuzzy_url:
+                    self.stdout.write(self.style.SUCCESS(f" => [Fuzzy Approach] {item['name']} Found: {fuzzy_url}"))
+                    self.record_update(items_data, key, {"imageUrl": fuzzy_url})
+                    updated_count += 1
+                else:
+                    # If all automated methods fail, add/update an entry in manual_updates.
+                    self.stdout.write(self.style.WARNING(f" => [NO IMAGE FOUND] {item['id']} ({item['name']})"))
+                    self.add_manual_update(manual_updates, item, item.get("wikiPageUrl", ""))
+        if isinstance(self.http, CachedSession):
+            stats = self.http.stats()
+            self.stdout.write(
+                f"HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated, {stats['misses']} fetched."
+            )
+        self.http.close()
 
         # Final summary
         self.stdout.write(self.style.SUCCESS(
             f"\nDone! Updated {updated_count} items out of {total_items}."
         ))
 
-        # Save the updated items.json.
-        self.save_items_json(items_json_path, items_data)
+        # Save the updated items.json and drop the journal.
+        self.journal.compact(items_json_path, items_data)
 
         # ----------------------------------------------------------------
         # ALSO add items with the default wiki page URL to manual_updates.
@@ -173,12 +203,57 @@ class Command(BaseCommand):
                     }
 
         # Write out the manual_updates file with any remaining entries.
-        with open(manual_updates_path, "w", encoding="utf-8") as f:
-            json.dump(manual_updates, f, indent=2, ensure_ascii=False)
+        atomic_write_json(manual_updates_path, manual_updates)
         self.stdout.write(self.style.SUCCESS(
             f"Manual update file written to {manual_updates_path}."
         ))
 
+    # ----------------------------------------------------------------------
+    # Method: resolve_item (steps 2-4 for one item, run on a worker thread)
+    # ----------------------------------------------------------------------
+    def resolve_item(self, idx, total_items, item_id, item_name):
+        self.stdout.write(f"\n[{idx}/{total_items}] Processing ID={item_id}, name='{item_name}'...")
+        result = {"wikiPageUrl": None, "imageUrl": None, "pageTitle": None}
+
+        # STEP 2) Lookup page title and URL from item ID.
+        page_title, final_url = self.get_page_title_for_item(item_id)
+        if not final_url:
+            self.stdout.write(self.style.WARNING(
+                f" => No wiki page found for {item_id} ({item_name})."
+            ))
+            return result
+        result["wikiPageUrl"] = final_url
+
+        # STEP 3) Guess-based approach using page_title.
+        guess_url = self.try_guess_url(page_title)
+        if guess_url:
+            self.stdout.write(self.style.SUCCESS(f" => [Guess-Based] Found: {guess_url}"))
+            result["imageUrl"] = guess_url
+            return result
+
+        # STEP 4) HTML Infobox parse.
+        infobox_url = self.parse_infobox_image(page_title)
+        if infobox_url:
+            self.stdout.write(self.style.SUCCESS(f" => [HTML Infobox] Found: {infobox_url}"))
+            result["imageUrl"] = infobox_url
+            return result
+
+        # Left for the batched fuzzy step.
+        result["pageTitle"] = page_title
+        return result
+
+    # ----------------------------------------------------------------------
+    # Method: add_manual_update
+    # ----------------------------------------------------------------------
+    def add_manual_update(self, manual_updates, item, wiki_page_url):
+        item_id = item["id"]
+        if not (manual_updates.get(str(item_id)) or manual_updates.get(item_id)):
+            manual_updates[str(item_id)] = {
+                "name": item["name"],
+                "imageUrl": "",
+                "wikiPageUrl": wiki_page_url
+            }
+
     # ----------------------------------------------------------------------
     # Method: get_page_title_for_item
     # ----------------------------------------------------------------------
@@ -193,7 +268,7 @@ class Command(BaseCommand):
         }
 
         try:
-            r = requests.get(lookup_url, headers=headers, allow_redirects=True, timeout=10)
+            r = self.http.get(lookup_url, headers=headers, allow_redirects=True, timeout=10)
             final_url = r.url
             self.stdout.write(f"[DEBUG] Status: {r.status_code}, final URL: {final_url}")
 
@@ -216,7 +291,7 @@ class Command(BaseCommand):
     def try_guess_url(self, page_title):
         # Use the wiki page title to create a guess filename.
         guess_filename = page_title.replace(" ", "_") + ".png"
-        guess_url = f"https://oldschool.runescape.wiki/images/{guess_filename}"
+        guess_url = f"{self.wiki_root}/images/{guess_filename}"
 
         headers = {
             "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -225,11 +300,13 @@ class Command(BaseCommand):
         }
 
         try:
-            r = requests.get(guess_url, headers=headers, stream=True, timeout=5)
-            if r.status_code == 200:
+            # Only the status matters; close the streamed body so the connection returns to the pool.
+            with self.http.get(guess_url, headers=headers, stream=True, timeout=5) as r:
+                status_code = r.status_code
+            if status_code == 200:
                 return guess_url
             else:
-                self.stdout.write(f" => [Guess] GET {guess_url} => {r.status_code}")
+                self.stdout.write(f" => [Guess] GET {guess_url} => {status_code}")
                 return None
         except Exception as e:
             self.stdout.write(f"[ERROR] Guess approach failed for {guess_url}: {e}")
@@ -247,7 +324,7 @@ class Command(BaseCommand):
             "Referer": "https://oldschool.runescape.wiki/"
         }
         try:
-            resp = requests.get(url, headers=headers, timeout=10)
+            resp = self.http.get(url, headers=headers, timeout=10)
             if resp.status_code != 200:
                 self.stdout.write(f"[DEBUG] parse_infobox: {resp.status_code} for {url}")
                 return None
@@ -265,57 +342,97 @@ class Command(BaseCommand):
             if not src.startswith("/images/"):
                 return None
 
-            return "https://oldschool.runescape.wiki" + src
+            return self.wiki_root + src
 
         except Exception as e:
             self.stdout.write(f"[ERROR] parse_infobox_image({page_title}): {e}")
             return None
 
     # ----------------------------------------------------------------------
-    # Method: fuzzy_lookup (using page_title for a more unique base)
+    # Method: query_titles (batched MediaWiki API query)
     # ----------------------------------------------------------------------
-    def fuzzy_lookup(self, page_title, item_name, min_ratio=0.7):
-        query_params = {
-            "action": "query",
-            "titles": page_title,
-            "prop": "images",
-            "format": "json"
-        }
+    def query_titles(self, titles, params, pool):
+        """
+        Runs an api.php query for many titles, API_BATCH_SIZE per request (chunks in
+        parallel on the pool), following "continue" so list props are complete.
+        Returns {requested title: page dict}; missing pages are left out.
+        """
+        chunks = [titles[i:i + self.API_BATCH_SIZE] for i in range(0, len(titles), self.API_BATCH_SIZE)]
+        pages = {}
+        for chunk_pages in pool.map(lambda chunk: self.query_title_chunk(chunk, params), chunks):
+            pages.update(chunk_pages)
+        return pages
+
+    def query_title_chunk(self, titles, params):
         headers = {
             "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
                            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/1080.0.0.0 Safari/537.36"),
             "Referer": "https://oldschool.runescape.wiki/"
         }
+        query_params = dict(params, action="query", titles="|".join(titles), format="json")
+        by_title = {}
+        normalized = {}
+        cont = {}
         try:
-            resp = requests.get(self.WIKI_API_URL, params=query_params, headers=headers, timeout=10)
-            data = resp.json()
-            pages = data.get("query", {}).get("pages", {})
-            if not pages:
-                return None
-
-            page_id = next(iter(pages))
-            if page_id == "-1":
-                return None
+            while True:
+                resp = self.http.get(self.WIKI_API_URL, params=dict(query_params, **cont), headers=headers, timeout=10)
+                data = resp.json()
+                query = data.get("query", {})
+                # The API reports titles it rewrote (e.g. underscores -> spaces).
+                for entry in query.get("normalized", []):
+                    normalized[entry["from"]] = entry["to"]
+                for page in query.get("pages", {}).values():
+                    if "missing" in page or "invalid" in page:
+                        continue
+                    merged = by_title.setdefault(page["title"], {"title": page["title"]})
+                    for prop, value in page.items():
+                        if isinstance(value, list):
+                            merged.setdefault(prop, []).extend(value)
+                        else:
+                            merged.setdefault(prop, value)
+                if "continue" not in data:
+                    break
+                cont = data["continue"]
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"[ERROR] in query_title_chunk({len(titles)} titles): {e}"))
 
-            images = pages[page_id].get("images", [])
-            if not images:
-                return None
+        pages = {}
+        for title in titles:
+            page = by_title.get(normalized.get(title, title))
+            if page is not None:
+                pages[title] = page
+        return pages
 
+    # ----------------------------------------------------------------------
+    # Method: batch_fuzzy_lookup (using page_title for a more unique base)
+    # ----------------------------------------------------------------------
+    def batch_fuzzy_lookup(self, page_titles, pool, min_ratio=0.7):
+        """
+        Fuzzy image match for many pages at once: one prop=images query per 50 pages,
+        then one prop=imageinfo query per 50 chosen files. Returns {page_title: url}.
+        """
+        if not page_titles:
+            return {}
+        self.stdout.write(f"[DEBUG] fuzzy => resolving {len(page_titles)} pages in batches of {self.API_BATCH_SIZE}")
+        pages = self.query_titles(page_titles, {"prop": "images", "imlimit": "max"}, pool)
+
+        best_files = {}
+        for page_title in page_titles:
+            images = pages.get(page_title, {}).get("images", [])
             png_images = [img for img in images if (".png" in img["title"].lower() or ".jpg" in img["title"].lower())]
             if not png_images:
-                return None
-
+                continue
             best_image = self.pick_best_image_match(page_title, png_images, min_ratio)
-            if not best_image:
-                return None
-
-            file_title = best_image["title"]
-            self.stdout.write(f"[DEBUG] fuzzy => best file: {file_title}")
-            return self.get_direct_file_url(file_title)
-
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"[ERROR] in fuzzy_lookup({page_title}): {e}"))
-            return None
+            if best_image:
+                self.stdout.write(f"[DEBUG] fuzzy => best file for {page_title}: {best_image['title']}")
+                best_files[page_title] = best_image["title"]
+
+        file_urls = self.get_direct_file_urls(sorted(set(best_files.values())), pool)
+        return {
+            page_title: file_urls[file_title]
+            for page_title, file_title in best_files.items()
+            if file_urls.get(file_title)
+        }
 
     # ----------------------------------------------------------------------
     # Method: pick_best_image_match (using page_title as base)
@@ -357,43 +474,23 @@ class Command(BaseCommand):
         return None
 
     # ----------------------------------------------------------------------
-    # Method: get_direct_file_url
+    # Method: get_direct_file_urls
     # ----------------------------------------------------------------------
-    def get_direct_file_url(self, file_title):
-        q_params = {
-            "action": "query",
-            "titles": file_title,
-            "prop": "imageinfo",
-            "iiprop": "url",
-            "format": "json"
-        }
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-            "Referer": "https://oldschool.runescape.wiki/"
-        }
-        try:
-            r = requests.get(self.WIKI_API_URL, params=q_params, headers=headers, timeout=10)
-            data = r.json()
-            pages = data.get("query", {}).get("pages", {})
-            if not pages:
-                return None
-
-            p_id = next(iter(pages))
-            if p_id == "-1":
-                return None
-
-            info = pages[p_id].get("imageinfo", [])
-            if not info:
-                return None
-
-            return info[0].get("url")
-        except Exception as e:
-            self.stdout.write(f"[ERROR] get_direct_file_url({file_title}): {e}")
-            return None
+    def get_direct_file_urls(self, file_titles, pool):
+        """ Resolves file titles to their direct image URLs, 50 per request. """
+        pages = self.query_titles(file_titles, {"prop": "imageinfo", "iiprop": "url"}, pool)
+        urls = {}
+        for file_title, page in pages.items():
+            info = page.get("imageinfo", [])
+            if info and info[0].get("url"):
+                urls[file_title] = info[0]["url"]
+        return urls
 
     # ----------------------------------------------------------------------
-    # Method: save_items_json
+    # Method: record_update (journal one item's changes, compact periodically)
     # ----------------------------------------------------------------------
-    def save_items_json(self, path, data):
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    def record_update(self, items_data, key, changes):
+        items_data[key].update(changes)
+        self.journal.append(key, changes)
+        if self.journal.pending >= self.checkpoint_every:
+            self.journal.compact(self.items_json_path, items_data)
@@ -1,7 +1,10 @@
 import json
 import os
-import requests
 from django.core.management.base import BaseCommand
+from log_importer.jsonio import atomic_write_json
+from log_importer.obtained import extend_slot_file
+from log_importer.http_client import build_session
+from log_importer.http_cache import CachedSession, add_cache_arguments, wrap_with_cache
 
 class Command(BaseCommand):
     help = (
@@ -9,7 +12,13 @@ class Command(BaseCommand):
         "data for each major section (bosses, clues, minigames, raids, other)."
     )
 
+    def add_arguments(self, parser):
+        # The item lists change with game updates, so TempleOSRS is always revalidated
+        add_cache_arguments(parser, max_age=0)
+
     def handle(self, *args, **options):
+        http = wrap_with_cache(build_session(), options)
+
         # Define the five major sections we want to fetch.
         major_sections = ["bosses", "raids", "clues", "minigames", "other"]
 
@@ -58,7 +67,7 @@ class Command(BaseCommand):
             params["categories"] = section
 
             try:
-                response = requests.get(base_url, params=params, timeout=10)
+                response = http.get(base_url, params=params, timeout=10)
                 if response.status_code != 200:
                     self.stdout.write(self.style.ERROR(
                         f"Failed to fetch {section}. Status code: {response.status_code}"
@@ -109,9 +118,17 @@ class Command(BaseCommand):
                     # Append the item's ID (as string) to the current sub-category list.
                     sections_data[section][subcategory].append(item_key)
 
+        if isinstance(http, CachedSession):
+            stats = http.stats()
+            self.stdout.write(f"HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated, {stats['misses']} fetched.")
+        http.close()
+
+        if not sections_data:
+            self.stdout.write(self.style.ERROR("No sections were fetched; leaving items.json and sections.json untouched."))
+            return
+
         # Save the updated items_data to items.json.
-        with open(items_json_path, "w", encoding="utf-8") as f:
-            json.dump(items_data, f, indent=2, ensure_ascii=False)
+        atomic_write_json(items_json_path, items_data)
         self.stdout.write(self.style.SUCCESS(
             f"Successfully updated items.json with {len(items_data)} items."
         ))
@@ -121,6 +138,13 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS("No new items added."))
 
         # Save the sections_data to sections.json.
-        with open(sections_json_path, "w", encoding="utf-8") as f:
-            json.dump(sections_data, f, indent=2, ensure_ascii=False)
+        atomic_write_json(sections_json_path, sections_data)
         self.stdout.write(self.style.SUCCESS("Successfully updated sections.json."))
+
+        # New items get the next free bitmap slots; existing slots never move.
+        slots_version, added_slots = extend_slot_file(
+            list(items_data) + [item_id for subcats in sections_data.values() for ids in subcats.values() for item_id in ids],
+            os.path.join(static_dir, "item_slots.json"),
+        )
+        if added_slots:
+            self.stdout.write(self.style.SUCCESS(f"Added {len(added_slots)} item slots (item_slots.json v{slots_version})."))
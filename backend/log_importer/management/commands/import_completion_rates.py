@@ -1,19 +1,38 @@
 import csv
+import hashlib
 import os
+import time
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from django.db import transaction
 from log_importer.models import CompletionRate, ActivityMap
+from log_importer.activity_data import ACTIVITIES, bump_data_version, data_source_hash
+from log_importer.obtained import extend_slot_file
+
+BATCH_SIZE = 500
+
 
 class Command(BaseCommand):
-    help = """ 
+    help = """
     Import completion rates and item activity map from CSV files into the database.
 
     Steps to update the import:
     1. Export the Activity Map and Completion Rates as .csv from the Collection Log Adviser spreadsheet.
     2. Copy the exported files into the 'static' folder inside the Django project.
     3. Run this script using: python manage.py import_completion_rates
+
+    Rows are upserted in one transaction: completion rates by activity index, activity map rows
+    by (activity index, item id, occurrence of that item in the activity). Rows missing from the
+    CSVs are deleted. The import is skipped when both CSVs are unchanged since the last run.
     """
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Import even if the CSV files have not changed since the last import."
+        )
+
     def safe_float(self, value, default=0.0):
         """ Convert a string to float safely, replacing empty or invalid values with a default. """
         try:
@@ -36,50 +55,182 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f"File not found: {activity_map_path}"))
             return
 
-        # Clear previous data
-        ActivityMap.objects.all().delete()
-        CompletionRate.objects.all().delete()
+        started = time.perf_counter()
 
-        # Import completion rates
+        # Skip the whole import when neither CSV changed since the last one
+        digest = hashlib.sha256()
+        for path in (completion_rates_path, activity_map_path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        source_hash = digest.hexdigest()
+        if not kwargs.get("force") and source_hash == data_source_hash(ACTIVITIES):
+            self.stdout.write(self.style.SUCCESS("Completion rates and activity map unchanged, skipping import."))
+            return
+
+        # Parse completion rates
         with open(completion_rates_path, mode='r', encoding='utf-8') as file:
             reader = csv.DictReader(file)
+            rate_rows = {}
             for row in reader:
-                CompletionRate.objects.create(
-                    activity_index=int(row['Index']),
-                    activity_name=row['Activity name'].strip(),
-                    completions_per_hour_main=self.safe_float(row['Completions/hr (main)']),
-                    completions_per_hour_iron=self.safe_float(row['Completions/hr (iron)']),
-                    extra_time_to_first_completion=self.safe_float(row['Extra time to first completion (hours)']),
-                    notes=row.get('Notes', '').strip(),
-                    verification_source=row.get('Verification source', '').strip()
-                )
-
-        # Import activity map
+                rate_rows[int(row['Index'])] = {
+                    "activity_name": row['Activity name'].strip(),
+                    "completions_per_hour_main": self.safe_float(row['Completions/hr (main)']),
+                    "completions_per_hour_iron": self.safe_float(row['Completions/hr (iron)']),
+                    "extra_time_to_first_completion": self.safe_float(row['Extra time to first completion (hours)']),
+                    "notes": row.get('Notes', '').strip(),
+                    "verification_source": row.get('Verification source', '').strip()
+                }
+
+        # Parse activity map
         with open(activity_map_path, mode='r', encoding='utf-8') as file:
             reader = csv.DictReader(file)
+            map_rows = []
+            inconsistent = []
             for sequence, row in enumerate(reader, start=1):
-                try:
-                    completion_rate = CompletionRate.objects.get(activity_index=int(row['Activity index']))
-                    neither_inverse_value = self.safe_float(row.get('Neither^(-1)', '0'))
-
-                    ActivityMap.objects.create(
-                        completion_rate=completion_rate,
-                        activity_name=row['Activity name'].strip(),
-                        completions_per_hour=self.safe_float(row.get('Completions per hour', '0')),
-                        additional_time_to_first_completion=self.safe_float(row.get('Additional time to first completion (hours)', '0')),
-                        item_id=int(row['Item ID']),
-                        item_name=row['Item name'].strip(),
-                        requires_previous=row['Requires previous'].strip().lower() == 'true',
-                        exact=row['Exact'].strip().lower() == 'true',
-                        independent=row['Independent'].strip().lower() == 'true',
-                        drop_rate_attempts=self.safe_float(row['Drop rate (attempts)']),
-                        e_and_i=row.get('E&I', '').strip(),
-                        e_only=row.get('E', '').strip(),
-                        i_only=row.get('I', '').strip(),
-                        neither_inverse=neither_inverse_value,
-                        sequence=sequence
-                    )
-                except CompletionRate.DoesNotExist:
+                activity_index = int(row['Activity index'])
+                if activity_index not in rate_rows:
                     self.stdout.write(self.style.ERROR(f"Activity index {row['Activity index']} not found in completion rates"))
+                    continue
+                map_rows.append((activity_index, {
+                    "activity_name": row['Activity name'].strip(),
+                    "completions_per_hour": self.safe_float(row.get('Completions per hour', '0')),
+                    "additional_time_to_first_completion": self.safe_float(row.get('Additional time to first completion (hours)', '0')),
+                    "item_id": int(row['Item ID']),
+                    "item_name": row['Item name'].strip(),
+                    "requires_previous": row['Requires previous'].strip().lower() == 'true',
+                    "exact": row['Exact'].strip().lower() == 'true',
+                    "independent": row['Independent'].strip().lower() == 'true',
+                    "drop_rate_attempts": self.safe_float(row['Drop rate (attempts)']),
+                    "e_and_i": row.get('E&I', '').strip(),
+                    "e_only": row.get('E', '').strip(),
+                    "i_only": row.get('I', '').strip(),
+                    "neither_inverse": self.safe_float(row.get('Neither^(-1)', '0')),
+                    "sequence": sequence
+                }))
+                if not self.drop_columns_agree(map_rows[-1][1]):
+                    inconsistent.append(f"{row['Activity name'].strip()} / {row['Item name'].strip()}")
+        if inconsistent:
+            self.stdout.write(self.style.WARNING(
+                f"{len(inconsistent)} activity map rows where E&I/E/I disagree with Exact, Independent and "
+                f"Drop rate (the completion engine goes by the latter): {', '.join(inconsistent)}"
+            ))
+        parsed = time.perf_counter()
+
+        # Every mapped item needs a bitmap slot, or an obtained bitmap could never mark it
+        slots_version, added_slots = extend_slot_file(
+            [values["item_id"] for _, values in map_rows], os.path.join(static_path, "item_slots.json")
+        )
+        if added_slots:
+            self.stdout.write(self.style.WARNING(
+                f"Added {len(added_slots)} item slots missing from item_slots.json (v{slots_version}): {added_slots}"
+            ))
+
+        with transaction.atomic():
+            rates_summary = self.upsert_completion_rates(rate_rows)
+            rate_ids = dict(CompletionRate.objects.values_list("activity_index", "id"))
+            maps_summary = self.upsert_activity_maps(map_rows, rate_ids)
+            version = bump_data_version(ACTIVITIES, source_hash=source_hash)
+        written = time.perf_counter()
+
+        self.stdout.write(
+            f"Completion rates: {rates_summary[0]} created, {rates_summary[1]} updated, {rates_summary[2]} deleted\n"
+            f"Activity map: {maps_summary[0]} created, {maps_summary[1]} updated, {maps_summary[2]} deleted\n"
+            f"Timing: parse {parsed - started:.3f}s, write {written - parsed:.3f}s, total {written - started:.3f}s"
+        )
+        self.stdout.write(self.style.SUCCESS(f'Successfully imported completion rates and activity map (version {version})'))
+
+    def drop_columns_agree(self, values):
+        """
+        E&I, E and I repeat a row's drop rate under its class (exact and independent,
+        exact only, independent only); check they match the flags and the drop rate.
+        """
+        expected = {
+            (True, True): "e_and_i", (True, False): "e_only", (False, True): "i_only",
+        }.get((values["exact"], values["independent"]))
+        for column in ("e_and_i", "e_only", "i_only"):
+            attempts = self.safe_float(values[column], None)
+            if attempts is not None and (column != expected or attempts != values["drop_rate_attempts"]):
+                return False
+        return True
+
+    def upsert_completion_rates(self, rate_rows):
+        """ Upserts CompletionRate rows keyed by activity_index. Returns (created, updated, deleted). """
+        existing = {}
+        stale_ids = []
+        for rate in CompletionRate.objects.order_by("id"):
+            if rate.activity_index in rate_rows and rate.activity_index not in existing:
+                existing[rate.activity_index] = rate
+            else:
+                stale_ids.append(rate.id)
+
+        to_create, to_update = [], {}
+        for activity_index, values in rate_rows.items():
+            rate = existing.get(activity_index)
+            if rate is None:
+                to_create.append(CompletionRate(activity_index=activity_index, **values))
+            else:
+                self.apply_changes(rate, values, to_update)
+
+        CompletionRate.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        updated = self.bulk_update_changed(CompletionRate, to_update)
+        # Deleting a completion rate cascades to its activity map rows.
+        deleted = CompletionRate.objects.filter(id__in=stale_ids).delete()[1].get(CompletionRate._meta.label, 0)
+        return len(to_create), updated, deleted
+
+    def upsert_activity_maps(self, map_rows, rate_ids):
+        """
+        Upserts ActivityMap rows. An item can be listed more than once for the same
+        activity (e.g. two drop sources), so the key also counts its occurrences.
+        Returns (created, updated, deleted).
+        """
+        existing = {}
+        occurrences = {}
+        for activity_map in ActivityMap.objects.select_related("completion_rate").order_by("sequence", "id"):
+            base = (activity_map.completion_rate.activity_index, activity_map.item_id)
+            occurrences[base] = occurrences.get(base, 0) + 1
+            existing[base + (occurrences[base],)] = activity_map
+
+        to_create, to_update = [], {}
+        seen = set()
+        occurrences = {}
+        for activity_index, values in map_rows:
+            values = dict(values, completion_rate_id=rate_ids[activity_index])
+            base = (activity_index, values["item_id"])
+            occurrences[base] = occurrences.get(base, 0) + 1
+            key = base + (occurrences[base],)
+            seen.add(key)
+            activity_map = existing.get(key)
+            if activity_map is None:
+                to_create.append(ActivityMap(**values))
+            else:
+                self.apply_changes(activity_map, values, to_update)
+
+        stale_ids = [m.id for key, m in existing.items() if key not in seen]
+        ActivityMap.objects.filter(id__in=stale_ids).delete()
+        ActivityMap.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        updated = self.bulk_update_changed(ActivityMap, to_update)
+        return len(to_create), updated, len(stale_ids)
+
+    def apply_changes(self, instance, values, to_update):
+        """
+        Copies values onto a model instance and, if anything differed, queues it
+        in to_update under the tuple of fields that changed.
+        """
+        changed = []
+        for field, value in values.items():
+            if getattr(instance, field) != value:
+                setattr(instance, field, value)
+                changed.append(field)
+        if changed:
+            to_update.setdefault(tuple(changed), []).append(instance)
 
-        self.stdout.write(self.style.SUCCESS('Successfully imported completion rates and activity map'))
+    def bulk_update_changed(self, model, to_update):
+        """
+        Runs one bulk_update per set of changed fields, so a shift in sequence numbers
+        only rewrites that column. Returns the number of rows updated.
+        """
+        updated = 0
+        for fields, instances in to_update.items():
+            model.objects.bulk_update(instances, list(fields), batch_size=BATCH_SIZE)
+            updated += len(instances)
+        return updated
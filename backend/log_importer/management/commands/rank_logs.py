@@ -0,0 +1,199 @@
+import csv
+import io
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+import django
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional; CSV and .npz output need nothing extra
+    pyarrow = None
+
+COLUMNS = [
+    "username", "account_type", "rank", "activity_name", "status",
+    "time_to_next_log_slot", "fastest_slot_id", "fastest_slot_name",
+]
+
+# Set in each pool worker by _init_worker. Django models are only imported inside
+# functions: spawned workers import this module before django.setup() has run.
+_tables = None
+
+
+def _init_worker(tables_pickle):
+    # Spawned workers start without Django; set it up before unpickling ActivityArrays
+    django.setup()
+    global _tables
+    _tables = pickle.loads(tables_pickle)
+
+
+def read_log(raw, fallback_username):
+    """
+    A regrouped player log from a saved collection-log response (or just its "data"),
+    with its username. Raises ValueError for anything else.
+    """
+    log = json.loads(raw)
+    if isinstance(log, dict) and isinstance(log.get("data"), dict):
+        log = log["data"]
+    if not isinstance(log, dict) or not isinstance(log.get("sections"), dict):
+        raise ValueError("not a regrouped collection log")
+    return log, str(log.get("username") or fallback_username)
+
+
+def _rank_chunk(sources, account, top, output_format):
+    """
+    Scores one chunk of logs in a single score_players pass. `sources` holds
+    (name, path, None) for files and (name, None, line) for NDJSON lines. Returns
+    (output, players, errors): output is the chunk's CSV text for csv, else a dict
+    of numpy columns keyed like COLUMNS. Rendering here keeps the parent to writing
+    bytes, so it does not become the bottleneck as workers are added.
+    """
+    from log_importer.batch_ranking import player_obtained_set
+    from log_importer.ranking import DONE, NO_DATA, score_players
+
+    arrays, slots, main, iron = _tables
+    players, masks, errors = [], [], []
+    for name, path, line in sources:
+        try:
+            if path is not None:
+                with open(path, "rb") as f:
+                    line = f.read()
+            log, username = read_log(line, name)
+            obtained = player_obtained_set(slots, log)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            errors.append((name, str(e)))
+            continue
+        account_type = log.get("accountType") or "Unknown"
+        players.append((username, account_type, account == "iron" or (account == "auto" and account_type == "IRONMAN")))
+        masks.append(obtained.mask(arrays.item_slots(slots)))
+
+    if players:
+        is_iron = np.array([p[2] for p in players])[:, None]
+        rates = np.where(is_iron, iron[0], main[0])
+        extra = np.where(is_iron, iron[1], main[1])
+        days, status, fastest_row = score_players(arrays, np.stack(masks), rates, extra)
+    else:
+        shape = (0, arrays.activity_count)
+        days, status, fastest_row = np.zeros(shape), np.zeros(shape, dtype=np.int8), np.zeros(shape, dtype=np.int64)
+    # rank_activities' order: by time, non-numeric last, ties by activity order
+    order = np.argsort(np.where(status == 0, days, np.inf), axis=1, kind="stable")[:, :top]
+    fastest_row = np.take_along_axis(fastest_row, order, axis=1).ravel()
+    found = fastest_row >= 0
+    count = order.shape[1]
+    columns = {
+        "username": np.repeat(np.array([p[0] for p in players], dtype=str), count),
+        "account_type": np.repeat(np.array([p[1] for p in players], dtype=str), count),
+        "rank": np.tile(np.arange(1, count + 1), len(players)),
+        "activity_name": np.array(arrays.activity_names, dtype=str)[order.ravel()],
+        "status": np.array(["ok", DONE, NO_DATA])[np.take_along_axis(status, order, axis=1).ravel()],
+        "time_to_next_log_slot": np.take_along_axis(days, order, axis=1).ravel(),
+        "fastest_slot_id": np.where(found, arrays.item_ids[fastest_row], -1),
+        "fastest_slot_name": np.where(
+            found, np.array([name or "-" for name in arrays.item_names], dtype=str)[fastest_row], "-"
+        ),
+    }
+    if output_format != "csv":
+        return columns, len(players), errors
+    text = io.StringIO()
+    csv.writer(text).writerows(zip(*(columns[column].tolist() for column in COLUMNS)))
+    return text.getvalue(), len(players), errors
+
+
+class Command(BaseCommand):
+    help = """
+    Rank every activity for a batch of saved collection logs, offline.
+
+    Input is a directory of .json files or an NDJSON file, each log shaped like a
+    collection-log response (or its "data"). Each player's activities come out in
+    rank-activities order with their time to next log slot and fastest slot, one
+    row per (player, activity). Chunks of logs are parsed and scored on a process
+    pool; every worker gets one copy of the activity tables when it starts.
+    Output is CSV, .npz (numpy columns) or Parquet (needs pyarrow).
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Directory of .json logs or an NDJSON file.")
+        parser.add_argument("output", help="Output file.")
+        parser.add_argument("--format", choices=["csv", "npz", "parquet"],
+                            help="Output format (default: from the output file's extension, else csv).")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: all cores).")
+        parser.add_argument("--chunk-size", type=int, default=64, help="Logs per task (default 64).")
+        parser.add_argument("--top", type=int, default=0, help="Only the N fastest activities per player (default all).")
+        parser.add_argument("--account", choices=["auto", "main", "iron"], default="auto",
+                            help="Rates to use; auto takes each log's accountType (default).")
+
+    def handle(self, *args, **options):
+        from log_importer.obtained import slot_map
+        from log_importer.ranking import _resolve_rates, activity_arrays
+
+        output_format = options["format"] or os.path.splitext(options["output"])[1].lstrip(".").lower()
+        if output_format not in ("csv", "npz", "parquet"):
+            output_format = "csv"
+        if output_format == "parquet" and pyarrow is None:
+            raise CommandError("Parquet output needs pyarrow (pip install pyarrow); use --format csv or npz.")
+
+        arrays = activity_arrays.get()
+        tables = (arrays, slot_map.get(), _resolve_rates(arrays, False, None), _resolve_rates(arrays, True, None))
+        sources = self.sources(options["source"])
+        chunk_size = max(1, options["chunk_size"])
+        chunks = [sources[start:start + chunk_size] for start in range(0, len(sources), chunk_size)]
+        top = options["top"] or arrays.activity_count
+        workers = max(1, options["workers"])
+
+        started = time.perf_counter()
+        players = rows = 0
+        errors = []
+        parts = {column: [] for column in COLUMNS}
+        with ExitStack() as stack:
+            if output_format == "csv":
+                # CSV chunks are written as they come in; columnar output is written at the end
+                out = stack.enter_context(open(options["output"], "w", newline="", encoding="utf-8"))
+                csv.writer(out).writerow(COLUMNS)
+            pool = stack.enter_context(ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(pickle.dumps(tables),)
+            ))
+            # map() hands results back in input order, so the output order is stable
+            results = pool.map(
+                _rank_chunk, chunks, [options["account"]] * len(chunks), [top] * len(chunks),
+                [output_format] * len(chunks),
+            )
+            for output, chunk_players, chunk_errors in results:
+                if output_format == "csv":
+                    out.write(output)
+                else:
+                    for column in COLUMNS:
+                        parts[column].append(output[column])
+                rows += chunk_players * min(top, arrays.activity_count)
+                players += chunk_players
+                errors.extend(chunk_errors)
+        if output_format == "parquet":
+            pyarrow.parquet.write_table(
+                pyarrow.table({column: np.concatenate(values or [np.array([])]) for column, values in parts.items()}), options["output"]
+            )
+        elif output_format == "npz":
+            with open(options["output"], "wb") as f:
+                np.savez_compressed(f, **{column: np.concatenate(values or [np.array([])]) for column, values in parts.items()})
+        elapsed = time.perf_counter() - started
+
+        for name, message in errors[:20]:
+            self.stdout.write(self.style.WARNING(f"Skipped {name}: {message}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {players} logs ({rows} rows, {len(errors)} skipped) into {options['output']} in {elapsed:.1f}s: "
+            f"{players / elapsed:.0f} logs/s, {players / elapsed / workers:.0f} per worker"
+        ))
+
+    def sources(self, source):
+        """ (name, path, None) per .json file in a directory, or (name, None, line) per NDJSON line. """
+        if os.path.isdir(source):
+            names = sorted(name for name in os.listdir(source) if name.endswith(".json"))
+            return [(os.path.splitext(name)[0], os.path.join(source, name), None) for name in names]
+        if not os.path.isfile(source):
+            raise CommandError(f"{source} is neither a directory nor a file")
+        with open(source, "r", encoding="utf-8") as f:
+            return [(f"line {n}", None, line) for n, line in enumerate(f, start=1) if line.strip()]
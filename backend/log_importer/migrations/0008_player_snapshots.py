@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 13:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('log_importer', '0007_dataversion_source_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Player',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('username', models.CharField(max_length=64)),
+                ('account_type', models.CharField(blank=True, default='', max_length=64)),
+                ('unique_obtained', models.IntegerField(default=0)),
+                ('unique_items', models.IntegerField(default=0)),
+                ('snapshot_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('version', models.IntegerField(default=0)),
+                ('fetched_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='date',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='tab',
+            name='player',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tabs', to='log_importer.player'),
+        ),
+        migrations.AddConstraint(
+            model_name='item',
+            constraint=models.UniqueConstraint(fields=('log_entry', 'item_id'), name='unique_item_per_log_entry'),
+        ),
+        migrations.AddConstraint(
+            model_name='killcount',
+            constraint=models.UniqueConstraint(fields=('log_entry', 'sequence'), name='unique_killcount_per_log_entry'),
+        ),
+        migrations.AddConstraint(
+            model_name='logentry',
+            constraint=models.UniqueConstraint(fields=('tab', 'name'), name='unique_log_entry_per_tab'),
+        ),
+        migrations.AddConstraint(
+            model_name='tab',
+            constraint=models.UniqueConstraint(fields=('player', 'name'), name='unique_tab_per_player'),
+        ),
+    ]
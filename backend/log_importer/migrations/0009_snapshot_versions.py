@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('log_importer', '0008_player_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='changed_version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='resync_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 13:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('log_importer', '0009_snapshot_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='obtained',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='obtained_slots_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
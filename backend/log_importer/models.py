@@ -1,9 +1,31 @@
 from django.db import models
 
+class Player(models.Model):
+    key = models.CharField(max_length=64, unique=True)  # normalized username
+    username = models.CharField(max_length=64)
+    account_type = models.CharField(max_length=64, blank=True, default="")
+    unique_obtained = models.IntegerField(default=0)
+    unique_items = models.IntegerField(default=0)
+    snapshot_hash = models.CharField(max_length=64, blank=True, default="")
+    version = models.IntegerField(default=0)
+    # Clients holding a version older than this need the full log, not a delta
+    resync_version = models.IntegerField(default=0)
+    # Packed ObtainedSet bitmap of the snapshot, and the item_slots.json version it was written against
+    obtained = models.BinaryField(blank=True, default=b"")
+    obtained_slots_version = models.IntegerField(default=0)
+    fetched_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.username
+
 class Tab(models.Model):
+    player = models.ForeignKey(Player, related_name='tabs', on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=255)
     is_updated = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['player', 'name'], name='unique_tab_per_player')]
+
     def __str__(self):
         return self.name
 
@@ -12,6 +34,9 @@ class LogEntry(models.Model):
     name = models.CharField(max_length=255)
     is_updated = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['tab', 'name'], name='unique_log_entry_per_tab')]
+
     def __str__(self):
         return f"{self.tab.name} - {self.name}"
 
@@ -21,7 +46,12 @@ class Item(models.Model):
     name = models.CharField(max_length=255)
     quantity = models.IntegerField(default=0)
     obtained = models.BooleanField(default=False)
+    date = models.CharField(max_length=32, blank=True, null=True)
     sequence = models.IntegerField()
+    changed_version = models.IntegerField(default=0)  # player snapshot version that last changed this slot
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['log_entry', 'item_id'], name='unique_item_per_log_entry')]
 
     def __str__(self):
         return f"{self.name} - {self.log_entry.name}"
@@ -32,6 +62,9 @@ class KillCount(models.Model):
     amount = models.IntegerField(default=0)
     sequence = models.IntegerField()
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['log_entry', 'sequence'], name='unique_killcount_per_log_entry')]
+
     def __str__(self):
         return f"{self.name} - {self.amount} kills"
 
@@ -73,3 +106,12 @@ class ActivityMap(models.Model):
 
     def __str__(self):
         return f"{self.activity_name} - {self.item_name} (Item ID: {self.item_id})"
+
+class DataVersion(models.Model):
+    key = models.CharField(max_length=64, unique=True)
+    version = models.IntegerField(default=0)
+    source_hash = models.CharField(max_length=64, blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} - v{self.version}"
@@ -0,0 +1,207 @@
+import base64
+import json
+import os
+import numpy as np
+from .jsonio import atomic_write_json
+from .static_data import STATIC_DIR, WatchedFile
+
+SLOTS_FILE = "item_slots.json"
+
+
+class SlotMap:
+    """
+    Fixed bit position for every collection log item id, read from item_slots.json.
+
+    The file is append-only: generate_items adds new ids at the end and bumps
+    `version`, so a slot never moves and a bitmap written against an older version
+    is still valid under a newer one (its missing tail is just zeros).
+    """
+
+    def __init__(self, version, item_ids):
+        self.version = version
+        self.item_ids = np.array(item_ids, dtype=np.int64)
+        self.size = len(self.item_ids)
+        self.slot_of = {int(item_id): slot for slot, item_id in enumerate(self.item_ids)}
+        # Sorted copy for vectorized id -> slot lookups
+        self._order = np.argsort(self.item_ids, kind="stable")
+        self._sorted_ids = self.item_ids[self._order]
+
+    @classmethod
+    def from_bytes(cls, raw):
+        data = json.loads(raw)
+        return cls(data["version"], data["slots"])
+
+    def slots(self, item_ids):
+        """ Slot of each id in an int array, -1 for ids that have none. """
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        if not self.size:
+            return np.full(item_ids.shape, -1, dtype=np.int64)
+        position = np.searchsorted(self._sorted_ids, item_ids)
+        position = np.minimum(position, self.size - 1)
+        found = self._sorted_ids[position] == item_ids
+        return np.where(found, self._order[position], -1)
+
+
+slot_map = WatchedFile(SLOTS_FILE, SlotMap.from_bytes)
+
+
+class ObtainedSet:
+    """
+    The obtained items of one collection log as a bitset over SlotMap slots.
+
+    Membership is a dict lookup plus an array read, &, |, - and ^ combine two sets
+    slot-wise, and len() is a popcount. Serialized, it is the packed bitmap in
+    base64 (about 270 characters for 1,600 slots) plus the SlotMap version.
+    """
+
+    __slots__ = ("slot_map", "bits")
+
+    def __init__(self, slot_map, bits=None):
+        self.slot_map = slot_map
+        self.bits = np.zeros(slot_map.size, dtype=bool) if bits is None else bits
+
+    @classmethod
+    def from_ids(cls, slot_map, item_ids):
+        """ Ids without a slot (not in the collection log) are ignored. """
+        obtained = cls(slot_map)
+        ids = []
+        for item_id in item_ids:
+            try:
+                ids.append(int(item_id))
+            except (TypeError, ValueError):
+                continue
+        slots = slot_map.slots(ids)
+        obtained.bits[slots[slots >= 0]] = True
+        return obtained
+
+    @classmethod
+    def from_player_log(cls, slot_map, player_log):
+        """ The items with a positive count anywhere in a regrouped player log. """
+        return cls.from_ids(slot_map, (
+            item["id"]
+            for subcats in player_log["sections"].values()
+            for entry in subcats.values()
+            for item in entry["items"]
+            if (item.get("count") or 0) > 0
+        ))
+
+    @classmethod
+    def from_bytes(cls, slot_map, packed, version):
+        """ Reads a packed bitmap written against SlotMap `version` (at most slot_map.version). """
+        if version > slot_map.version:
+            raise ValueError(f"Bitmap uses item slots v{version}, this server has v{slot_map.version}")
+        bits = np.unpackbits(np.frombuffer(packed, dtype=np.uint8), bitorder="little").astype(bool)
+        if len(bits) < slot_map.size:
+            bits = np.concatenate([bits, np.zeros(slot_map.size - len(bits), dtype=bool)])
+        return cls(slot_map, bits[:slot_map.size])
+
+    @classmethod
+    def from_base64(cls, slot_map, encoded, version):
+        try:
+            packed = base64.b64decode(encoded, validate=True)
+        except (TypeError, ValueError):
+            raise ValueError("Bitmap is not valid base64")
+        return cls.from_bytes(slot_map, packed, version)
+
+    @classmethod
+    def from_json(cls, slot_map, data):
+        """ Inverse of to_json(): {"version": int, "bits": base64}. """
+        if not isinstance(data, dict) or not isinstance(data.get("version"), int):
+            raise ValueError("obtained must be {\"version\": int, \"bits\": str}")
+        return cls.from_base64(slot_map, data.get("bits") or "", data["version"])
+
+    def to_bytes(self):
+        return np.packbits(self.bits, bitorder="little").tobytes()
+
+    def to_base64(self):
+        return base64.b64encode(self.to_bytes()).decode("ascii")
+
+    def to_json(self):
+        return {"version": self.slot_map.version, "bits": self.to_base64()}
+
+    def __contains__(self, item_id):
+        slot = self.slot_map.slot_of.get(int(item_id))
+        return slot is not None and bool(self.bits[slot])
+
+    def __len__(self):
+        return int(np.count_nonzero(self.bits))
+
+    def __eq__(self, other):
+        if not isinstance(other, ObtainedSet):
+            return NotImplemented
+        a, b = self._align(other)
+        return np.array_equal(a, b)
+
+    def _align(self, other):
+        """ Both bit arrays, the shorter zero-padded, for sets read under different SlotMap versions. """
+        a, b = self.bits, other.bits
+        if len(a) < len(b):
+            a = np.concatenate([a, np.zeros(len(b) - len(a), dtype=bool)])
+        elif len(b) < len(a):
+            b = np.concatenate([b, np.zeros(len(a) - len(b), dtype=bool)])
+        return a, b
+
+    def _combine(self, other, op):
+        a, b = self._align(other)
+        slot_map = self.slot_map if self.slot_map.size >= other.slot_map.size else other.slot_map
+        return ObtainedSet(slot_map, op(a, b))
+
+    def __and__(self, other):
+        return self._combine(other, np.logical_and)
+
+    def __or__(self, other):
+        return self._combine(other, np.logical_or)
+
+    def __sub__(self, other):
+        return self._combine(other, lambda a, b: a & ~b)
+
+    def __xor__(self, other):
+        return self._combine(other, np.logical_xor)
+
+    def add(self, item_id):
+        slot = self.slot_map.slot_of.get(int(item_id))
+        if slot is None:
+            raise KeyError(item_id)
+        self.bits[slot] = True
+
+    def discard(self, item_id):
+        slot = self.slot_map.slot_of.get(int(item_id))
+        if slot is not None:
+            self.bits[slot] = False
+
+    def copy(self):
+        return ObtainedSet(self.slot_map, self.bits.copy())
+
+    def item_ids(self):
+        """ Obtained ids in slot order. """
+        return self.slot_map.item_ids[np.flatnonzero(self.bits)]
+
+    def mask(self, slots):
+        """ Obtained flag for each slot in an array from SlotMap.slots() (-1 is never obtained). """
+        slots = np.asarray(slots, dtype=np.int64)
+        return np.where(slots >= 0, self.bits[np.maximum(slots, 0)], False) if self.slot_map.size \
+            else np.zeros(slots.shape, dtype=bool)
+
+
+def extend_slot_file(item_ids, path=None):
+    """
+    Appends ids missing from item_slots.json (in the given order) and bumps its
+    version. Existing slots are never reordered or removed. Returns (version, added).
+    """
+    path = path or os.path.join(STATIC_DIR, SLOTS_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {"version": 0, "slots": []}
+    known = set(data["slots"])
+    added = []
+    for item_id in item_ids:
+        item_id = int(item_id)
+        if item_id not in known:
+            known.add(item_id)
+            added.append(item_id)
+    if added:
+        data = {"version": data["version"] + 1, "slots": data["slots"] + added}
+        atomic_write_json(path, data, indent=None)
+    return data["version"], added
@@ -0,0 +1,64 @@
+import numpy as np
+from .completion import activity_models
+from .ranking import _resolve_rates, activity_arrays
+from .ranking_sessions import new_session
+
+
+def plan_route(completed_items, is_iron=False, user_completion_rates=None, disabled_activities=(),
+               target_slots=None, max_hours=None, max_steps=1000):
+    """
+    Greedy schedule of activity steps: repeatedly takes the activity rank_activities
+    would put first and charges the expected hours to its next new slot, whichever
+    slot that turns out to be. A step names the slot most likely to be that one
+    (`item_id`, with its `probability`), and the plan then marks it obtained. Stops
+    after target_slots steps, before the total would pass max_hours, at max_steps, or
+    when no enabled activity has a numeric time left.
+
+    Runs on a RankingSession, so each step rescores only the activities that drop the
+    new item and reads the next one off the session's heap. As in simulation.py, the
+    ranking always includes the extra time to first completion, but only the first
+    visit to an activity is charged it, and activities without a completion rate (or
+    without any slot ActivityModel.next_slot can time) are skipped. A step's hours
+    are ActivityModel.next_slot's expected completions over the completions per hour.
+    """
+    arrays = activity_arrays.get()
+    rates, _ = _resolve_rates(arrays, is_iron, user_completion_rates)
+    unscheduled = {arrays.activity_names[i] for i in np.flatnonzero(rates <= 0)}
+    session = new_session(completed_items, is_iron, user_completion_rates, set(disabled_activities) | unscheduled)
+    arrays = session.arrays
+    models = activity_models.get()
+    limit = min(target_slots, max_steps) if target_slots is not None else max_steps
+    plan, total_hours, visited = [], 0.0, set()
+    # Completions spent on each activity since its last exact-only slot came in
+    progress = {}
+
+    while len(plan) < limit:
+        i = session.peek()
+        if i is None:
+            break
+        next_slot = models[i].next_slot(session.obtained_mask, progress.get(i, 0.0))
+        if next_slot is None:
+            session.disable(i)
+            continue
+        completions, row, probability = next_slot
+        hours = completions / session.rates[i] + (session.extra[i] if i not in visited else 0.0)
+        if max_hours is not None and total_hours + hours > max_hours:
+            break
+        total_hours += hours
+        item_id = int(arrays.item_ids[row])
+        plan.append({
+            "step": len(plan) + 1,
+            "activity_name": arrays.activity_names[i],
+            "item_id": item_id,
+            "item_name": arrays.item_names[row] or "-",
+            "probability": probability,
+            "hours": float(hours),
+            "total_hours": float(total_hours),
+        })
+
+        visited.add(i)
+        # The next exact-only slot counts its attempts from here; the others run on
+        sequential = arrays.exact[row] and not arrays.independent[row]
+        progress[i] = 0.0 if sequential else progress.get(i, 0.0) + completions
+        session.obtain([item_id])
+    return plan
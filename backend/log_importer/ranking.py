@@ -0,0 +1,418 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from .models import CompletionRate, ActivityMap
+from .activity_data import ACTIVITIES, VersionedValue, data_source_hash
+from .obtained import ObtainedSet
+
+DONE = 'Done!'
+NO_DATA = 'No available data'
+
+
+# ActivityArrays.flags bits
+EXACT, INDEPENDENT, REQUIRES_PREVIOUS = 1, 2, 4
+
+# Column dtypes of an ActivityArrays, and of the .npy files it is saved as
+ACTIVITY_COLUMNS = {
+    "completions_per_hour_main": np.float64,
+    "completions_per_hour_iron": np.float64,
+    "extra_time_to_first_completion": np.float64,
+    "row_offsets": np.int64,
+    "item_ids": np.int32,
+    "drop_rate_attempts": np.float64,
+    "neither_inverse": np.float64,
+    "flags": np.uint8,
+}
+NAMES_FILE = "names.json"
+
+
+class ActivityArrays:
+    """
+    Column arrays for every ActivityMap row, grouped by activity.
+    Rows are ordered by activity and then by their sequence in the CSV import,
+    which is the same order get_activities_data hands to the frontend.
+
+    Per activity there are rates and CSR offsets (activity i owns rows
+    row_offsets[i]:row_offsets[i + 1]); per row an int32 item id, float64 drop
+    rates and a uint8 flags bitfield (EXACT, INDEPENDENT, REQUIRES_PREVIOUS). save()
+    writes the columns as .npy files that load() memory-maps read-only, so every
+    worker process shares one copy through the page cache.
+    """
+
+    def __init__(self, columns, activity_names, item_names):
+        self.activity_names = activity_names
+        self.item_names = item_names
+        for name in ACTIVITY_COLUMNS:
+            setattr(self, name, columns[name])
+
+        self.activity_count = len(activity_names)
+        self.map_counts = np.diff(self.row_offsets)
+        self.row_activity = np.repeat(np.arange(self.activity_count, dtype=np.int32), self.map_counts)
+        self.exact = (self.flags & EXACT) != 0
+        self.independent = (self.flags & INDEPENDENT) != 0
+        self.requires_previous = (self.flags & REQUIRES_PREVIOUS) != 0
+        self.item_rows = {}
+        for row, item_id in enumerate(self.item_ids.tolist()):
+            self.item_rows.setdefault(item_id, []).append(row)
+        self._slots = None
+
+    def item_slots(self, slots):
+        """
+        The SlotMap slot of every row's item, cached per SlotMap. Raises
+        ImproperlyConfigured if an item has no slot, since a bitmap could never mark
+        it obtained.
+        """
+        cached = self._slots
+        if cached is None or cached[0] is not slots:
+            row_slots = slots.slots(self.item_ids)
+            unmapped = sorted(set(self.item_ids[row_slots < 0].tolist()))
+            if unmapped:
+                raise ImproperlyConfigured(
+                    f"Activity map items without a slot in item_slots.json: {unmapped}; "
+                    "rerun import_completion_rates to add them"
+                )
+            cached = self._slots = (slots, row_slots)
+        return cached[1]
+
+    @classmethod
+    def from_rows(cls, activities, maps):
+        """ From CompletionRate and ActivityMap value dicts, maps sorted by activity id then sequence. """
+        position = {a["id"]: i for i, a in enumerate(activities)}
+        row_activity = np.array([position[m["completion_rate_id"]] for m in maps], dtype=np.int64)
+        map_counts = np.bincount(row_activity, minlength=len(activities))
+        columns = {
+            "completions_per_hour_main": [a["completions_per_hour_main"] or 0.0 for a in activities],
+            "completions_per_hour_iron": [a["completions_per_hour_iron"] or 0.0 for a in activities],
+            "extra_time_to_first_completion": [a["extra_time_to_first_completion"] or 0.0 for a in activities],
+            "row_offsets": np.concatenate([[0], np.cumsum(map_counts)]),
+            "item_ids": [m["item_id"] for m in maps],
+            "drop_rate_attempts": [m["drop_rate_attempts"] or 0.0 for m in maps],
+            "neither_inverse": [m["neither_inverse"] or 0.0 for m in maps],
+            "flags": [
+                (EXACT if m["exact"] else 0) | (INDEPENDENT if m["independent"] else 0)
+                | (REQUIRES_PREVIOUS if m["requires_previous"] else 0)
+                for m in maps
+            ],
+        }
+        columns = {name: np.array(columns[name], dtype=dtype) for name, dtype in ACTIVITY_COLUMNS.items()}
+        return cls(columns, [a["activity_name"] for a in activities], [m["item_name"] for m in maps])
+
+    @classmethod
+    def from_db(cls):
+        activities = list(CompletionRate.objects.order_by("id").values(
+            "id",
+            "activity_name",
+            "completions_per_hour_main",
+            "completions_per_hour_iron",
+            "extra_time_to_first_completion",
+        ))
+        maps = list(ActivityMap.objects.order_by("completion_rate_id", "sequence", "id").values(
+            "completion_rate_id",
+            "item_id",
+            "item_name",
+            "drop_rate_attempts",
+            "neither_inverse",
+            "exact",
+            "independent",
+            "requires_previous",
+        ))
+        return cls.from_rows(activities, maps)
+
+    def save(self, path):
+        """
+        Writes the table to directory `path`, atomically: it is assembled next to it
+        and renamed into place. Returns False if another process got there first.
+        """
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=parent, prefix=".building-")
+        try:
+            for name in ACTIVITY_COLUMNS:
+                np.save(os.path.join(staging, f"{name}.npy"), getattr(self, name), allow_pickle=False)
+            with open(os.path.join(staging, NAMES_FILE), "w", encoding="utf-8") as f:
+                json.dump({"activities": self.activity_names, "items": self.item_names}, f)
+            os.rename(staging, path)
+            return True
+        except OSError:
+            if os.path.isdir(path):
+                return False
+            raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path):
+        """ A table written by save(), its columns memory-mapped read-only. """
+        # Plain ndarray views, so results computed from them are not np.memmap instances
+        columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r").view(np.ndarray)
+            for name in ACTIVITY_COLUMNS
+        }
+        with open(os.path.join(path, NAMES_FILE), "r", encoding="utf-8") as f:
+            names = json.load(f)
+        return cls(columns, names["activities"], names["items"])
+
+
+def activity_table_path(version):
+    """
+    Where the table for this data version lives under ACTIVITY_TABLE_DIR (None when
+    unset). The database is part of the key, so dev and test DBs never share a file.
+    """
+    directory = getattr(settings, "ACTIVITY_TABLE_DIR", "")
+    if not directory:
+        return None
+    key = f"{settings.DATABASES['default'].get('NAME')}|{version}|{data_source_hash(ACTIVITIES)}"
+    return os.path.join(directory, "v%d-%s" % (version, hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]))
+
+
+def load_activity_arrays(version):
+    """
+    The ActivityArrays for a data version: memory-mapped from ACTIVITY_TABLE_DIR,
+    built from the DB and saved there by the first process that needs it. Tables of
+    older versions are removed (processes still mapping them keep their pages).
+    """
+    path = activity_table_path(version)
+    if path is None:
+        return ActivityArrays.from_db()
+    if not os.path.isdir(path):
+        ActivityArrays.from_db().save(path)
+        for name in os.listdir(os.path.dirname(path)):
+            stale = os.path.join(os.path.dirname(path), name)
+            if stale != path and name.startswith("v"):
+                shutil.rmtree(stale, ignore_errors=True)
+    return ActivityArrays.load(path)
+
+
+activity_arrays = VersionedValue(ACTIVITIES, load_activity_arrays)
+
+
+def _to_float(value, default):
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _resolve_rates(arrays, is_iron, user_completion_rates):
+    """
+    Per-activity completions/hr and extra hours, with user overrides applied the
+    same way calculateActivityData merges userCompletionRates over the defaults.
+    """
+    rates = (arrays.completions_per_hour_iron if is_iron else arrays.completions_per_hour_main).copy()
+    extra = arrays.extra_time_to_first_completion.copy()
+    if not user_completion_rates:
+        return rates, extra
+
+    rate_key = "completions_per_hour_iron" if is_iron else "completions_per_hour_main"
+    for i, name in enumerate(arrays.activity_names):
+        override = user_completion_rates.get(name)
+        if not override:
+            continue
+        rates[i] = _to_float(override.get(rate_key), rates[i])
+        # calculateActivityData takes `userExtra || defaultExtra`, so a user 0 keeps the default
+        extra[i] = _to_float(override.get("extra_time_to_first_completion"), 0.0) or extra[i]
+    return rates, extra
+
+
+def score_activities(arrays, obtained_mask, rates, extra):
+    """
+    Vectorized equivalent of calculateTimeToNextLogSlot and findNextFastestItem
+    for every activity at once.
+
+    Returns (days, status, fastest_row) arrays, where status is 0 for a numeric
+    result, 1 for 'Done!' and 2 for 'No available data', and fastest_row is the
+    ActivityMap row of the fastest missing slot (-1 if none).
+    """
+    days, status, fastest_row = score_players(arrays, obtained_mask[None], rates, extra)
+    return days[0], status[0], fastest_row[0]
+
+
+def score_players(arrays, obtained_masks, rates, extra):
+    """
+    score_activities for several players in one pass: obtained_masks is a (players, rows)
+    array and rates/extra are per activity or (players, activities). Returns
+    (players, activities) days, status and fastest_row arrays. Sums still run in row
+    order per player, so a player's scores do not depend on who else is in the batch.
+    """
+    n = arrays.activity_count
+    players = len(obtained_masks)
+    act = arrays.row_activity
+    missing = ~obtained_masks
+    drop = arrays.drop_rate_attempts
+    neither = arrays.neither_inverse
+    # Flattened (player, activity) cell of every (player, row), for one bincount over all players
+    cell = (np.arange(players)[:, None] * n + act).ravel()
+
+    def per_activity(weights):
+        return np.bincount(cell, weights=weights.ravel(), minlength=players * n).reshape(players, n)
+
+    missing_counts = per_activity(missing)
+    neither_sum = per_activity(np.where(missing & (neither > 0), neither, 0.0))
+    with np.errstate(divide="ignore"):
+        val_a = np.where(neither_sum > 0, 1.0 / neither_sum, np.nan)
+
+    # Per-activity minimums by reduceat over each activity's (contiguous) rows;
+    # activities without rows are left out, as reduceat cannot express empty segments
+    present = np.flatnonzero(arrays.map_counts > 0)
+    starts = arrays.row_offsets[present]
+
+    def lowest_per_activity(values):
+        lowest = np.full((players, n), np.inf)
+        if len(present):
+            lowest[:, present] = np.minimum.reduceat(values, starts, axis=1)
+        return lowest
+
+    val_b = lowest_per_activity(np.where(missing & (drop > 0), drop, np.inf))
+    val_b[np.isinf(val_b)] = np.nan
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        usable_rate = rates != 0
+        val_c = np.where(usable_rate, val_a / rates, np.nan)
+        val_d = np.where(usable_rate, val_b / rates, np.nan)
+
+    candidates = np.stack([val_a, val_b, val_c, val_d])
+    candidates = np.where(candidates > 0, candidates, np.inf)
+    min_time = candidates.min(axis=0)
+
+    status = np.zeros((players, n), dtype=np.int8)
+    status[np.isinf(min_time)] = 2
+    status[missing_counts == 0] = 1
+    status[:, arrays.map_counts == 0] = 2
+    days = np.where(status == 0, (min_time + extra) / 24, np.nan)
+
+    # Fastest slot: first missing row (in sequence order) with the lowest attempts.
+    masked_drop = np.where(missing, drop, np.inf)
+    lowest = lowest_per_activity(masked_drop)
+    is_candidate = missing & (masked_drop == lowest[:, act])
+    rows = len(act)
+    first = lowest_per_activity(np.where(is_candidate, np.arange(rows), rows))
+    fastest_row = np.where(first < rows, first, -1).astype(np.int64)
+
+    return days, status, fastest_row
+
+
+def score_activity(arrays, i, obtained_mask, rate, extra):
+    """
+    score_activities for activity `i` alone, looping over just its rows, so the cost
+    is proportional to its item count. Sums run in row order like np.bincount, so the
+    result is bit-for-bit the same as the vectorized pass.
+    """
+    start, end = arrays.row_offsets[i], arrays.row_offsets[i + 1]
+    if start == end:
+        return np.nan, 2, -1
+    # Plain Python lists of just this activity's rows: far cheaper to loop over than numpy scalars
+    drops = arrays.drop_rate_attempts[start:end].tolist()
+    neither = arrays.neither_inverse[start:end].tolist()
+    obtained = obtained_mask[start:end].tolist()
+
+    missing_count = 0
+    neither_sum = 0.0
+    lowest = np.inf
+    lowest_positive = np.inf
+    fastest_row = -1
+    for k, drop in enumerate(drops):
+        if obtained[k]:
+            continue
+        missing_count += 1
+        if neither[k] > 0:
+            neither_sum += neither[k]
+        if fastest_row < 0 or drop < lowest:
+            lowest = drop
+            fastest_row = start + k
+        if 0 < drop < lowest_positive:
+            lowest_positive = drop
+    if missing_count == 0:
+        return np.nan, 1, -1
+
+    val_a = 1.0 / neither_sum if neither_sum > 0 else np.nan
+    val_b = lowest_positive if lowest_positive < np.inf else np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        val_c = np.float64(val_a) / rate if rate != 0 else np.nan
+        val_d = np.float64(val_b) / rate if rate != 0 else np.nan
+    candidates = [value for value in (val_a, val_b, val_c, val_d) if value > 0]
+    if not candidates:
+        return np.nan, 2, fastest_row
+    return (min(candidates) + extra) / 24, 0, fastest_row
+
+
+def row_obtained_mask(arrays, obtained):
+    """
+    Per-row obtained flags, for an ObtainedSet straight off its bits, or for a list
+    of item ids by matching the rows' item ids (no slots involved).
+    """
+    if isinstance(obtained, ObtainedSet):
+        return obtained.mask(arrays.item_slots(obtained.slot_map))
+    return np.isin(arrays.item_ids, np.array(item_id_list(obtained), dtype=np.int64))
+
+
+def item_id_list(item_ids):
+    """ The integer ids in a client's list of item ids; anything that is not one is skipped. """
+    ids = []
+    for item_id in item_ids or []:
+        try:
+            ids.append(int(item_id))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def activity_result(arrays, i, status, days, fastest_row, rate, extra):
+    """ One calculateActivityData row from an activity's score. """
+    name = arrays.activity_names[i]
+    if arrays.map_counts[i] == 0:
+        return {
+            "activity_name": name,
+            "time_to_next_log_slot": NO_DATA,
+            "fastest_slot_name": "-",
+            "fastest_slot_id": None,
+        }
+
+    if status == 0:
+        time_to_next = float(days)
+    else:
+        time_to_next = DONE if status == 1 else NO_DATA
+    return {
+        "activity_name": name,
+        "time_to_next_log_slot": time_to_next,
+        "fastest_slot_name": (arrays.item_names[fastest_row] or "-") if fastest_row >= 0 else "-",
+        "fastest_slot_id": int(arrays.item_ids[fastest_row]) if fastest_row >= 0 else None,
+        "completions_per_hour": float(rate),
+        "extra_time_to_first_completion": float(extra),
+    }
+
+
+def rank_activities(completed_items, is_iron=False, user_completion_rates=None):
+    """
+    Scores every activity for the given obtained items (an ObtainedSet or a list of
+    item ids) and returns the rows calculateActivityData would produce, sorted fastest first.
+    """
+    arrays = activity_arrays.get()
+    obtained_mask = row_obtained_mask(arrays, completed_items)
+    rates, extra = _resolve_rates(arrays, is_iron, user_completion_rates)
+    days, status, fastest_row = score_activities(arrays, obtained_mask, rates, extra)
+
+    results = [
+        activity_result(arrays, i, status[i], days[i], fastest_row[i], rates[i], extra[i])
+        for i in range(arrays.activity_count)
+    ]
+
+    # Stable sort, non-numeric times last, matching updateNextFastestItem.
+    results.sort(key=lambda r: r["time_to_next_log_slot"]
+                 if isinstance(r["time_to_next_log_slot"], float) else float("inf"))
+    return results
+
+
+def next_fastest_item(ranked):
+    """ The first ranked activity with a positive time, as {id, name}. """
+    for activity in ranked:
+        time_to_next = activity["time_to_next_log_slot"]
+        if isinstance(time_to_next, float) and time_to_next > 0:
+            return {"id": activity["fastest_slot_id"], "name": activity["fastest_slot_name"]}
+    return {"id": None, "name": "-"}
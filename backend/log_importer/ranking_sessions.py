@@ -0,0 +1,184 @@
+import heapq
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from .obtained import ObtainedSet
+from .ranking import (
+    _resolve_rates, activity_arrays, activity_result, item_id_list, row_obtained_mask, score_activities,
+    score_activity,
+)
+
+
+class RankingSession:
+    """
+    Activity ranking for one client that ticks items off one at a time.
+
+    Built once with a full score_activities pass; after that obtain() only rescores
+    the activities that drop the item (through ActivityArrays.item_rows) and
+    re-pushes them on a heap keyed by time to next slot, so top(n) costs
+    O(k log n) for k changed activities instead of a rescore and sort of all of them.
+    Heap entries are invalidated lazily: an entry counts only while its key is still
+    the activity's current key.
+
+    `obtained` is an ObtainedSet or a set of item ids, kept in that form for refresh():
+    like rank_activities, ids are matched against the activity rows directly, so
+    items without a slot in item_slots.json still count.
+    """
+
+    def __init__(self, obtained, is_iron=False, user_completion_rates=None, disabled_activities=()):
+        self.is_iron = is_iron
+        self.user_completion_rates = user_completion_rates or {}
+        self.disabled_activities = set(disabled_activities)
+        self.lock = threading.Lock()
+        self._build(activity_arrays.get(), obtained)
+
+    def _build(self, arrays, obtained):
+        self.arrays = arrays
+        self.obtained = obtained.copy()
+        self.obtained_mask = row_obtained_mask(arrays, self.obtained).copy()
+        self.rates, self.extra = _resolve_rates(arrays, self.is_iron, self.user_completion_rates)
+        self.disabled = {i for i, name in enumerate(arrays.activity_names) if name in self.disabled_activities}
+        days, status, fastest_row = score_activities(arrays, self.obtained_mask, self.rates, self.extra)
+        self.scores = list(zip(days.tolist(), status.tolist(), fastest_row.tolist()))
+        self.keys = [self._key(i) for i in range(arrays.activity_count)]
+        self.heap = list(self.keys)
+        heapq.heapify(self.heap)
+
+    def _key(self, i):
+        days, status, _ = self.scores[i]
+        # Same order as rank_activities: by time, non-numeric (and disabled) last, ties by activity order
+        usable = status == 0 and self.arrays.map_counts[i] and i not in self.disabled
+        return (days if usable else float("inf"), i)
+
+    def refresh(self):
+        """ Rebuilds against the current activity data if import_completion_rates replaced it. """
+        arrays = activity_arrays.get()
+        if arrays is not self.arrays:
+            self._build(arrays, self.obtained)
+
+    def obtain(self, item_ids, obtained=True):
+        """
+        Marks items obtained (or missing again) and rescores only the activities that
+        drop them. Returns the indexes of the activities whose score changed.
+        """
+        arrays = self.arrays
+        touched = set()
+        for item_id in item_ids:
+            item_id = int(item_id)
+            if not obtained:
+                self.obtained.discard(item_id)
+            elif not isinstance(self.obtained, ObtainedSet) or item_id in self.obtained.slot_map.slot_of:
+                self.obtained.add(item_id)
+            for row in arrays.item_rows.get(item_id, ()):
+                if self.obtained_mask[row] != obtained:
+                    self.obtained_mask[row] = obtained
+                    touched.add(int(arrays.row_activity[row]))
+
+        return self.rescore(touched)
+
+    def rescore(self, indexes):
+        """ Rescores the given activities (e.g. after editing self.extra); returns the ones that changed. """
+        arrays = self.arrays
+        changed = []
+        for i in sorted(indexes):
+            score = score_activity(arrays, i, self.obtained_mask, self.rates[i], self.extra[i])
+            score = (float(score[0]), int(score[1]), int(score[2]))
+            old = self.scores[i]
+            if score[1:] == old[1:] and (score[1] != 0 or score[0] == old[0]):
+                continue  # days is NaN unless status is 0
+            self.scores[i] = score
+            key = self._key(i)
+            if key != self.keys[i]:
+                self.keys[i] = key
+                heapq.heappush(self.heap, key)
+            changed.append(i)
+
+        # Stale entries pile up as activities are re-pushed; compact once they dominate
+        if len(self.heap) > 4 * max(arrays.activity_count, 16):
+            self.heap = list(self.keys)
+            heapq.heapify(self.heap)
+        return changed
+
+    def disable(self, i):
+        """ Sorts activity i last from now on, as if it were in disabled_activities. """
+        self.disabled.add(i)
+        key = self._key(i)
+        if key != self.keys[i]:
+            self.keys[i] = key
+            heapq.heappush(self.heap, key)
+
+    def top(self, n):
+        """ The n fastest activities as rank_activities rows. """
+        return [self.result(key[1]) for key in self._top_keys(n)]
+
+    def peek(self):
+        """ Index of the fastest activity with a numeric time, or None. """
+        keys = self._top_keys(1)
+        return keys[0][1] if keys and keys[0][0] != float("inf") else None
+
+    def _top_keys(self, n):
+        taken, seen = [], set()
+        while self.heap and len(taken) < n:
+            key = heapq.heappop(self.heap)
+            i = key[1]
+            if self.keys[i] != key or i in seen:
+                continue  # superseded by a later push
+            seen.add(i)
+            taken.append(key)
+        for key in taken:
+            heapq.heappush(self.heap, key)
+        return taken
+
+    def result(self, i):
+        days, status, fastest_row = self.scores[i]
+        return activity_result(self.arrays, i, status, days, fastest_row, self.rates[i], self.extra[i])
+
+
+class RankingSessionStore:
+    """ Bounded LRU of RankingSessions by id; a session unused for `ttl` seconds expires. """
+
+    def __init__(self, ttl=1800, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, session):
+        session_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic(), session)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+        return session_id
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if now - entry[0] > self.ttl:
+                del self._sessions[session_id]
+                return None
+            self._sessions[session_id] = (now, entry[1])
+            self._sessions.move_to_end(session_id)
+        return entry[1]
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+def new_session(completed_items, is_iron=False, user_completion_rates=None, disabled_activities=()):
+    """ A RankingSession from an ObtainedSet or a list of obtained item ids. """
+    if not isinstance(completed_items, ObtainedSet):
+        completed_items = set(item_id_list(completed_items))
+    return RankingSession(completed_items, is_iron, user_completion_rates, disabled_activities)
+
+
+ranking_sessions = RankingSessionStore(
+    ttl=getattr(settings, "RANKING_SESSION_TTL", 1800),
+    max_entries=getattr(settings, "RANKING_SESSION_MAX_ENTRIES", 1000),
+)
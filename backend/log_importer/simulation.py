@@ -0,0 +1,313 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 256
+
+# Row kinds: an exponential arrival, a fixed number of completions, or never
+RANDOM, FIXED, NEVER = 0, 1, 2
+
+
+class SimulationTables:
+    """
+    Everything a trial needs, as plain arrays so it pickles cheaply to pool workers.
+
+    Rows are the ActivityMap rows of the activities that have any, grouped by
+    activity (starts[i] is activity i's first row). Each trial draws an arrival, in
+    completions of that row's activity, for every row: exponential with mean
+    drop_rate_attempts for random slots (added onto the previous slot's for
+    requires_previous ones), fixed for exact slots, never for slots without a rate.
+    The simulated player then repeatedly does the enabled activity rank_activities
+    puts first and collects its next arrival.
+    """
+
+    def __init__(self, activity_index, row_activity, row_item, starts, attempts, neither, kind, offset, pred,
+                 completions_per_hour, extra, enabled, obtained_items):
+        self.activity_index = activity_index
+        self.row_activity = row_activity
+        self.row_item = row_item
+        self.starts = starts
+        self.attempts = attempts
+        self.neither = neither
+        self.kind = kind
+        self.offset = offset
+        self.pred = pred
+        self.completions_per_hour = completions_per_hour
+        self.extra = extra
+        self.enabled = enabled
+        self.obtained_items = obtained_items
+
+        # Padded views for updating single (trial, activity) pairs: activity_rows[a] lists
+        # a's rows and item_rows[u] the rows of item u, both padded with a dummy row
+        # (index `rows`) that is never missing and belongs to a dummy activity.
+        rows = len(kind)
+        counts = np.diff(np.append(starts, rows))
+        self.activity_rows = np.full((len(starts), counts.max(initial=1)), rows, dtype=np.int64)
+        for a, (start, count) in enumerate(zip(starts, counts)):
+            self.activity_rows[a, :count] = np.arange(start, start + count)
+        per_item = np.bincount(row_item, minlength=len(obtained_items))
+        self.item_rows = np.full((len(obtained_items), per_item.max(initial=1)), rows, dtype=np.int64)
+        filled = np.zeros(len(obtained_items), dtype=np.int64)
+        for row, u in enumerate(row_item.tolist()):
+            self.item_rows[u, filled[u]] = row
+            filled[u] += 1
+
+    @classmethod
+    def build(cls, arrays, models, obtained_mask, rates, extra, disabled=()):
+        """
+        From ActivityArrays and its completion.ActivityModels, a per-row obtained mask
+        and the resolved rates; `disabled` holds activity names the player skips.
+        """
+        row_count = len(arrays.item_ids)
+        unique_ids, row_item = np.unique(arrays.item_ids, return_inverse=True)
+        obtained_items = np.zeros(len(unique_ids), dtype=bool)
+        obtained_items[row_item[obtained_mask]] = True
+
+        kind = np.full(row_count, NEVER, dtype=np.int8)
+        offset = np.zeros(row_count)
+        pred = np.full(row_count, -1, dtype=np.int64)
+        for model in models:
+            kind[model.random_rows] = RANDOM
+            for k, previous in enumerate(model.pred):
+                if previous >= 0 and not obtained_mask[model.random_rows[previous]]:
+                    pred[model.random_rows[k]] = model.random_rows[previous]
+            # Exact-only slots come one after another; exact-and-independent ones follow their chain
+            sequential = 0.0
+            for k, row in enumerate(model.exact_rows):
+                kind[row] = FIXED
+                if obtained_mask[row]:
+                    continue
+                if model.exact_parallel[k]:
+                    offset[row] = model.exact_attempts[k]
+                    previous = model.exact_pred[k]
+                    if previous >= 0 and not obtained_mask[model.exact_rows[previous]]:
+                        pred[row] = model.exact_rows[previous]
+                else:
+                    sequential += model.exact_attempts[k]
+                    offset[row] = sequential
+
+        # reduceat needs strictly increasing starts, so activities without rows are left out
+        activity_index = np.flatnonzero(arrays.map_counts > 0)
+        position = np.full(arrays.activity_count, -1, dtype=np.int64)
+        position[activity_index] = np.arange(len(activity_index))
+        enabled = np.array([arrays.activity_names[i] not in disabled for i in activity_index], dtype=bool)
+        return cls(
+            activity_index=activity_index,
+            row_activity=position[arrays.row_activity],
+            row_item=row_item,
+            starts=arrays.row_offsets[activity_index].copy(),
+            attempts=arrays.drop_rate_attempts,
+            neither=arrays.neither_inverse,
+            kind=kind,
+            offset=offset,
+            pred=pred,
+            completions_per_hour=rates[activity_index],
+            extra=extra[activity_index],
+            enabled=enabled & (rates[activity_index] > 0),
+            obtained_items=obtained_items,
+        )
+
+    def draw_arrivals(self, rng, size):
+        """ (size, rows) arrival completions for a batch of trials. """
+        arrivals = rng.standard_exponential((size, len(self.kind))) * np.where(self.kind == RANDOM, self.attempts, 0.0)
+        arrivals[:, self.kind == FIXED] = self.offset[self.kind == FIXED]
+        arrivals[:, self.kind == NEVER] = np.inf
+        # Rows only follow earlier rows, so one pass in row order resolves whole chains
+        for row in np.flatnonzero(self.pred >= 0):
+            arrivals[:, row] += arrivals[:, self.pred[row]]
+        return arrivals
+
+    def rank_key(self, activity, neither_sum, neither_left, lowest, next_arrival):
+        """
+        score_activities' ranking key for activities (any array shape) from the sum
+        and count of their missing neither_inverse rows, their lowest missing
+        drop_rate_attempts and next arrival. inf for disabled activities, finished
+        ones and ones whose remaining slots can never drop.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            val_a = np.where((neither_left > 0) & (neither_sum > 0), 1.0 / neither_sum, np.inf)
+            rate = self.completions_per_hour[activity]
+            key = np.full(np.shape(val_a), np.inf)
+            for value in (val_a, lowest, val_a / rate, lowest / rate):
+                key = np.minimum(key, np.where(value > 0, value, np.inf))
+        usable = self.enabled[activity] & np.isfinite(next_arrival)
+        return np.where(usable, key + self.extra[activity], np.inf)
+
+
+def _padded(values, fill):
+    """ `values` (B, rows) with a trailing column for the dummy padding row. """
+    return np.concatenate([values, np.full((len(values), 1), fill, dtype=values.dtype)], axis=1)
+
+
+def _simulate(tables, target, size, seed):
+    """
+    Hours for each of `size` trials to reach 1..target new slots: a (size, target) array.
+
+    Per (trial, activity) the missing neither_inverse sum and count, lowest missing
+    attempts, next arrival (and its row) and ranking key are kept up to date as items
+    come in: the new item's rows are subtracted out, an activity's rows are only
+    rescanned when the row removed held its minimum, and only the activities that
+    drop the item are re-keyed.
+    """
+    rng = np.random.default_rng(seed)
+    trials = np.arange(size)
+    activity_count = len(tables.starts)
+    columns = activity_count + 1  # a dummy activity the padding rows belong to
+    dummy_row = len(tables.row_item)
+    row_item = np.append(tables.row_item, len(tables.obtained_items))
+    row_activity = np.append(tables.row_activity, activity_count)
+    obtained = np.tile(np.append(tables.obtained_items, True), (size, 1))
+    neither = np.append(np.where(tables.neither > 0, tables.neither, 0.0), 0.0)
+    attempts = np.append(np.where(tables.attempts > 0, tables.attempts, np.inf), np.inf)
+    arrivals = _padded(tables.draw_arrivals(rng, size), np.inf)
+
+    missing = ~obtained[:, row_item]
+    neither_sum = _padded(np.add.reduceat(np.where(missing, neither, 0.0)[:, :-1], tables.starts, axis=1), 0.0)
+    neither_left = _padded(np.add.reduceat((missing & (neither > 0))[:, :-1], tables.starts, axis=1), 0)
+    lowest = np.full((size, columns), np.inf)
+    next_arrival = np.full((size, columns), np.inf)
+    next_row = np.full((size, columns), dummy_row)
+
+    def rescan(pair_trial, pair_activity):
+        rows = tables.activity_rows[pair_activity]
+        still_missing = ~obtained[pair_trial[:, None], row_item[rows]]
+        lowest[pair_trial, pair_activity] = np.where(still_missing, attempts[rows], np.inf).min(axis=1)
+        pending = np.where(still_missing, arrivals[pair_trial[:, None], rows], np.inf)
+        first = pending.argmin(axis=1)
+        next_arrival[pair_trial, pair_activity] = pending[np.arange(len(first)), first]
+        next_row[pair_trial, pair_activity] = rows[np.arange(len(first)), first]
+
+    # First pass over every row at once, a segment per activity
+    pending = np.where(missing, arrivals, np.inf)[:, :-1]
+    lowest[:, :-1] = np.minimum.reduceat(np.where(missing, attempts, np.inf)[:, :-1], tables.starts, axis=1)
+    next_arrival[:, :-1] = np.minimum.reduceat(pending, tables.starts, axis=1)
+    first = (pending == next_arrival[:, tables.row_activity]) & np.isfinite(pending)
+    next_row[:, :-1] = np.minimum.reduceat(np.where(first, np.arange(dummy_row), dummy_row), tables.starts, axis=1)
+    activities = np.arange(columns)
+    ranked = tables.rank_key(np.minimum(activities, activity_count - 1), neither_sum, neither_left, lowest, next_arrival)
+    ranked[:, -1] = np.inf
+
+    clock = np.zeros((size, activity_count))
+    started = np.zeros((size, activity_count), dtype=bool)
+    hours = np.zeros(size)
+    reached = np.full((size, target), np.inf)
+    live = np.ones(size, dtype=bool)
+
+    for step in range(target):
+        chosen = ranked.argmin(axis=1)
+        live &= np.isfinite(ranked[trials, chosen])
+        if not live.any():
+            break
+        b = trials[live]
+        a = chosen[live]
+        first_arrival = next_arrival[b, a]
+        item = row_item[next_row[b, a]]
+        hours[b] += (first_arrival - clock[b, a]) / tables.completions_per_hour[a]
+        hours[b] += np.where(started[b, a], 0.0, tables.extra[a])
+        clock[b, a] = first_arrival
+        started[b, a] = True
+        obtained[b, item] = True
+        reached[b, step] = hours[b]
+
+        # Take the item's rows out of every activity that drops it
+        item_rows = tables.item_rows[item]
+        pair_trial = np.broadcast_to(b[:, None], item_rows.shape).ravel()
+        pair_activity = row_activity[item_rows].ravel()
+        item_rows = item_rows.ravel()
+        cell = pair_trial * columns + pair_activity
+        neither_sum -= np.bincount(cell, neither[item_rows], minlength=size * columns).reshape(size, columns)
+        neither_left -= np.bincount(cell, neither[item_rows] > 0, minlength=size * columns).reshape(size, columns).astype(neither_left.dtype)
+        stale = ((attempts[item_rows] <= lowest[pair_trial, pair_activity])
+                 | (next_row[pair_trial, pair_activity] == item_rows)) & (pair_activity < activity_count)
+        rescan(pair_trial[stale], pair_activity[stale])
+
+        real = pair_activity < activity_count
+        pair_trial, pair_activity = pair_trial[real], pair_activity[real]
+        ranked[pair_trial, pair_activity] = tables.rank_key(
+            pair_activity,
+            neither_sum[pair_trial, pair_activity],
+            neither_left[pair_trial, pair_activity],
+            lowest[pair_trial, pair_activity],
+            next_arrival[pair_trial, pair_activity],
+        )
+    return reached
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def shared_pool(workers):
+    """
+    The process pool every simulation in this process shares, started on first use
+    with `workers` spawned processes. Later runs reuse it whatever they ask for, so
+    concurrent requests queue their chunks on one bounded pool instead of each
+    starting (and importing Django into) a pool of their own.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool):
+    """ Drops a broken pool so the next run starts a fresh one. """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def run_simulation(tables, target, trials, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, seed=0):
+    """
+    Yields (chunk_index, hours) as chunks of trials finish, hours being a
+    (chunk, target) array from _simulate. Chunk i is always seeded with the i-th
+    child of SeedSequence(seed), so results only depend on seed, trials and
+    chunk_size, not on the worker count or the order chunks finish in. With
+    workers > 1 the chunks run on shared_pool().
+    """
+    sizes = [min(chunk_size, trials - start) for start in range(0, trials, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers <= 1:
+        for index, (size, child) in enumerate(zip(sizes, seeds)):
+            yield index, _simulate(tables, target, size, child)
+        return
+
+    pool = shared_pool(workers)
+    futures = {}
+    try:
+        for index, (size, child) in enumerate(zip(sizes, seeds)):
+            futures[pool.submit(_simulate, tables, target, size, child)] = index
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # A client that disconnects stops the generator; its queued chunks are dropped
+        for future in futures:
+            future.cancel()
+
+
+def summarize(hours, percentiles=(50, 90)):
+    """ Mean and percentiles of the hours to each slot count, from stacked _simulate results. """
+    finite = np.isfinite(hours)
+    summary = []
+    for k in range(hours.shape[1]):
+        reached = hours[finite[:, k], k]
+        row = {"slots": k + 1, "reached": float(finite[:, k].mean()) if len(hours) else 0.0}
+        if len(reached):
+            row["mean_hours"] = float(reached.mean())
+            for p in percentiles:
+                row[f"p{p:g}"] = float(np.percentile(reached, p))
+        summary.append(row)
+    return summary
+
+
+def default_workers():
+    return os.cpu_count() or 1
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+from concurrent.futures import Future
+from contextlib import contextmanager
+from .jsonio import atomic_write_json
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process coalescing is unavailable
+    fcntl = None
+
+
+class Flight:
+    """
+    One in-progress fetch that concurrent requests for the same key wait on.
+
+    `future` is a concurrent.futures.Future, so threads can block on it and
+    coroutines can await it through asyncio.wrap_future. `waiters` counts the
+    requests that joined instead of fetching themselves.
+    """
+
+    def __init__(self):
+        self.future = Future()
+        self.waiters = 0
+
+
+class SharedFlightStore:
+    """
+    Cross-process half of the single-flight: a per-key lock file plus the last result
+    written next to it. A process that finds the lock held waits for it, then reuses
+    the result the holder wrote instead of fetching again.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + suffix)
+
+    def acquire(self, key):
+        """ Blocks until this process holds the key's lock; returns the handle for release(). """
+        fd = os.open(self._path(key, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    def release(self, fd):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    @contextmanager
+    def lock(self, key):
+        fd = self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(fd)
+
+    def read(self, key, written_after):
+        """ Returns the stored result if it was written after `written_after` (epoch seconds). """
+        path = self._path(key, ".json")
+        try:
+            if os.stat(path).st_mtime < written_after:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, key, payload):
+        atomic_write_json(self._path(key, ".json"), payload, indent=None)
+
+
+def shared_flight_store(directory):
+    """ A SharedFlightStore for `directory`, or None when it is unset or file locks are unsupported. """
+    if not directory or fcntl is None:
+        return None
+    return SharedFlightStore(directory)
+
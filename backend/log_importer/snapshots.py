@@ -0,0 +1,300 @@
+import base64
+import hashlib
+import json
+import re
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import Player, Tab, LogEntry, Item, KillCount
+from .obtained import ObtainedSet, slot_map
+from .static_data import sections_index
+
+BATCH_SIZE = 500
+# Longest name a Player row can store (usernames are stored as given, keys normalized)
+USERNAME_MAX_LENGTH = Player._meta.get_field("key").max_length
+
+
+def normalize_username(username):
+    """ OSRS names are case-insensitive and treat spaces, underscores and hyphens alike. """
+    name = re.sub(r"[_\-\s]+", " ", str(username)).strip()
+    return name.lower()
+
+
+def storable_username(username):
+    """ Whether a snapshot can be stored under this name; OSRS names are far shorter anyway. """
+    return len(str(username)) <= USERNAME_MAX_LENGTH
+
+
+def has_items(player_log):
+    """ Whether a regrouped log holds any item slots; an unknown player's has none. """
+    return any(entry["items"] for subcats in player_log["sections"].values() for entry in subcats.values())
+
+
+def stored_layout(player_log):
+    """
+    player_log with each item as load_snapshot rebuilds it ({id, name, count, date},
+    in that order), so a fresh log and its stored snapshot hash and encode alike.
+    """
+    return {
+        **player_log,
+        "sections": {
+            major_section: {
+                subcat: {
+                    **entry,
+                    "items": [
+                        {"id": int(item["id"]), "name": item.get("name") or "", "count": item.get("count") or 0,
+                         "date": item.get("date")}
+                        for item in entry["items"]
+                    ],
+                }
+                for subcat, entry in subcats.items()
+            }
+            for major_section, subcats in player_log["sections"].items()
+        },
+    }
+
+
+def snapshot_hash(player_log):
+    """ Content hash of a regrouped player log, independent of key order. """
+    raw = json.dumps(player_log, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def with_snapshot_meta(player_log, player):
+    """
+    Adds the snapshot version and hash a client needs to ask for deltas later, and
+    the obtained bitmap it can hand to rank-activities instead of a list of ids.
+    """
+    return {
+        **player_log,
+        "version": player.version,
+        "hash": player.snapshot_hash,
+        "obtained": obtained_json(player),
+    }
+
+
+def obtained_json(player):
+    """ The player's stored obtained bitmap in ObtainedSet.to_json() form, without decoding it. """
+    return {"version": player.obtained_slots_version, "bits": base64.b64encode(bytes(player.obtained)).decode("ascii")}
+
+
+def player_obtained(player, slots=None):
+    """ The player's stored obtained items as an ObtainedSet. """
+    return ObtainedSet.from_bytes(slots or slot_map.get(), bytes(player.obtained), player.obtained_slots_version)
+
+
+def save_snapshot(username, player_log):
+    """
+    Stores a regrouped player log in Tab/LogEntry/Item/KillCount rows in one transaction
+    and returns the Player. A log identical to the stored one only refreshes fetched_at.
+    Otherwise the player's snapshot version is bumped and only the slots that changed or
+    are new are upserted, stamped with that version in Item.changed_version so
+    load_changes() can serve deltas. Slots gone from the log are deleted; that, a slot
+    moving, a new tab or log entry, or a kill count change also moves resync_version,
+    since a delta cannot express it.
+
+    Raises ValueError for a name longer than USERNAME_MAX_LENGTH or a log without
+    items; load_player_log turns both away before fetching or storing.
+    """
+    if not storable_username(username):
+        raise ValueError(f"Usernames are at most {USERNAME_MAX_LENGTH} characters")
+    if not has_items(player_log):
+        raise ValueError("Refusing to store a collection log without items")
+    digest = snapshot_hash(player_log)
+    obtained = ObtainedSet.from_player_log(slot_map.get(), player_log)
+    now = timezone.now()
+    with transaction.atomic():
+        player, created = Player.objects.select_for_update().get_or_create(
+            key=normalize_username(username), defaults={"username": username}
+        )
+        if not created and player.snapshot_hash == digest:
+            player.username = username
+            player.fetched_at = now
+            update_fields = ["username", "fetched_at"]
+            if player.obtained_slots_version != obtained.slot_map.version:
+                # Same log, but item_slots.json grew since it was stored
+                player.obtained = obtained.to_bytes()
+                player.obtained_slots_version = obtained.slot_map.version
+                update_fields += ["obtained", "obtained_slots_version"]
+            player.save(update_fields=update_fields)
+            return player
+
+        version = player.version + 1
+        sections = player_log["sections"]
+        entry_keys = {(major_section, subcat) for major_section, subcats in sections.items() for subcat in subcats}
+        stored_entries = set(LogEntry.objects.filter(tab__player=player).values_list("tab__name", "name"))
+        structural = stored_entries != entry_keys
+
+        # Tabs and log entries carry nothing but their name, so existing ones are left as-is
+        if not entry_keys <= stored_entries:
+            Tab.objects.bulk_create(
+                [Tab(player=player, name=major_section) for major_section in sections],
+                ignore_conflicts=True,
+            )
+        tab_ids = dict(Tab.objects.filter(player=player).values_list("name", "id"))
+        if not entry_keys <= stored_entries:
+            LogEntry.objects.bulk_create(
+                [
+                    LogEntry(tab_id=tab_ids[major_section], name=subcat)
+                    for major_section, subcats in sections.items()
+                    for subcat in subcats
+                ],
+                ignore_conflicts=True,
+                batch_size=BATCH_SIZE,
+            )
+        entry_ids = {
+            (tab_id, name): entry_id
+            for entry_id, tab_id, name in LogEntry.objects.filter(tab__player=player).values_list("id", "tab_id", "name")
+        }
+        stored_items = {
+            (entry_id, item_id): (item_pk, rest)
+            for item_pk, entry_id, item_id, *rest in Item.objects.filter(log_entry__tab__player=player)
+            .values_list("id", "log_entry_id", "item_id", "name", "quantity", "date", "sequence")
+        }
+        stored_kill_counts = {
+            entry_id: (name, amount)
+            for entry_id, name, amount in KillCount.objects.filter(log_entry__tab__player=player, sequence=0)
+            .values_list("log_entry_id", "name", "amount")
+        }
+
+        items, kill_counts, kept_items = [], [], set()
+        for major_section, subcats in sections.items():
+            for subcat, entry in subcats.items():
+                entry_id = entry_ids[(tab_ids[major_section], subcat)]
+                for sequence, item in enumerate(entry["items"]):
+                    key = (entry_id, int(item["id"]))
+                    kept_items.add(key)
+                    count = item.get("count") or 0
+                    values = [item.get("name") or "", count, item.get("date"), sequence]
+                    stored = stored_items.get(key)
+                    if stored is not None:
+                        if stored[1] == values:
+                            continue
+                        structural |= stored[1][3] != sequence
+                    items.append(Item(
+                        log_entry_id=entry_id,
+                        item_id=key[1],
+                        name=values[0],
+                        quantity=count,
+                        obtained=count > 0,
+                        date=values[2],
+                        sequence=sequence,
+                        changed_version=version,
+                    ))
+                kill_count = entry.get("killCount") or {}
+                kill_count = (kill_count.get("name", "Unknown"), kill_count.get("amount", 0))
+                if stored_kill_counts.get(entry_id) != kill_count:
+                    structural |= entry_id in stored_kill_counts
+                    kill_counts.append(KillCount(log_entry_id=entry_id, name=kill_count[0], amount=kill_count[1], sequence=0))
+
+        Item.objects.bulk_create(
+            items,
+            update_conflicts=True,
+            unique_fields=["log_entry", "item_id"],
+            update_fields=["name", "quantity", "obtained", "date", "sequence", "changed_version"],
+            batch_size=BATCH_SIZE,
+        )
+        KillCount.objects.bulk_create(
+            kill_counts,
+            update_conflicts=True,
+            unique_fields=["log_entry", "sequence"],
+            update_fields=["name", "amount"],
+            batch_size=BATCH_SIZE,
+        )
+
+        # Drop whatever the new log no longer has (deleting a tab or entry cascades to its items)
+        if structural:
+            Tab.objects.filter(player=player).exclude(name__in=list(sections)).delete()
+            kept_entries = [entry_ids[(tab_ids[major], subcat)] for major, subcat in entry_keys]
+            LogEntry.objects.filter(tab__player=player).exclude(id__in=kept_entries).delete()
+        stale_items = [item_pk for key, (item_pk, _) in stored_items.items() if key not in kept_items]
+        if stale_items:
+            structural = True
+            Item.objects.filter(id__in=stale_items).delete()
+
+        player.username = username
+        player.account_type = player_log.get("accountType") or ""
+        player.unique_obtained = player_log.get("uniqueObtained") or 0
+        player.unique_items = player_log.get("uniqueItems") or 0
+        player.snapshot_hash = digest
+        player.obtained = obtained.to_bytes()
+        player.obtained_slots_version = obtained.slot_map.version
+        player.version = version
+        if structural or created:
+            player.resync_version = version
+        player.fetched_at = now
+        player.save()
+    return player
+
+
+def load_snapshot(username, max_age=None):
+    """
+    Returns (player_log, player) for the player's stored snapshot, or None if there
+    is none (or, with `max_age` in seconds, if it is older than that). player_log has
+    the same shape as a freshly fetched one, sections in sections.json order.
+    """
+    player = Player.objects.filter(key=normalize_username(username)).first()
+    if player is None or player.fetched_at is None:
+        return None
+    if max_age is not None and timezone.now() - player.fetched_at > timedelta(seconds=max_age):
+        return None
+
+    entries = {}
+    for tab_name, entry_name, item_id, name, quantity, date in (
+        Item.objects.filter(log_entry__tab__player=player)
+        .order_by("sequence")
+        .values_list("log_entry__tab__name", "log_entry__name", "item_id", "name", "quantity", "date")
+        .iterator(chunk_size=2000)
+    ):
+        entries.setdefault((tab_name, entry_name), []).append(
+            {"id": item_id, "name": name, "count": quantity, "date": date}
+        )
+    kill_counts = {
+        (tab_name, entry_name): {"name": name, "amount": amount}
+        for tab_name, entry_name, name, amount in KillCount.objects.filter(
+            log_entry__tab__player=player, sequence=0
+        ).values_list("log_entry__tab__name", "log_entry__name", "name", "amount")
+    }
+    stored = list(LogEntry.objects.filter(tab__player=player).order_by("id").values_list("tab__name", "name"))
+
+    # Current sections.json order first, then anything only the snapshot still has
+    try:
+        layout = [(major, subcat) for major, subcats in sections_index.get().layout for subcat in subcats]
+    except (OSError, ValueError):
+        layout = []
+    stored_keys = set(stored)
+    order = [key for key in layout if key in stored_keys]
+    ordered = set(order)
+    order += [key for key in stored if key not in ordered]
+
+    sections = {}
+    for major_section, subcat in order:
+        sections.setdefault(major_section, {})[subcat] = {
+            "items": entries.get((major_section, subcat), []),
+            "killCount": kill_counts.get((major_section, subcat), {"name": "Unknown", "amount": 0}),
+        }
+    player_log = {
+        "accountType": player.account_type or "Unknown",
+        "uniqueObtained": player.unique_obtained,
+        "uniqueItems": player.unique_items,
+        "sections": sections,
+    }
+    return player_log, player
+
+
+def load_changes(player, since_version):
+    """
+    The player's slots that changed or appeared after snapshot `since_version`, as
+    {major_section: {subcat: [{"index": position, "item": item}]}}. Only meaningful when
+    player.resync_version <= since_version; older clients need the full log.
+    """
+    changes = {}
+    for tab_name, entry_name, sequence, item_id, name, quantity, date in (
+        Item.objects.filter(log_entry__tab__player=player, changed_version__gt=since_version)
+        .order_by("log_entry_id", "sequence")
+        .values_list("log_entry__tab__name", "log_entry__name", "sequence", "item_id", "name", "quantity", "date")
+    ):
+        changes.setdefault(tab_name, {}).setdefault(entry_name, []).append(
+            {"index": sequence, "item": {"id": item_id, "name": name, "count": quantity, "date": date}}
+        )
+    return changes
@@ -0,0 +1,196 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from django.conf import settings
+from .encoding import dumps
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+STATIC_DIR = os.path.join(settings.BASE_DIR, "log_importer", "static")
+
+
+class WatchedFile:
+    """
+    Holds a value built from a static file and rebuilds it when the file changes.
+
+    The file is stat()ed at most once every `check_interval` seconds; when its
+    mtime or size moved, it is re-read and only rebuilt if the content hash
+    differs. Between checks get() is a plain attribute read with no disk I/O.
+    """
+
+    def __init__(self, filename, build, check_interval=2.0):
+        self.path = os.path.join(STATIC_DIR, filename)
+        self.build = build
+        self.check_interval = check_interval
+        self.value = None
+        self.digest = None
+        self._stat = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """ Reads and builds the file unconditionally. """
+        with self._lock:
+            self._load()
+        return self.value
+
+    def get(self):
+        now = time.monotonic()
+        if self.value is not None and now - self._checked_at < self.check_interval:
+            return self.value
+        with self._lock:
+            if self.value is None or now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                stat = os.stat(self.path)
+                if self.value is None or (stat.st_mtime_ns, stat.st_size) != self._stat:
+                    self._load()
+        return self.value
+
+    def invalidate(self):
+        """ Forces the next get() to re-check the file. """
+        with self._lock:
+            self._stat = None
+            self._checked_at = 0.0
+
+    def _load(self):
+        stat = os.stat(self.path)
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest != self.digest or self.value is None:
+            self.value = self.build(raw)
+            self.digest = digest
+        self._stat = (stat.st_mtime_ns, stat.st_size)
+        self._checked_at = time.monotonic()
+
+
+class SectionsIndex:
+    """
+    Immutable view of sections.json.
+
+    `layout` keeps the file's ordering of major sections and sub-categories, and
+    `subcat_items` maps (major_section, subcat) to the frozenset of its item
+    ids (as strings, like the file).
+    """
+
+    def __init__(self, mapping):
+        layout = []
+        subcat_items = {}
+        for major_section, subcats in mapping.items():
+            layout.append((major_section, tuple(subcats.keys())))
+            for subcat, item_ids in subcats.items():
+                subcat_items[(major_section, subcat)] = frozenset(item_ids)
+        self.layout = tuple(layout)
+        self.subcat_items = subcat_items
+        # Upstream groups items by sub-category name only, so fan each name out
+        # to every (major_section, subcat) slot that uses it.
+        targets = {}
+        for key, item_ids in subcat_items.items():
+            targets.setdefault(key[1], []).append((key, item_ids))
+        self._targets = {k: tuple(v) for k, v in targets.items()}
+
+    @classmethod
+    def from_bytes(cls, raw):
+        return cls(json.loads(raw))
+
+    def regroup(self, items_data):
+        """
+        Groups the upstream per-subcategory items into the major sections, keeping
+        only the ids listed for each sub-category. One pass over the upstream items.
+        """
+        grouper = self.grouper()
+        for subcat, subcat_items in items_data.items():
+            for item in subcat_items:
+                grouper.add(subcat, item)
+        return grouper.sections()
+
+    def grouper(self):
+        return SectionGrouper(self)
+
+
+class SectionGrouper:
+    """
+    Incremental form of SectionsIndex.regroup: add() upstream items one at a time
+    (e.g. straight off a streaming parser), then read the result from sections().
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._grouped = {key: [] for key in index.subcat_items}
+
+    def wants(self, subcat):
+        """ Whether items of this upstream sub-category can end up in any section. """
+        return subcat in self.index._targets
+
+    def add(self, subcat, item):
+        item_id = str(item.get("id"))
+        for key, valid_item_ids in self.index._targets.get(subcat, ()):
+            if item_id in valid_item_ids:
+                self._grouped[key].append(item)
+
+    def sections(self):
+        final_sections = {}
+        for major_section, subcats in self.index.layout:
+            final_sections[major_section] = {
+                subcat: {
+                    "items": self._grouped[(major_section, subcat)],
+                    "killCount": {"name": "Unknown", "amount": 0}
+                }
+                for subcat in subcats
+            }
+        return final_sections
+
+
+class EncodedPayload:
+    """
+    A JSON document serialized once to compact bytes, with gzip (and brotli,
+    when installed) variants and a strong ETag per encoding. The ETag is the
+    content hash unless an explicit `tag` (e.g. a dataset version) is given.
+    `serialize` and `content_type` swap JSON for another encoding (e.g. MessagePack).
+    """
+
+    def __init__(self, data, tag=None, serialize=None, content_type="application/json"):
+        self.body = (serialize or dumps)(data)
+        self.content_type = content_type
+        digest = tag or hashlib.sha256(self.body).hexdigest()[:32]
+        self.variants = {"identity": (self.body, f'"{digest}"')}
+        self.variants["gzip"] = (gzip.compress(self.body, compresslevel=9, mtime=0), f'"{digest}-gzip"')
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(self.body, quality=11), f'"{digest}-br"')
+        self.etags = frozenset(etag for _, etag in self.variants.values())
+
+    @classmethod
+    def from_bytes(cls, raw):
+        return cls(json.loads(raw))
+
+    def negotiate(self, accept_encoding):
+        """ Picks the best variant for an Accept-Encoding header: (encoding, body, etag). """
+        accepted = set()
+        for part in (accept_encoding or "").split(","):
+            token, _, params = part.strip().partition(";")
+            if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(token.strip().lower())
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return (encoding,) + self.variants[encoding]
+        return ("identity",) + self.variants["identity"]
+
+    def matches(self, if_none_match):
+        """ True if an If-None-Match header names any of this payload's ETags. """
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return not tags.isdisjoint(self.etags)
+
+
+sections_index = WatchedFile("sections.json", SectionsIndex.from_bytes)
+items_payload = WatchedFile("items.json", EncodedPayload.from_bytes)
@@ -0,0 +1,74 @@
+from ..activity_data import ACTIVITIES, bump_data_version
+from ..completion import activity_models
+from ..models import ActivityMap, CompletionRate
+from ..ranking import ActivityArrays, activity_arrays
+
+# Item ids that have slots in item_slots.json
+ITEM_A1, ITEM_A2, ITEM_A3, ITEM_B1, ITEM_C1 = 13262, 25624, 7979, 13274, 13275
+
+# A small completion rates sheet: (activity, main/h, iron/h, extra hours, rows), each
+# row (item id, drop_rate_attempts, neither_inverse, exact, independent, requires_previous)
+ACTIVITY_SHEET = [
+    ("Alpha", 10.0, 5.0, 2.0, [
+        (ITEM_A1, 100.0, 0.01, True, False, False),
+        (ITEM_A2, 50.0, 0.02, True, False, False),
+        (ITEM_A3, 0.0, 0.0, False, False, False),  # no drop rate
+    ]),
+    ("Beta", 0.0, 4.0, 0.0, [  # no main rate
+        (ITEM_B1, 400.0, 0.0025, True, False, False),
+    ]),
+    ("Gamma", 2.0, 2.0, 1.0, [  # only a row without drop rates
+        (ITEM_C1, 0.0, 0.0, False, False, False),
+    ]),
+    ("Empty", 1.0, 1.0, 0.0, []),
+]
+
+
+def fixture_arrays(sheet=ACTIVITY_SHEET):
+    """ An ActivityArrays built straight from a sheet, without the database. """
+    activities, maps = [], []
+    for index, (name, main, iron, extra, rows) in enumerate(sheet):
+        activities.append({
+            "id": index + 1,
+            "activity_name": name,
+            "completions_per_hour_main": main,
+            "completions_per_hour_iron": iron,
+            "extra_time_to_first_completion": extra,
+        })
+        for item_id, drop, neither, exact, independent, requires_previous in rows:
+            maps.append({
+                "completion_rate_id": index + 1,
+                "item_id": item_id,
+                "item_name": f"Item {item_id}",
+                "drop_rate_attempts": drop,
+                "neither_inverse": neither,
+                "exact": exact,
+                "independent": independent,
+                "requires_previous": requires_previous,
+            })
+    return ActivityArrays.from_rows(activities, maps)
+
+
+def create_activities(sheet=ACTIVITY_SHEET):
+    """
+    Stores a sheet as CompletionRate/ActivityMap rows the way import_completion_rates
+    does, and drops every cached table so the next read sees them.
+    """
+    for index, (name, main, iron, extra, rows) in enumerate(sheet):
+        rate = CompletionRate.objects.create(
+            activity_index=index, activity_name=name, completions_per_hour_main=main,
+            completions_per_hour_iron=iron, extra_time_to_first_completion=extra,
+        )
+        ActivityMap.objects.bulk_create([
+            ActivityMap(
+                completion_rate=rate, activity_name=name, completions_per_hour=main,
+                additional_time_to_first_completion=extra, item_id=item_id, item_name=f"Item {item_id}",
+                requires_previous=requires_previous, exact=exact, independent=independent,
+                drop_rate_attempts=drop, neither_inverse=neither, sequence=sequence,
+            )
+            for sequence, (item_id, drop, neither, exact, independent, requires_previous) in enumerate(rows)
+        ])
+    bump_data_version(ACTIVITIES)
+    # Every test database starts again from version 1
+    activity_arrays.reset()
+    activity_models.reset()
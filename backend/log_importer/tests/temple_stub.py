@@ -0,0 +1,122 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+from ..static_data import STATIC_DIR
+
+
+def synthetic_player_log(username="stub", obtained_ratio=0.5, seed=0):
+    """
+    A player log shaped like the TempleOSRS collection-log response, built from the
+    local sections.json/items.json with a random `obtained_ratio` of the items obtained.
+    """
+    with open(os.path.join(STATIC_DIR, "sections.json"), "r", encoding="utf-8") as f:
+        sections = json.load(f)
+    with open(os.path.join(STATIC_DIR, "items.json"), "r", encoding="utf-8") as f:
+        items = json.load(f)
+
+    rng = random.Random(seed)
+    obtained = set()
+    grouped = {}
+    for subcats in sections.values():
+        for subcat, item_ids in subcats.items():
+            entries = []
+            for item_id in item_ids:
+                count = rng.randint(1, 5) if rng.random() < obtained_ratio else 0
+                if count:
+                    obtained.add(item_id)
+                entries.append({
+                    "id": int(item_id),
+                    "name": items.get(item_id, {}).get("name", item_id),
+                    "count": count,
+                    "date": "2024-01-01 00:00:00" if count else None,
+                })
+            grouped[subcat] = entries
+
+    unique_ids = {item_id for subcats in sections.values() for ids in subcats.values() for item_id in ids}
+    return {
+        "data": {
+            "player": username,
+            "accountType": "Normal",
+            "total_collections_finished": len(obtained),
+            "total_collections_available": len(unique_ids),
+            "items": grouped,
+        }
+    }
+
+
+class StubTempleServer:
+    """
+    Minimal keep-alive HTTP/1.1 server answering every GET with `body` (and HTTP
+    `status`) after `latency` seconds. It runs an event loop in a child process, so
+    it does not compete for the GIL with the client being benchmarked. `requests`
+    counts the requests served so far.
+    """
+
+    def __init__(self, body, latency=0.1, host="127.0.0.1", port=0, status=200):
+        self.body = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.latency = latency
+        self.status = status
+        self.host = host
+        self.port = port
+        self._served = multiprocessing.Value("q", 0)
+        self._process = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/api/collection-log/player_collection_log.php"
+
+    @property
+    def requests(self):
+        return self._served.value
+
+    def start(self):
+        parent, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=self._run, args=(child,), daemon=True)
+        self._process.start()
+        self.port = parent.recv()
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self, conn):
+        async def serve():
+            server = await asyncio.start_server(self._handle, self.host, self.port, backlog=2048)
+            conn.send(server.sockets[0].getsockname()[1])
+            await server.serve_forever()
+
+        asyncio.run(serve())
+
+    async def _handle(self, reader, writer):
+        header = (
+            f"HTTP/1.1 {self.status} {'OK' if self.status == 200 else 'Error'}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(self.body)}\r\n"
+            "\r\n"
+        ).encode()
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                with self._served.get_lock():
+                    self._served.value += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(header + self.body)
+                await writer.drain()
+                if b"connection: close" in request.lower():
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from ..activity_data import ACTIVITIES, bump_data_version, data_version
+from ..ranking import ACTIVITY_COLUMNS, ActivityArrays, activity_arrays, load_activity_arrays, rank_activities
+from .fixtures import ITEM_A2, create_activities, fixture_arrays
+
+
+class TempDirMixin:
+    def make_dir(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return directory
+
+
+class ActivityTableTests(TempDirMixin, SimpleTestCase):
+    def test_save_and_load(self):
+        arrays = fixture_arrays()
+        path = os.path.join(self.make_dir(), "table")
+        self.assertTrue(arrays.save(path))
+        loaded = ActivityArrays.load(path)
+
+        for name, dtype in ACTIVITY_COLUMNS.items():
+            column = getattr(loaded, name)
+            self.assertEqual(column.dtype, dtype, name)
+            np.testing.assert_array_equal(column, getattr(arrays, name))
+            # Mapped read-only from the file, not copied
+            self.assertIsInstance(column.base, np.memmap, name)
+            self.assertFalse(column.flags.writeable, name)
+        self.assertEqual((loaded.activity_names, loaded.item_names), (arrays.activity_names, arrays.item_names))
+        self.assertEqual(loaded.item_rows, arrays.item_rows)
+        np.testing.assert_array_equal(loaded.exact, arrays.exact)
+
+    def test_second_writer_keeps_the_first_table(self):
+        path = os.path.join(self.make_dir(), "table")
+        self.assertTrue(fixture_arrays().save(path))
+        self.assertFalse(fixture_arrays().save(path))
+        self.assertEqual(sorted(os.listdir(os.path.dirname(path))), ["table"])
+
+
+class ActivityTableDirTests(TempDirMixin, TestCase):
+    def setUp(self):
+        self.table_dir = self.make_dir()
+        with override_settings(ACTIVITY_TABLE_DIR=""):
+            create_activities()
+            self.expected = rank_activities([ITEM_A2])
+        # Nothing loaded from the scratch directory outlives the test
+        self.addCleanup(activity_arrays.reset)
+
+    def test_tables_are_built_once_per_version(self):
+        with override_settings(ACTIVITY_TABLE_DIR=self.table_dir):
+            activity_arrays.reset()
+            self.assertEqual(rank_activities([ITEM_A2]), self.expected)
+            first = os.listdir(self.table_dir)
+            self.assertEqual(len(first), 1)
+            self.assertTrue(first[0].startswith(f"v{data_version(ACTIVITIES)}-"))
+
+            # Another process on the same version maps the same files
+            loaded = load_activity_arrays(data_version(ACTIVITIES))
+            self.assertEqual(os.listdir(self.table_dir), first)
+            np.testing.assert_array_equal(loaded.item_ids, activity_arrays.get().item_ids)
+
+            # A new version replaces the old table
+            bump_data_version(ACTIVITIES)
+            self.assertEqual(rank_activities([ITEM_A2]), self.expected)
+            second = os.listdir(self.table_dir)
+            self.assertEqual(len(second), 1)
+            self.assertNotEqual(second, first)
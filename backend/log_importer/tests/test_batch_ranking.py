@@ -0,0 +1,45 @@
+from unittest import mock
+from django.test import TransactionTestCase, override_settings
+from ..batch_ranking import rank_players
+from ..upstream import UPSTREAM_UNAVAILABLE_MESSAGE
+from .fixtures import create_activities
+from .temple_stub import StubTempleServer, synthetic_player_log
+
+
+@override_settings(ACTIVITY_TABLE_DIR="")
+class RankPlayersErrorTests(TransactionTestCase):
+    """ What a player's NDJSON line says when their log cannot be loaded (no snapshot stored). """
+
+    def setUp(self):
+        create_activities()
+
+    def test_upstream_status(self):
+        with StubTempleServer(b"{}", latency=0, status=404) as stub, override_settings(TEMPLE_LOG_URL=stub.url):
+            results = list(rank_players(["Missing player"]))
+        self.assertEqual(results, [{
+            "username": "Missing player", "status": "error",
+            "message": "Failed to fetch data from API. Status code: 404",
+        }])
+
+    def test_upstream_unavailable(self):
+        # Nothing listens on the discard port, so the connection is refused
+        with override_settings(TEMPLE_LOG_URL="http://127.0.0.1:9/api/collection-log/player_collection_log.php"):
+            results = list(rank_players(["Offline player"]))
+        self.assertEqual(results[0]["message"], UPSTREAM_UNAVAILABLE_MESSAGE)
+        self.assertNotIn("127.0.0.1", results[0]["message"])
+
+    def test_other_errors_are_logged_not_sent(self):
+        with mock.patch("log_importer.batch_ranking.load_member", side_effect=RuntimeError("no such table: secret")), \
+                self.assertLogs("log_importer.batch_ranking", "ERROR") as logs:
+            results = list(rank_players(["Broken player"]))
+        self.assertEqual(results[0]["status"], "error")
+        self.assertNotIn("secret", results[0]["message"])
+        self.assertIn("no such table: secret", "\n".join(logs.output))
+
+    def test_success(self):
+        with StubTempleServer(synthetic_player_log(obtained_ratio=0.3), latency=0) as stub, \
+                override_settings(TEMPLE_LOG_URL=stub.url):
+            results = list(rank_players(["Batch player"]))
+        self.assertEqual(results[0]["status"], "success")
+        self.assertEqual(results[0]["cache"], "miss")
+        self.assertEqual(len(results[0]["data"]), 4)
@@ -0,0 +1,98 @@
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from ..activity_data import ACTIVITIES, bump_data_version
+from ..completion import ActivityModel, activity_models, expected_completion_times, integrate_completions, subset_table
+from .fixtures import ITEM_A1, ITEM_A2, create_activities, fixture_arrays
+
+# One activity: three shared-table slots, an independent one and a requires_previous
+# chain of two, each row (item id, drop_rate_attempts, neither_inverse, exact, independent, requires_previous)
+MIXED_SHEET = [
+    ("Mixed", 1.0, 1.0, 0.0, [
+        (1, 20.0, 0.05, False, False, False),
+        (2, 50.0, 0.02, False, False, False),
+        (3, 128.0, 1 / 128, False, False, False),
+        (4, 10.0, 0.0, False, True, False),
+        (5, 30.0, 1 / 30, False, False, False),
+        (6, 40.0, 1 / 40, False, False, True),
+    ]),
+]
+
+
+def model_for(rows, sheet_name="Solo"):
+    return ActivityModel(fixture_arrays([(sheet_name, 1.0, 1.0, 0.0, rows)]), 0)
+
+
+class ExpectedCompletionsTests(SimpleTestCase):
+    def test_closed_forms(self):
+        single = model_for([(1, 40.0, 0.025, False, False, False)])
+        self.assertAlmostEqual(single.expected_completions(np.zeros(1, dtype=bool)), 40.0)
+
+        # max of two exponentials: 1/r1 + 1/r2 - 1/(r1 + r2)
+        pair = model_for([(1, 10.0, 0.1, False, False, False), (2, 40.0, 0.025, False, False, False)])
+        self.assertAlmostEqual(pair.expected_completions(np.zeros(2, dtype=bool)), 10 + 40 - 1 / 0.125)
+
+        # a requires_previous chain waits for each link in turn
+        chain = model_for([(1, 10.0, 0.1, False, False, False), (2, 40.0, 0.025, False, False, True)])
+        self.assertAlmostEqual(chain.expected_completions(np.zeros(2, dtype=bool)), 50.0)
+        self.assertAlmostEqual(chain.expected_completions(np.array([True, False])), 40.0)
+
+    def test_subset_dp_matches_quadrature(self):
+        model = ActivityModel(fixture_arrays(MIXED_SHEET), 0)
+        table = subset_table(model)
+        n = len(model.random_rows)
+        self.assertEqual(n, 6)
+        for bits in range((1 << n) - 1):
+            obtained = np.array([(bits >> j) & 1 == 1 for j in range(n)])
+            numeric = integrate_completions(model, obtained.tobytes(), 0.0)
+            self.assertAlmostEqual(numeric / table[bits], 1.0, places=5, msg=f"subset {bits:06b}")
+
+    def test_exact_slots(self):
+        # Exact-only slots run one after another, exact-and-independent ones alongside
+        model = model_for([
+            (1, 100.0, 0.0, True, False, False),
+            (2, 50.0, 0.0, True, False, False),
+            (3, 120.0, 0.0, True, True, False),
+            (4, 30.0, 0.0, True, True, False),
+        ])
+        self.assertEqual(model.exact_completions(np.zeros(4, dtype=bool)), 150.0)
+        self.assertEqual(model.exact_completions(np.array([False, True, False, False])), 120.0)
+
+        # With random slots left as well, the exact ones are a floor on the finish time
+        mixed = model_for([(1, 100.0, 0.0, True, False, False), (2, 10.0, 0.1, False, False, False)])
+        completions = mixed.expected_completions(np.zeros(2, dtype=bool))
+        self.assertAlmostEqual(completions, 100 + 10 * np.exp(-100 / 10), places=4)
+
+
+@override_settings(ACTIVITY_TABLE_DIR="")
+class ExpectedCompletionTimesTests(TestCase):
+    def setUp(self):
+        create_activities()
+
+    def test_hours(self):
+        rows = {r["activity_name"]: r for r in expected_completion_times([ITEM_A2])}
+        alpha = rows["Alpha"]
+        # ITEM_A3 has no drop rate and is only counted
+        self.assertEqual((alpha["remaining_slots"], alpha["unknown_slots"]), (2, 1))
+        self.assertAlmostEqual(alpha["expected_completions"], 100.0)
+        self.assertAlmostEqual(alpha["expected_hours"], 100 / 10 + 2)
+        # Beta has no main rate
+        self.assertEqual((rows["Beta"]["expected_completions"], rows["Beta"]["expected_hours"]), (400.0, None))
+
+        iron = {r["activity_name"]: r for r in expected_completion_times([ITEM_A1], is_iron=True)}
+        self.assertAlmostEqual(iron["Alpha"]["expected_hours"], 50 / 5 + 2)
+        self.assertAlmostEqual(iron["Beta"]["expected_hours"], 400 / 4)
+
+
+@override_settings(ACTIVITY_TABLE_DIR="")
+class ModelCacheTests(TestCase):
+    def setUp(self):
+        create_activities(MIXED_SHEET)
+
+    def test_new_data_drops_cached_tables(self):
+        model = activity_models.get()[0]
+        subset_table(model)
+        integrate_completions(model, bytes(6), 0.0)
+        bump_data_version(ACTIVITIES)
+        self.assertIsNot(activity_models.get()[0], model)
+        self.assertEqual(subset_table.cache_info().currsize, 0)
+        self.assertEqual(integrate_completions.cache_info().currsize, 0)
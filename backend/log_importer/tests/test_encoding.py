@@ -0,0 +1,74 @@
+import json
+import unittest
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from django.utils.functional import lazy
+from ..encoding import ENCODERS, Encoded, chunked, get_encoder, iter_json, orjson, stdlib_dumps
+from .test_snapshots import regrouped_log
+
+lazy_str = lazy(lambda text: text, str)
+
+
+def sample_payloads():
+    """ Documents shaped like what the views send, plus the types Django's encoder handles. """
+    return {
+        "collection log": {"status": "success", "data": {**regrouped_log(), "username": "Stub"}},
+        "activities": [
+            {"activity_index": 1, "activity_name": "Sire", "completions_per_hour_main": 45.0,
+             "extra_time_to_first_completion": 0.5, "maps": [{"item_id": 13262, "neither_inverse": 0.000390625}]},
+        ],
+        "ranking": {"ranked": [[1, 0.0123456789], [2, 1.5]], "total": 2, "hours": None, "exact": True},
+        "django types": {
+            "fetched_at": datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+            "naive": datetime(2024, 1, 2, 3, 4, 5),
+            "rate": Decimal("0.125"),
+            "message": lazy_str("Player not found"),
+        },
+        "text": {"name": "Ænima — 🐉", "quote": 'say "hi"\n', "empty": [], "nested": {"": {}}},
+        "int keys": {1: "one", 22746: [0, -1, 2 ** 53]},
+    }
+
+
+@unittest.skipIf(orjson is None, "orjson is not installed")
+class EncoderParityTests(SimpleTestCase):
+    """ orjson and the stdlib encoder write the same bytes for what the views send. """
+
+    def test_identical_bytes(self):
+        for name, payload in sample_payloads().items():
+            with self.subTest(payload=name):
+                encoded = ENCODERS["orjson"](payload)
+                self.assertEqual(encoded, ENCODERS["stdlib"](payload))
+                self.assertIsInstance(encoded, bytes)
+
+    def test_iter_json_matches_dumps(self):
+        payload = sample_payloads()["collection log"]
+        for name, dumps in ENCODERS.items():
+            with self.subTest(encoder=name), mock.patch("log_importer.encoding._dumps", dumps):
+                whole = dumps(payload)
+                for depth in (1, 4):
+                    self.assertEqual(b"".join(chunked(iter_json(payload, depth), 512)), whole)
+                # Cached sections are copied verbatim
+                sections = Encoded(dumps(payload["data"]["sections"]))
+                data = {**payload, "data": {**payload["data"], "sections": sections}}
+                self.assertEqual(b"".join(iter_json(data, 2)), whole)
+
+
+class GetEncoderTests(SimpleTestCase):
+    def test_named_encoders(self):
+        self.assertIs(get_encoder("stdlib"), stdlib_dumps)
+        self.assertIs(get_encoder("auto"), ENCODERS.get("orjson", stdlib_dumps))
+        self.assertIs(get_encoder("log_importer.encoding.stdlib_dumps"), stdlib_dumps)
+
+    def test_without_orjson(self):
+        with mock.patch.dict("log_importer.encoding.ENCODERS", clear=True, stdlib=stdlib_dumps):
+            # auto falls back to the stdlib encoder; asking for orjson by name is an error
+            self.assertIs(get_encoder("auto"), stdlib_dumps)
+            with self.assertRaisesMessage(ImproperlyConfigured, "orjson is not installed"):
+                get_encoder("orjson")
+
+    def test_stdlib_output(self):
+        self.assertEqual(stdlib_dumps({"a": [1, "é"]}), '{"a":[1,"é"]}'.encode())
+        self.assertEqual(json.loads(stdlib_dumps(sample_payloads()["text"])), sample_payloads()["text"])
@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from ..http_client import build_session
+from ..management.commands.fetch_item_images import Command
+from .wiki_stub import StubWiki
+
+DEFAULT_WIKI_URL = "https://oldschool.runescape.wiki/"
+
+
+def stub_wiki(**kwargs):
+    """
+    Items 1-3 resolve through the guess, the infobox and the fuzzy API step
+    respectively; item 4 has no wiki page.
+    """
+    return StubWiki(
+        lookups={1: "Alpha", 2: "Beta", 3: "Gamma bow"},
+        images={"Alpha.png"},
+        infoboxes={"Beta": "/images/Beta_detail.png"},
+        page_images={"Gamma bow": ["File:Other.png", "File:Gamma_bow.png"]},
+        file_urls={"File:Gamma bow.png": "https://img.example/Gamma_bow.png"},
+        **kwargs
+    )
+
+
+class FetchItemImagesTests(SimpleTestCase):
+    """ fetch_item_images run against a local stub wiki, on a scratch items.json. """
+
+    def setUp(self):
+        self.static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_dir)
+        self.items_path = os.path.join(self.static_dir, "items.json")
+        items = {str(i): {"id": i, "name": name, "imageUrl": "", "wikiPageUrl": DEFAULT_WIKI_URL}
+                 for i, name in [(1, "Alpha"), (2, "Beta"), (3, "Gamma bow"), (4, "Delta")]}
+        items["5"] = {"id": 5, "name": "Done", "imageUrl": "https://img.example/Done.png",
+                      "wikiPageUrl": "https://oldschool.runescape.wiki/w/Done"}
+        with open(self.items_path, "w", encoding="utf-8") as f:
+            json.dump(items, f)
+
+    def run_command(self, wiki, **options):
+        options = dict({"concurrency": 2, "rate": 0, "retries": 2, "no_cache": True}, **options)
+        out = StringIO()
+        call_command("fetch_item_images", wiki_url=wiki.url, static_dir=self.static_dir, stdout=out, **options)
+        return out.getvalue()
+
+    def read_json(self, name):
+        with open(os.path.join(self.static_dir, name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def lookups(self, wiki, item_id):
+        return [r for r in wiki.requests_to("/w/Special:Lookup") if r[2]["id"] == str(item_id)]
+
+    def test_waterfall(self):
+        with stub_wiki() as wiki:
+            self.run_command(wiki)
+        items = self.read_json("items.json")
+        self.assertEqual(items["1"]["imageUrl"], wiki.url + "/images/Alpha.png")
+        self.assertEqual(items["1"]["wikiPageUrl"], wiki.url + "/w/Alpha")
+        self.assertEqual(items["2"]["imageUrl"], wiki.url + "/images/Beta_detail.png")
+        self.assertEqual(items["3"]["imageUrl"], "https://img.example/Gamma_bow.png")
+        self.assertEqual(items["4"]["imageUrl"], "")
+        self.assertEqual(list(self.read_json("manual_updates.json")), ["4"])
+        # The finished item is never looked up
+        self.assertEqual(self.lookups(wiki, 5), [])
+        self.assertFalse(os.path.exists(self.items_path + ".journal"))
+
+    def test_retries_429_and_5xx(self):
+        fail_once = {
+            "/w/Special:Lookup?type=item&id=1": 429,
+            "/w/Special:Lookup?type=item&id=2": 503,
+            "/images/Alpha.png": 502,
+        }
+        with stub_wiki(fail_once=dict(fail_once)) as wiki:
+            self.run_command(wiki, retries=2)
+        items = self.read_json("items.json")
+        self.assertEqual(items["1"]["imageUrl"], wiki.url + "/images/Alpha.png")
+        self.assertEqual(items["2"]["imageUrl"], wiki.url + "/images/Beta_detail.png")
+        self.assertEqual(len(self.lookups(wiki, 1)), 2)
+        self.assertEqual(len(self.lookups(wiki, 2)), 2)
+        self.assertEqual(len(wiki.requests_to("/images/Alpha.png")), 2)
+
+    def test_no_retries(self):
+        with stub_wiki(fail_once={"/w/Special:Lookup?type=item&id=1": 429}) as wiki:
+            self.run_command(wiki, retries=0)
+        self.assertEqual(len(self.lookups(wiki, 1)), 1)
+        self.assertEqual(self.read_json("items.json")["1"]["imageUrl"], "")
+        self.assertIn("1", self.read_json("manual_updates.json"))
+
+    def test_rate_limit(self):
+        rate, concurrency = 20.0, 2
+        with stub_wiki() as wiki:
+            self.run_command(wiki, rate=rate, concurrency=concurrency)
+        times = sorted(r[0] for r in wiki.requests)
+        # Following a Special:Lookup redirect is part of the same session.get(), so takes no token
+        tokens = len(times) - sum(len(self.lookups(wiki, item_id)) for item_id in wiki.lookups)
+        self.assertGreater(tokens, 8)
+        # The bucket starts full (`concurrency` tokens), then refills at `rate` per second
+        self.assertGreaterEqual(times[-1] - times[0], (tokens - concurrency) / rate * 0.9)
+
+    def test_interrupted_run_resumes_from_journal(self):
+        with stub_wiki() as wiki:
+            with mock.patch.object(Command, "batch_fuzzy_lookup", side_effect=RuntimeError("interrupted")):
+                with self.assertRaises(RuntimeError):
+                    self.run_command(wiki)
+            # Not checkpointed yet: items.json is untouched and the updates are only journaled
+            self.assertEqual(self.read_json("items.json")["1"]["imageUrl"], "")
+            with open(self.items_path + ".journal", "a", encoding="utf-8") as f:
+                f.write('{"key": "2", "chan')  # torn by the interruption
+            out = self.run_command(wiki)
+
+        # Items 1 and 2 (image) and 3 (page URL only) were journaled
+        self.assertIn("Resumed 3 updates", out)
+        items = self.read_json("items.json")
+        self.assertEqual(items["1"]["imageUrl"], wiki.url + "/images/Alpha.png")
+        self.assertEqual(items["3"]["imageUrl"], "https://img.example/Gamma_bow.png")
+        # Resolved items are not fetched again on the second run
+        self.assertEqual(len(self.lookups(wiki, 1)), 1)
+        self.assertEqual(len(self.lookups(wiki, 2)), 1)
+        self.assertEqual(len(self.lookups(wiki, 3)), 2)
+        self.assertFalse(os.path.exists(self.items_path + ".journal"))
+
+    def test_checkpoint_every(self):
+        with stub_wiki() as wiki:
+            with mock.patch.object(Command, "batch_fuzzy_lookup", side_effect=RuntimeError("interrupted")):
+                with self.assertRaises(RuntimeError):
+                    self.run_command(wiki, checkpoint_every=1)
+        # Every update was compacted into items.json as it came in
+        self.assertEqual(self.read_json("items.json")["1"]["imageUrl"], wiki.url + "/images/Alpha.png")
+        self.assertFalse(os.path.exists(self.items_path + ".journal"))
+
+
+class QueryTitlesTests(SimpleTestCase):
+    def test_batches_and_follows_continue(self):
+        titles = [f"Page_{i}" for i in range(120)]
+        page_images = {f"Page {i}": [f"File:Page {i} {n}.png" for n in range(3)] for i in range(120)}
+        command = Command(stdout=StringIO())
+        with StubWiki(page_images=page_images, api_page_size=100) as wiki, ThreadPoolExecutor(3) as pool:
+            command.configure_wiki(wiki.url)
+            command.http = build_session(pool_size=3, retries=0)
+            pages = command.query_titles(titles + ["Missing"], {"prop": "images", "imlimit": "max"}, pool)
+
+        requests = wiki.requests_to("/api.php")
+        first_requests = [r[2] for r in requests if "imcontinue" not in r[2]]
+        self.assertEqual(sorted(len(q["titles"].split("|")) for q in first_requests), [21, 50, 50])
+        # 150 images per full chunk at 100 per response, 60 in the last
+        self.assertEqual(len(requests), 5)
+        self.assertNotIn("Missing", pages)
+        self.assertEqual(len(pages), 120)
+        for i, title in enumerate(titles):
+            self.assertEqual([image["title"] for image in pages[title]["images"]], page_images[f"Page {i}"])
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+from django.core.management import load_command_class
+from django.test import SimpleTestCase
+from ..http_cache import CachedSession, HttpCache
+from ..http_client import build_session
+from .temple_stub import StubTempleServer
+
+
+class CachedSessionTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache_path = os.path.join(directory, "cache.sqlite3")
+
+    def session(self, **kwargs):
+        http = CachedSession(build_session(), HttpCache(self.cache_path), **kwargs)
+        self.addCleanup(http.close)
+        return http
+
+    def test_fresh_entries_are_replayed(self):
+        with StubTempleServer({"data": {}}, latency=0) as stub:
+            http = self.session(max_age=3600)
+            for _ in range(2):
+                self.assertEqual(http.get(stub.url, params={"categories": "bosses"}).json(), {"data": {}})
+            self.assertEqual(stub.requests, 1)
+        self.assertEqual(http.stats()["hits"], 1)
+
+    def test_max_age_zero_always_refetches(self):
+        with StubTempleServer({"data": {}}, latency=0) as stub:
+            http = self.session(max_age=0)
+            for _ in range(2):
+                http.get(stub.url, params={"categories": "bosses"})
+            self.assertEqual(stub.requests, 2)
+        self.assertEqual(http.stats(), {"hits": 0, "revalidated": 0, "misses": 2})
+        # The responses are still kept for --offline
+        offline = self.session(offline=True)
+        self.assertEqual(offline.get(stub.url, params={"categories": "bosses"}).json(), {"data": {}})
+
+    def test_cache_max_age_defaults(self):
+        def default_max_age(command):
+            parser = load_command_class("log_importer", command).create_parser("manage.py", command)
+            return parser.parse_args([]).cache_max_age
+
+        # Wiki lookups are reused for a week, TempleOSRS item lists are always revalidated
+        self.assertEqual(default_max_age("fetch_item_images"), 7 * 24 * 3600)
+        self.assertEqual(default_max_age("generate_items"), 0)
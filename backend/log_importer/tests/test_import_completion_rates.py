@@ -0,0 +1,116 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from ..activity_data import ACTIVITIES, data_version
+from ..models import ActivityMap, CompletionRate
+
+RATE_FIELDS = [
+    "Index", "Activity name", "Completions/hr (main)", "Completions/hr (iron)",
+    "Extra time to first completion (hours)", "Notes", "Verification source",
+]
+MAP_FIELDS = [
+    "Activity index", "Activity name", "Item ID", "Item name", "Completed", "Requires previous", "Active",
+    "Exact", "Independent", "Drop rate (attempts)", "E&I", "E", "I", "Neither^(-1)",
+]
+RATES = [
+    ["1", "Sire", "45", "34", "0", "", ""],
+    ["2", "Hydra", "30", "29", "0.5", "", ""],
+]
+MAPS = [
+    ["1", "Sire", "13262", "Abyssal orphan", "FALSE", "FALSE", "TRUE", "FALSE", "FALSE", "2560", "n/a", "n/a", "n/a",
+     "0.000390625"],
+    ["1", "Sire", "25624", "Unsired", "TRUE", "FALSE", "FALSE", "FALSE", "TRUE", "100", "n/a", "n/a", "100", "n/a"],
+    ["2", "Hydra", "22746", "Ikkle hydra", "FALSE", "FALSE", "TRUE", "FALSE", "FALSE", "3000", "n/a", "n/a", "n/a",
+     "0.000333"],
+]
+
+
+class ImportCompletionRatesTests(TestCase):
+    """ import_completion_rates on small CSVs in a scratch static directory. """
+
+    def setUp(self):
+        self.static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_dir)
+        settings = override_settings(STATICFILES_DIRS=[self.static_dir])
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.write_csvs(RATES, MAPS)
+
+    def write_csvs(self, rates, maps):
+        for name, fields, rows in (("completion_rates.csv", RATE_FIELDS, rates), ("activity_map.csv", MAP_FIELDS, maps)):
+            with open(os.path.join(self.static_dir, name), "w", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(fields)
+                writer.writerows(rows)
+
+    def run_import(self, **options):
+        out = StringIO()
+        call_command("import_completion_rates", stdout=out, **options)
+        return out.getvalue()
+
+    def map_rows(self):
+        return {
+            (m.completion_rate.activity_index, m.item_id, m.sequence): (m.id, m.drop_rate_attempts)
+            for m in ActivityMap.objects.select_related("completion_rate")
+        }
+
+    def test_first_import(self):
+        out = self.run_import()
+        self.assertIn("Completion rates: 2 created, 0 updated, 0 deleted", out)
+        self.assertIn("Activity map: 3 created, 0 updated, 0 deleted", out)
+        self.assertEqual(CompletionRate.objects.get(activity_index=2).extra_time_to_first_completion, 0.5)
+        with open(os.path.join(self.static_dir, "item_slots.json"), "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["slots"], [13262, 25624, 22746])
+
+    def test_unchanged_csvs_are_skipped(self):
+        self.run_import()
+        version = data_version(ACTIVITIES)
+        self.assertIn("unchanged, skipping import", self.run_import())
+        self.assertEqual(data_version(ACTIVITIES), version)
+
+        out = self.run_import(force=True)
+        self.assertIn("Activity map: 0 created, 0 updated, 0 deleted", out)
+        self.assertEqual(data_version(ACTIVITIES), version + 1)
+
+    def test_changed_rows_are_upserted(self):
+        self.run_import()
+        before = self.map_rows()
+        rate_ids = dict(CompletionRate.objects.values_list("activity_index", "id"))
+
+        maps = [list(row) for row in MAPS[:2]]
+        maps[1][9] = maps[1][12] = "50"
+        # Hydra's pet dropped; a second Sire row for the orphan added
+        maps.append(["1", "Sire", "13262", "Abyssal orphan", "FALSE", "FALSE", "TRUE", "FALSE", "FALSE", "1000",
+                     "n/a", "n/a", "n/a", "0.001"])
+        rates = [RATES[0], ["2", "Hydra", "40", "29", "0.5", "", ""]]
+        self.write_csvs(rates, maps)
+        out = self.run_import()
+
+        self.assertIn("Completion rates: 0 created, 1 updated, 0 deleted", out)
+        self.assertIn("Activity map: 1 created, 1 updated, 1 deleted", out)
+        after = self.map_rows()
+        # Rows are updated in place, not recreated
+        self.assertEqual(after[(1, 13262, 1)], before[(1, 13262, 1)])
+        self.assertEqual(after[(1, 25624, 2)], (before[(1, 25624, 2)][0], 50.0))
+        self.assertEqual(after[(1, 13262, 3)][1], 1000.0)
+        self.assertNotIn((2, 22746, 3), after)
+        self.assertEqual(dict(CompletionRate.objects.values_list("activity_index", "id")), rate_ids)
+        self.assertEqual(CompletionRate.objects.get(activity_index=2).completions_per_hour_main, 40.0)
+
+    def test_inconsistent_drop_columns_warn(self):
+        maps = [list(row) for row in MAPS]
+        # An E&I rate on a row that is neither exact nor independent, and an I rate that differs
+        maps[0][10] = "2560"
+        maps[1][12] = "99"
+        self.write_csvs(RATES, maps)
+        out = self.run_import()
+        self.assertIn("2 activity map rows where E&I/E/I disagree", out)
+        self.assertIn("Sire / Abyssal orphan, Sire / Unsired", out)
+        self.assertNotIn("Ikkle hydra", out)
+        # They are still imported, going by Exact, Independent and Drop rate
+        self.assertEqual(ActivityMap.objects.get(item_id=25624).drop_rate_attempts, 100.0)
@@ -0,0 +1,71 @@
+from unittest import mock
+from django.test import TestCase, override_settings
+from ..completion import ActivityModel
+from ..planner import plan_route
+from .fixtures import ITEM_A1, ITEM_A2, ITEM_A3, ITEM_B1, ITEM_C1, create_activities
+
+# X is first until its extra hours are spent; then its second slot (4 completions)
+# beats Y (5) only if the extra time is dropped from its key
+ROUTE_SHEET = [
+    ("X", 1.0, 1.0, 3.0, [
+        (ITEM_A1, 2.0, 0.5, False, False, False),
+        (ITEM_A2, 4.0, 0.25, False, False, False),
+    ]),
+    ("Y", 1.0, 1.0, 0.0, [
+        (ITEM_B1, 5.0, 0.2, False, False, False),
+    ]),
+    ("Exact", 2.0, 2.0, 0.0, [
+        (ITEM_A3, 100.0, 0.0, True, False, False),
+        (ITEM_C1, 50.0, 0.0, True, False, False),
+    ]),
+    ("No rate", 0.0, 0.0, 0.0, [
+        (ITEM_C1, 1.0, 1.0, False, False, False),
+    ]),
+]
+
+
+@override_settings(ACTIVITY_TABLE_DIR="")
+class PlanRouteTests(TestCase):
+    def setUp(self):
+        create_activities(ROUTE_SHEET)
+
+    def test_order_keeps_extra_in_the_ranking(self):
+        plan = plan_route([], disabled_activities=["Exact"], target_slots=5)
+        self.assertEqual([(s["activity_name"], s["item_id"]) for s in plan], [
+            ("X", ITEM_A1), ("Y", ITEM_B1), ("X", ITEM_A2),
+        ])
+
+    def test_hours(self):
+        plan = plan_route([], disabled_activities=["Exact"], target_slots=5)
+        # X's two slots race at 1/2 + 1/4 per completion, and the first visit pays the extra 3 hours
+        self.assertAlmostEqual(plan[0]["hours"], 1 / 0.75 + 3)
+        self.assertAlmostEqual(plan[1]["hours"], 5.0)
+        self.assertAlmostEqual(plan[2]["hours"], 4.0)
+        self.assertAlmostEqual(plan[-1]["total_hours"], 1 / 0.75 + 3 + 5 + 4)
+
+    def test_exact_slots_and_max_hours(self):
+        plan = plan_route([ITEM_A1, ITEM_A2, ITEM_B1], target_slots=5)
+        # Exact-only slots take their attempts one after another in sheet order, at 2
+        # completions per hour, whichever one the ranking names as the fastest
+        self.assertEqual([(s["item_id"], s["hours"], s["probability"]) for s in plan],
+                         [(ITEM_A3, 50.0, 1.0), (ITEM_C1, 25.0, 1.0)])
+        self.assertEqual(plan_route([ITEM_A1, ITEM_A2, ITEM_B1], max_hours=60), plan[:1])
+
+    def test_step_names_the_likely_slot(self):
+        plan = plan_route([], disabled_activities=["Exact"], target_slots=1)
+        # The hours are to X's next slot, either one; ITEM_A1 drops first 2 times in 3
+        self.assertEqual((plan[0]["item_id"], plan[0]["probability"]), (ITEM_A1, 0.5 / 0.75))
+
+    def test_activities_without_a_rate_are_skipped(self):
+        plan = plan_route([ITEM_A1, ITEM_A2, ITEM_B1, ITEM_A3], target_slots=5)
+        self.assertEqual([s["activity_name"] for s in plan], ["Exact"])
+
+    def test_activity_without_a_next_slot_is_skipped(self):
+        next_slot = ActivityModel.next_slot
+
+        def x_has_none(model, *args):
+            return None if model.index == 0 else next_slot(model, *args)
+
+        with mock.patch.object(ActivityModel, "next_slot", x_has_none):
+            plan = plan_route([], disabled_activities=["Exact"], target_slots=5)
+        self.assertEqual([s["activity_name"] for s in plan], ["Y"])
@@ -0,0 +1,197 @@
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+from django.test import SimpleTestCase
+from ..singleflight import SharedFlightStore
+from ..upstream import PlayerLogCache
+
+
+class CountingFetch:
+    """ A PlayerLogCache fetch returning (username, call number), recording each call's thread. """
+
+    def __init__(self):
+        self.calls = 0
+        self.threads = []
+
+    def __call__(self, username, force_refresh):
+        self.calls += 1
+        self.threads.append(threading.current_thread())
+        return (username, self.calls)
+
+
+class PlayerLogCacheRefreshTests(SimpleTestCase):
+    def test_background_refresh_closes_its_connections(self):
+        fetch = CountingFetch()
+        cache = PlayerLogCache(fetch, ttl=0, stale_ttl=60)
+        cache.get("Stub")
+        closed = threading.Event()
+        with mock.patch("log_importer.upstream.connections") as connections:
+            connections.close_all.side_effect = closed.set
+            self.assertEqual(cache.get("Stub")[1], "stale")
+            self.assertTrue(closed.wait(5))
+        self.assertEqual(fetch.calls, 2)
+        self.assertIsNot(fetch.threads[1], threading.current_thread())
+
+
+class PlayerLogCacheExpiryTests(SimpleTestCase):
+    """ TTL, stale-while-revalidate and LRU eviction on a controlled clock. """
+
+    def setUp(self):
+        self.now = 1000.0
+        clock = SimpleNamespace(monotonic=lambda: self.now, time=time.time)
+        patcher = mock.patch("log_importer.upstream.time", clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fetch = CountingFetch()
+        self.cache = PlayerLogCache(self.fetch, ttl=300, stale_ttl=600, max_entries=2)
+
+    def wait_for_refresh(self):
+        deadline = time.monotonic() + 5
+        while self.cache._refreshing and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(self.cache._refreshing)
+
+    def test_fresh_entries_are_hits(self):
+        self.assertEqual(self.cache.get("Stub")[:2], (("Stub", 1), "miss"))
+        self.now += 299
+        # Names are cached by their normalized form
+        self.assertEqual(self.cache.get("stub")[:2], (("Stub", 1), "hit"))
+        self.assertEqual(self.fetch.calls, 1)
+
+    def test_stale_entries_are_served_while_revalidating(self):
+        self.cache.get("Stub")
+        self.now += 300
+        self.assertEqual(self.cache.get("Stub")[:2], (("Stub", 1), "stale"))
+        self.wait_for_refresh()
+        self.assertEqual(self.fetch.calls, 2)
+        self.assertEqual(self.cache.get("Stub")[:2], (("Stub", 2), "hit"))
+        self.assertEqual(self.cache.stats()["stale_hits"], 1)
+
+    def test_expired_entries_are_fetched_inline(self):
+        self.cache.get("Stub")
+        self.now += 900
+        self.assertEqual(self.cache.get("Stub")[:2], (("Stub", 2), "miss"))
+        self.assertEqual(self.fetch.threads, [threading.current_thread()] * 2)
+
+    def test_force_refresh_skips_the_cache(self):
+        self.cache.get("Stub")
+        self.now += 1
+        self.assertEqual(self.cache.get("Stub", force_refresh=True)[:2], (("Stub", 2), "refresh"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.get("A")
+        self.cache.get("B")
+        self.cache.get("A")
+        self.cache.get("C")
+        self.assertEqual(self.cache.stats()["entries"], 2)
+        self.assertEqual(self.cache.get("A")[1], "hit")
+        self.assertEqual(self.cache.get("B")[1], "miss")
+        # Fetching B again pushed out C, the least recently used by then
+        self.assertEqual(self.cache.get("C")[1], "miss")
+
+    def test_failed_refresh_keeps_the_stale_entry(self):
+        self.cache.get("Stub")
+        self.now += 300
+        self.cache.fetch = mock.Mock(side_effect=RuntimeError("TempleOSRS is down"))
+        self.assertEqual(self.cache.get("Stub")[:2], (("Stub", 1), "stale"))
+        self.wait_for_refresh()
+        self.assertEqual(self.cache.stats()["refresh_errors"], 1)
+        self.assertEqual(self.cache.get("Stub")[:2], (("Stub", 1), "stale"))
+
+
+class SingleFlightTests(SimpleTestCase):
+    """ Concurrent misses for one player share a single fetch. """
+
+    def wait_for_waiters(self, cache, key, waiters):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            flight = cache._flights.get(key)
+            if flight is not None and flight.waiters == waiters:
+                return
+            time.sleep(0.01)
+        self.fail(f"{waiters} requests did not join the flight")
+
+    def test_waiters_share_the_leaders_fetch(self):
+        release = threading.Event()
+        fetch = CountingFetch()
+
+        def blocking_fetch(username, force_refresh):
+            release.wait(5)
+            return fetch(username, force_refresh)
+
+        cache = PlayerLogCache(blocking_fetch)
+        with ThreadPoolExecutor(6) as pool:
+            leader = pool.submit(cache.get, "Stub")
+            self.wait_for_waiters(cache, "stub", 0)
+            followers = [pool.submit(cache.get, name) for name in ["Stub", "stub", "STUB", "Stub "]]
+            self.wait_for_waiters(cache, "stub", 4)
+            release.set()
+            results = [leader.result()] + [f.result() for f in followers]
+
+        self.assertEqual(fetch.calls, 1)
+        self.assertEqual(results, [(("Stub", 1), "miss", 4)] + [(("Stub", 1), "coalesced", 4)] * 4)
+        self.assertEqual(cache.stats()["coalesced"], 4)
+
+    def test_errors_reach_every_waiter_and_are_not_cached(self):
+        release = threading.Event()
+        calls = []
+
+        def failing_fetch(username, force_refresh):
+            calls.append(username)
+            release.wait(5)
+            raise RuntimeError("upstream down")
+
+        cache = PlayerLogCache(failing_fetch)
+        with ThreadPoolExecutor(3) as pool:
+            futures = [pool.submit(cache.get, "Stub")]
+            self.wait_for_waiters(cache, "stub", 0)
+            futures += [pool.submit(cache.get, "Stub") for _ in range(2)]
+            self.wait_for_waiters(cache, "stub", 2)
+            release.set()
+            for future in futures:
+                with self.assertRaisesMessage(RuntimeError, "upstream down"):
+                    future.result()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()["in_flight"], 0)
+        with self.assertRaises(RuntimeError):
+            cache.get("Stub")
+        self.assertEqual(len(calls), 2)
+
+    def test_async_requests_share_one_fetch(self):
+        calls = []
+
+        async def fetch(username, force_refresh):
+            calls.append(username)
+            await asyncio.sleep(0.05)
+            return {"username": username}
+
+        async def requests():
+            cache = PlayerLogCache(None)
+            return await asyncio.gather(*(cache.aget("Stub", fetch) for _ in range(5)))
+
+        results = asyncio.run(requests())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(status for _, status, _ in results), ["coalesced"] * 4 + ["miss"])
+        self.assertEqual(len({id(payload) for payload, _, _ in results}), 1)
+
+    def test_shared_store_spans_caches(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # Two caches on one directory stand in for two worker processes
+        first_fetch, second_fetch = CountingFetch(), CountingFetch()
+        first = PlayerLogCache(first_fetch, shared=SharedFlightStore(directory))
+        second = PlayerLogCache(second_fetch, shared=SharedFlightStore(directory))
+
+        self.assertEqual(first.get("Stub")[:2], (("Stub", 1), "miss"))
+        # JSON round-trips the payload's tuple as a list
+        self.assertEqual(second.get("Stub")[:2], (["Stub", 1], "coalesced"))
+        self.assertEqual(second_fetch.calls, 0)
+        self.assertEqual(second.stats()["shared_hits"], 1)
+        # force_refresh only reuses a result written after the request began
+        self.assertEqual(second.get("Stub", force_refresh=True)[:2], (("Stub", 1), "refresh"))
+        self.assertEqual(second_fetch.calls, 1)
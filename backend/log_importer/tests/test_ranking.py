@@ -0,0 +1,126 @@
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from ..obtained import ObtainedSet, slot_map
+from ..ranking import (
+    DONE, NO_DATA, _resolve_rates, next_fastest_item, rank_activities, score_activities, score_activity,
+)
+from .fixtures import ACTIVITY_SHEET, ITEM_A1, ITEM_A2, ITEM_A3, ITEM_B1, ITEM_C1, create_activities, fixture_arrays
+
+ITEM_UNSLOTTED = 999999  # not in item_slots.json
+
+ALPHA, BETA, GAMMA, EMPTY = range(4)
+
+
+class ScoreActivitiesTests(SimpleTestCase):
+    """
+    score_activities against calculateTimeToNextLogSlot and findNextFastestItem
+    (frontend/src/utils/calculations.js). Expected values are worked through the JS
+    formulas: valA = 1 / sum(neither_inverse), valB = min(drop_rate_attempts),
+    valC = valA / rate, valD = valB / rate, then (min of the positive ones + extra) / 24.
+    """
+
+    def setUp(self):
+        self.arrays = fixture_arrays()
+
+    def score(self, obtained=(), is_iron=False, user_rates=None):
+        mask = np.isin(self.arrays.item_ids, list(obtained))
+        rates, extra = _resolve_rates(self.arrays, is_iron, user_rates)
+        days, status, fastest_row = score_activities(self.arrays, mask, rates, extra)
+        # The one-activity loop must agree bit for bit
+        for i in range(self.arrays.activity_count):
+            single = score_activity(self.arrays, i, mask, rates[i], extra[i])
+            self.assertEqual(single[1:], (status[i], fastest_row[i]))
+            if status[i] == 0:
+                self.assertEqual(single[0], days[i])
+        fastest = [int(self.arrays.item_ids[row]) if row >= 0 else None for row in fastest_row]
+        return days, status.tolist(), fastest
+
+    def test_all_missing(self):
+        days, status, fastest = self.score()
+        self.assertEqual(status, [0, 0, 2, 2])
+        # Alpha: valA = 1 / 0.03, valB = 50, valC = valA / 10, valD = 5 -> valC wins
+        self.assertAlmostEqual(days[ALPHA], (1 / 0.03 / 10 + 2) / 24)
+        # Beta has no main rate, so valC/valD are '' and valA = valB = 400 remain
+        self.assertAlmostEqual(days[BETA], 400 / 24)
+        # findNextFastestItem sorts by drop_rate_attempts, so a 0 (no drop rate) comes first
+        self.assertEqual(fastest, [ITEM_A3, ITEM_B1, ITEM_C1, None])
+
+    def test_partial(self):
+        days, status, fastest = self.score(obtained=[ITEM_A2, ITEM_A3])
+        self.assertEqual(status[ALPHA], 0)
+        # Only ITEM_A1 left: valA = valB = 100, valC = valD = 10
+        self.assertAlmostEqual(days[ALPHA], (10 + 2) / 24)
+        self.assertEqual(fastest[ALPHA], ITEM_A1)
+
+    def test_complete(self):
+        _, status, fastest = self.score(obtained=[ITEM_A1, ITEM_A2, ITEM_A3, ITEM_B1, ITEM_C1])
+        self.assertEqual(status, [1, 1, 1, 2])
+        self.assertEqual(fastest, [None, None, None, None])
+
+    def test_iron_uses_iron_rates(self):
+        days, status, _ = self.score(is_iron=True)
+        self.assertEqual(status, [0, 0, 2, 2])
+        self.assertAlmostEqual(days[ALPHA], (1 / 0.03 / 5 + 2) / 24)
+        self.assertAlmostEqual(days[BETA], 400 / 4 / 24)
+
+    def test_user_rates(self):
+        # `userRate ?? default`, but `userExtra || default`: an extra of 0 keeps the default
+        days, _, _ = self.score(user_rates={
+            "Alpha": {"completions_per_hour_main": 20, "extra_time_to_first_completion": 0},
+            "Beta": {"completions_per_hour_main": 8, "extra_time_to_first_completion": 3},
+        })
+        self.assertAlmostEqual(days[ALPHA], (1 / 0.03 / 20 + 2) / 24)
+        self.assertAlmostEqual(days[BETA], (400 / 8 + 3) / 24)
+
+    def test_rows_without_drop_rates(self):
+        # Gamma's only row has neither a drop rate nor a neither_inverse: no numeric value
+        _, status, fastest = self.score()
+        self.assertEqual(status[GAMMA], 2)
+        self.assertEqual(fastest[GAMMA], ITEM_C1)
+
+
+@override_settings(ACTIVITY_TABLE_DIR="")
+class RankActivitiesTests(TestCase):
+    def setUp(self):
+        create_activities()
+
+    def test_rows_and_order(self):
+        ranked = rank_activities([ITEM_A3])
+        self.assertEqual([r["activity_name"] for r in ranked], ["Alpha", "Beta", "Gamma", "Empty"])
+        alpha = ranked[0]
+        self.assertAlmostEqual(alpha["time_to_next_log_slot"], (1 / 0.03 / 10 + 2) / 24)
+        self.assertEqual((alpha["fastest_slot_id"], alpha["fastest_slot_name"]), (ITEM_A2, f"Item {ITEM_A2}"))
+        self.assertEqual((alpha["completions_per_hour"], alpha["extra_time_to_first_completion"]), (10.0, 2.0))
+        self.assertEqual(ranked[2]["time_to_next_log_slot"], NO_DATA)
+        self.assertEqual(ranked[3], {
+            "activity_name": "Empty", "time_to_next_log_slot": NO_DATA, "fastest_slot_name": "-", "fastest_slot_id": None,
+        })
+        self.assertEqual(next_fastest_item(ranked), {"id": ITEM_A2, "name": f"Item {ITEM_A2}"})
+
+    def test_done_activities_sort_last(self):
+        ranked = rank_activities([ITEM_A1, ITEM_A2, ITEM_A3], is_iron=True)
+        self.assertEqual([r["activity_name"] for r in ranked], ["Beta", "Alpha", "Gamma", "Empty"])
+        self.assertEqual(ranked[1]["time_to_next_log_slot"], DONE)
+        self.assertAlmostEqual(ranked[0]["time_to_next_log_slot"], 400 / 4 / 24)
+
+
+@override_settings(ACTIVITY_TABLE_DIR="")
+class UnslottedItemTests(TestCase):
+    """ An ActivityMap item that item_slots.json does not know about. """
+
+    def setUp(self):
+        create_activities(ACTIVITY_SHEET + [
+            ("Unslotted", 1.0, 1.0, 0.0, [(ITEM_UNSLOTTED, 10.0, 0.1, True, False, False)]),
+        ])
+
+    def test_item_ids_match_rows_directly(self):
+        ranked = {r["activity_name"]: r for r in rank_activities([ITEM_UNSLOTTED, str(ITEM_A1), "junk"])}
+        self.assertEqual(ranked["Unslotted"]["time_to_next_log_slot"], DONE)
+        self.assertEqual(ranked["Alpha"]["time_to_next_log_slot"], (1 / 0.02 / 10 + 2) / 24)
+        self.assertEqual(rank_activities([])[-1]["activity_name"], "Empty")
+
+    def test_bitmap_fails_loudly(self):
+        self.assertNotIn(ITEM_UNSLOTTED, slot_map.get().slot_of)
+        with self.assertRaisesMessage(ImproperlyConfigured, str(ITEM_UNSLOTTED)):
+            rank_activities(ObtainedSet.from_ids(slot_map.get(), [ITEM_A1]))
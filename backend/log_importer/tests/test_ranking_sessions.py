@@ -0,0 +1,42 @@
+from django.test import TestCase, override_settings
+from ..activity_data import ACTIVITIES, bump_data_version
+from ..ranking import activity_arrays, rank_activities
+from ..ranking_sessions import new_session
+from .fixtures import ACTIVITY_SHEET, ITEM_A1, ITEM_A2, ITEM_B1, create_activities
+from .test_ranking import ITEM_UNSLOTTED
+
+
+@override_settings(ACTIVITY_TABLE_DIR="")
+class RankingSessionTests(TestCase):
+    """ A session ranks exactly as rank_activities does for the same items. """
+
+    def setUp(self):
+        create_activities(ACTIVITY_SHEET + [
+            ("Unslotted", 1.0, 1.0, 0.0, [(ITEM_UNSLOTTED, 10.0, 0.1, True, False, False)]),
+        ])
+
+    def assertMatchesRanking(self, session, completed_items):
+        expected = rank_activities(completed_items)
+        self.assertEqual(session.top(len(expected)), expected)
+
+    def test_ids_without_a_slot_count(self):
+        completed = [ITEM_UNSLOTTED, str(ITEM_A1), "junk"]
+        session = new_session(completed)
+        self.assertMatchesRanking(session, completed)
+
+        session.obtain([ITEM_B1])
+        self.assertMatchesRanking(session, completed + [ITEM_B1])
+        session.obtain([ITEM_UNSLOTTED], obtained=False)
+        self.assertMatchesRanking(session, [ITEM_A1, ITEM_B1])
+        session.obtain([ITEM_UNSLOTTED, ITEM_A2])
+        self.assertMatchesRanking(session, [ITEM_A1, ITEM_A2, ITEM_B1, ITEM_UNSLOTTED])
+
+    def test_refresh_keeps_the_ids(self):
+        session = new_session([ITEM_UNSLOTTED])
+        session.obtain([ITEM_A2])
+        arrays = session.arrays
+        bump_data_version(ACTIVITIES)
+        session.refresh()
+        self.assertIsNot(session.arrays, arrays)
+        self.assertIs(session.arrays, activity_arrays.get())
+        self.assertMatchesRanking(session, [ITEM_UNSLOTTED, ITEM_A2])
@@ -0,0 +1,61 @@
+import numpy as np
+from django.test import SimpleTestCase
+from ..completion import ActivityModel
+from ..ranking import _resolve_rates
+from ..simulation import SimulationTables, run_simulation, shared_pool
+from .fixtures import fixture_arrays
+
+# Shared-table slots, an independent one, a requires_previous chain and an exact slot
+SOLO_SHEET = [
+    ("Solo", 4.0, 2.0, 1.5, [
+        (1, 20.0, 0.05, False, False, False),
+        (2, 50.0, 0.02, False, False, False),
+        (3, 10.0, 0.0, False, True, False),
+        (4, 30.0, 1 / 30, False, False, False),
+        (5, 40.0, 1 / 40, False, False, True),
+        (6, 60.0, 0.0, True, False, False),
+    ]),
+]
+
+
+def solo_tables(obtained=(), is_iron=False):
+    arrays = fixture_arrays(SOLO_SHEET)
+    model = ActivityModel(arrays, 0)
+    mask = np.isin(arrays.item_ids, list(obtained))
+    rates, extra = _resolve_rates(arrays, is_iron, None)
+    tables = SimulationTables.build(arrays, [model], mask, rates, extra)
+    expected_hours = model.expected_completions(mask) / rates[0] + extra[0]
+    return tables, int((~mask).sum()), expected_hours
+
+
+def simulate(tables, target, trials, workers=1, seed=0):
+    chunks = dict(run_simulation(tables, target, trials, 256, workers, seed))
+    return np.concatenate([chunks[index] for index in sorted(chunks)])
+
+
+class SimulationTests(SimpleTestCase):
+    def assertConverges(self, hours, expected):
+        # Seeded, so this is deterministic; 4 standard errors leaves room for any seed
+        error = hours.std() / np.sqrt(len(hours))
+        self.assertLess(abs(hours.mean() - expected), 4 * error)
+        self.assertLess(error / expected, 0.02)
+
+    def test_mean_converges_to_expected_completion(self):
+        tables, slots, expected = solo_tables()
+        hours = simulate(tables, slots, 4096)
+        self.assertTrue(np.isfinite(hours).all())
+        self.assertTrue((np.diff(hours, axis=1) >= 0).all())
+        self.assertConverges(hours[:, -1], expected)
+
+    def test_partial_log_and_iron(self):
+        tables, slots, expected = solo_tables(obtained=[1, 4], is_iron=True)
+        self.assertEqual(slots, 4)
+        self.assertConverges(simulate(tables, slots, 4096, seed=7)[:, -1], expected)
+
+    def test_same_seed_same_hours_on_the_shared_pool(self):
+        tables, slots, _ = solo_tables()
+        in_process = simulate(tables, slots, 1024, workers=1, seed=3)
+        pooled = simulate(tables, slots, 1024, workers=2, seed=3)
+        np.testing.assert_array_equal(in_process, pooled)
+        # Every later run, whatever its worker count, queues on the same pool
+        self.assertIs(shared_pool(4), shared_pool(2))
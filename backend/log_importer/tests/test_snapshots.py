@@ -0,0 +1,106 @@
+import asyncio
+import copy
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from ..encoding import dumps
+from ..models import Item, LogEntry, Player
+from ..obtained import ObtainedSet, slot_map
+from ..snapshots import USERNAME_MAX_LENGTH, load_snapshot, player_obtained, save_snapshot, stored_layout
+from ..upstream import PlayerNotFound, build_player_log, load_player_log, load_player_log_async
+from ..views import with_encoded_sections
+from .temple_stub import StubTempleServer, synthetic_player_log
+
+
+def sparse_player_log():
+    """ A synthetic log whose missing items have no date and every item an extra field. """
+    api_json = synthetic_player_log(obtained_ratio=0.3)
+    for subcat_items in api_json["data"]["items"].values():
+        for item in subcat_items:
+            item["category"] = "stub"
+            if not item["count"]:
+                del item["date"]
+    return api_json
+
+
+def regrouped_log(obtained_ratio=0.3, seed=0):
+    """ A synthetic log as load_player_log hands it to save_snapshot. """
+    return stored_layout(build_player_log(synthetic_player_log(obtained_ratio=obtained_ratio, seed=seed)))
+
+
+class SnapshotRoundTripTests(TestCase):
+    def test_save_and_reload(self):
+        player_log = regrouped_log()
+        player = save_snapshot("Round Trip", player_log)
+        self.assertEqual((player.version, player.resync_version), (1, 1))
+
+        # Any spelling of the name finds the snapshot
+        reloaded, stored = load_snapshot("round_trip")
+        self.assertEqual(reloaded, player_log)
+        self.assertEqual(stored.username, "Round Trip")
+        expected = ObtainedSet.from_player_log(slot_map.get(), player_log)
+        self.assertEqual(player_obtained(stored).to_bytes(), expected.to_bytes())
+
+    def test_same_log_only_refreshes_fetched_at(self):
+        player_log = regrouped_log()
+        first = save_snapshot("Round Trip", player_log)
+        items = dict(Item.objects.values_list("id", "changed_version"))
+        second = save_snapshot("ROUND TRIP", copy.deepcopy(player_log))
+        self.assertEqual((second.version, second.snapshot_hash), (first.version, first.snapshot_hash))
+        self.assertGreater(second.fetched_at, first.fetched_at)
+        self.assertEqual(second.username, "ROUND TRIP")
+        self.assertEqual(dict(Item.objects.values_list("id", "changed_version")), items)
+
+    def test_changed_log_replaces_the_snapshot(self):
+        save_snapshot("Round Trip", regrouped_log())
+        changed = regrouped_log(obtained_ratio=0.6, seed=1)
+        major, subcats = next(iter(changed["sections"].items()))
+        dropped = next(iter(subcats))
+        del subcats[dropped]
+        player = save_snapshot("Round Trip", changed)
+
+        self.assertEqual((player.version, player.resync_version), (2, 2))
+        self.assertEqual(load_snapshot("Round Trip")[0], changed)
+        self.assertFalse(LogEntry.objects.filter(tab__player=player, tab__name=major, name=dropped).exists())
+
+    def test_max_age(self):
+        save_snapshot("Round Trip", regrouped_log())
+        self.assertIsNotNone(load_snapshot("Round Trip", max_age=60))
+        Player.objects.update(fetched_at=timezone.now() - timedelta(seconds=61))
+        self.assertIsNone(load_snapshot("Round Trip", max_age=60))
+        self.assertIsNotNone(load_snapshot("Round Trip"))
+        self.assertIsNone(load_snapshot("Someone else"))
+
+
+class PlayerNotFoundTests(TestCase):
+    """ Names TempleOSRS has no log for are turned away without storing a Player. """
+
+    def test_log_without_items_is_not_stored(self):
+        error_document = {"error": {"Code": 402, "Message": "Player has not synced their collection log"}}
+        with StubTempleServer(error_document, latency=0) as stub, override_settings(TEMPLE_LOG_URL=stub.url):
+            with self.assertRaises(PlayerNotFound) as raised:
+                load_player_log("Made up name")
+            with self.assertRaises(PlayerNotFound):
+                asyncio.run(load_player_log_async("Made up name"))
+        self.assertEqual(raised.exception.status_code, 404)
+        self.assertFalse(Player.objects.exists())
+
+    def test_name_too_long_for_the_player_key(self):
+        with StubTempleServer({"data": {}}, latency=0) as stub, override_settings(TEMPLE_LOG_URL=stub.url):
+            with self.assertRaises(PlayerNotFound):
+                load_player_log("x" * (USERNAME_MAX_LENGTH + 1))
+            self.assertEqual(stub.requests, 0)
+        self.assertFalse(Player.objects.exists())
+
+
+class StoredLayoutTests(TestCase):
+    def test_fresh_and_stored_logs_encode_alike(self):
+        with StubTempleServer(sparse_player_log(), latency=0) as stub, override_settings(TEMPLE_LOG_URL=stub.url):
+            fresh = load_player_log("Layout player", force_refresh=True)
+        stored = load_snapshot("Layout player")[0]
+        self.assertEqual(dumps(fresh["sections"]), dumps(stored["sections"]))
+
+        # Whichever of the two is encoded first, both are served the same bytes
+        for data in (stored, fresh):
+            body = with_encoded_sections({"data": {**data, "hash": fresh["hash"]}})
+            self.assertEqual(bytes(body["data"]["sections"]), dumps(fresh["sections"]))
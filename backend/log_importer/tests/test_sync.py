@@ -0,0 +1,99 @@
+import copy
+import json
+from unittest import mock
+from django.test import TestCase
+from ..snapshots import load_changes, save_snapshot
+from .test_snapshots import regrouped_log
+
+SYNC_URL = "/log_importer/collection-log/sync/"
+
+
+def log_items(player_log):
+    return [
+        (major, subcat, entry["items"])
+        for major, subcats in player_log["sections"].items()
+        for subcat, entry in subcats.items()
+        if entry["items"]
+    ]
+
+
+def apply_changes(player_log, changes):
+    """ What a client does with a delta: writes each changed item at its index. """
+    patched = copy.deepcopy(player_log)
+    for major, subcats in changes.items():
+        for subcat, slots in subcats.items():
+            items = patched["sections"][major][subcat]["items"]
+            for change in slots:
+                if change["index"] < len(items):
+                    items[change["index"]] = change["item"]
+                else:
+                    items.append(change["item"])
+    return patched
+
+
+class DeltaSyncTests(TestCase):
+    """ load_changes and collection-log/sync/ against a player with three snapshots. """
+
+    def setUp(self):
+        self.v1 = regrouped_log(obtained_ratio=0.2)
+        self.player = save_snapshot("Sync player", self.v1)
+        # v2 obtains two items: a delta can express that
+        self.v2 = copy.deepcopy(self.v1)
+        self.changed = []
+        for major, subcat, items in log_items(self.v2):
+            for index, item in enumerate(items):
+                if not item["count"] and len(self.changed) < 2:
+                    item.update(count=1, date="2024-02-01 00:00:00")
+                    self.changed.append((major, subcat, index, item))
+        self.player = save_snapshot("Sync player", self.v2)
+
+    def sync(self, **body):
+        with mock.patch("log_importer.views.player_log_cache") as cache:
+            cache.get.return_value = (None, "hit", 0)
+            response = self.client.post(SYNC_URL, json.dumps({"username": "Sync player", **body}),
+                                        content_type="application/json")
+        return response.json()
+
+    def test_load_changes(self):
+        self.assertEqual((self.player.version, self.player.resync_version), (2, 1))
+        changes = load_changes(self.player, 1)
+        self.assertEqual(
+            sorted((major, subcat, c["index"], c["item"]["id"]) for major, subcats in changes.items()
+                   for subcat, slots in subcats.items() for c in slots),
+            sorted((major, subcat, index, item["id"]) for major, subcat, index, item in self.changed),
+        )
+        self.assertEqual(apply_changes(self.v1, changes), self.v2)
+        self.assertEqual(load_changes(self.player, 2), {})
+
+    def test_sync_modes(self):
+        unchanged = self.sync(version=2, hash=self.player.snapshot_hash)
+        self.assertEqual((unchanged["mode"], unchanged["version"]), ("unchanged", 2))
+
+        delta = self.sync(version=1)
+        self.assertEqual(delta["mode"], "delta")
+        self.assertEqual(apply_changes(self.v1, delta["data"]["changes"]), self.v2)
+        self.assertEqual(delta["data"]["obtained"]["bits"], self.sync(version=0)["data"]["obtained"]["bits"])
+
+        for stale in ({"version": 0}, {}, {"version": "1"}):
+            full = self.sync(**stale)
+            self.assertEqual(full["mode"], "full", stale)
+            self.assertEqual(full["data"]["sections"], self.v2["sections"])
+
+    def test_structural_change_forces_a_full_resync(self):
+        v3 = copy.deepcopy(self.v2)
+        major, subcat, items = log_items(v3)[0]
+        items.pop()
+        player = save_snapshot("Sync player", v3)
+        self.assertEqual((player.version, player.resync_version), (3, 3))
+
+        # A client at v2 cannot patch a removed slot
+        full = self.sync(version=2)
+        self.assertEqual(full["mode"], "full")
+        self.assertEqual(full["data"]["sections"][major][subcat]["items"], items)
+
+    def test_unknown_player(self):
+        with mock.patch("log_importer.views.player_log_cache") as cache:
+            cache.get.return_value = (None, "miss", 0)
+            response = self.client.post(SYNC_URL, json.dumps({"username": "Nobody", "version": 1}),
+                                        content_type="application/json")
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,117 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+import ijson
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, override_settings
+from ..static_data import sections_index
+from ..upstream import (
+    KEPT_ITEM_FIELDS, UPSTREAM_UNAVAILABLE, PlayerLogCache, PlayerLogParser, UpstreamError, build_player_log,
+    get_async_client, request_player_log, stream_player_log, stream_player_log_async,
+)
+from .temple_stub import StubTempleServer, synthetic_player_log
+
+
+class PlayerLogFetchTests(SimpleTestCase):
+    """ The fetch paths against a stub TempleOSRS serving a synthetic log. """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = StubTempleServer(synthetic_player_log(obtained_ratio=0.3), latency=0).start()
+        cls.settings = override_settings(TEMPLE_LOG_URL=cls.stub.url)
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def test_streaming_matches_buffered(self):
+        expected = build_player_log(request_player_log("stub"))
+        self.assertEqual(stream_player_log("stub"), expected)
+        self.assertEqual(asyncio.run(stream_player_log_async("stub")), expected)
+        self.assertGreater(expected["uniqueObtained"], 0)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        cache = PlayerLogCache(lambda username, force_refresh: stream_player_log(username))
+        served = self.stub.requests
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: cache.get("Stub"), range(8)))
+        self.assertEqual(self.stub.requests - served, 1)
+        self.assertEqual(len({id(payload) for payload, _, _ in results}), 1)
+        self.assertEqual(sorted(status for _, status, _ in results).count("miss"), 1)
+
+    def test_async_client_closes_with_its_loop(self):
+        async def fetch():
+            await stream_player_log_async("stub")
+            client = await get_async_client()
+            self.assertIs(await get_async_client(), client)
+            return client
+
+        self.assertTrue(asyncio.run(fetch()).is_closed)
+        # An async view under WSGI runs through async_to_sync on a loop of its own
+        self.assertTrue(async_to_sync(fetch)().is_closed)
+
+
+class UpstreamErrorTests(SimpleTestCase):
+    def test_non_200_raises_upstream_error(self):
+        with StubTempleServer(b"{}", latency=0, status=503) as stub, override_settings(TEMPLE_LOG_URL=stub.url):
+            with self.assertRaises(UpstreamError) as raised:
+                stream_player_log("stub")
+            self.assertEqual(raised.exception.status_code, 503)
+            with self.assertRaises(UpstreamError):
+                asyncio.run(stream_player_log_async("stub"))
+
+
+def parse_in_chunks(raw, size):
+    parser = PlayerLogParser(sections_index.get())
+    for start in range(0, len(raw), size):
+        parser.feed(raw[start:start + size])
+    return parser.close()
+
+
+def kept_fields(player_log):
+    """ build_player_log's output with items cut down to KEPT_ITEM_FIELDS, as the parser keeps them. """
+    for subcats in player_log["sections"].values():
+        for entry in subcats.values():
+            entry["items"] = [{k: v for k, v in item.items() if k in KEPT_ITEM_FIELDS} for item in entry["items"]]
+    return player_log
+
+
+class PlayerLogParserTests(SimpleTestCase):
+    """ The streaming parser against build_player_log on the json.loads'ed document. """
+
+    def noisy_log(self):
+        api_json = synthetic_player_log(obtained_ratio=0.4, seed=3)
+        data = api_json["data"]
+        data["items"]["not_a_sections_subcat"] = [{"id": 1, "name": "Ignored", "count": 1}]
+        for subcat_items in data["items"].values():
+            for item in subcat_items:
+                # Fields the parser drops, including nested ones it has to skip over
+                item["category"] = {"name": "Bosses", "tags": [1, {"deep": [2, 3]}]}
+                item["name"] += " \u00e9\U0001f600"
+                item["rate"] = 1.5
+        data["extra"] = {"items": {"fake": [{"id": 2}]}}
+        return {"meta": {"data": {"items": {}}}, **api_json}
+
+    def test_matches_the_buffered_path_in_any_chunk_size(self):
+        raw = json.dumps(self.noisy_log()).encode()
+        expected = kept_fields(build_player_log(json.loads(raw)))
+        self.assertGreater(sum(len(e["items"]) for s in expected["sections"].values() for e in s.values()), 100)
+        for size in (1, 7, 4096, len(raw)):
+            self.assertEqual(parse_in_chunks(raw, size), expected, f"chunk size {size}")
+
+    def test_summary_defaults(self):
+        for document in ({"error": {"Code": 402}}, {"data": {}}, {"data": {"items": {}}}):
+            raw = json.dumps(document).encode()
+            parsed = parse_in_chunks(raw, 5)
+            self.assertEqual(parsed, build_player_log(json.loads(raw)))
+            self.assertEqual((parsed["accountType"], parsed["uniqueObtained"]), ("Unknown", 0))
+
+    def test_truncated_body_is_an_upstream_failure(self):
+        raw = json.dumps(synthetic_player_log()).encode()
+        with self.assertRaises(UPSTREAM_UNAVAILABLE) as raised:
+            parse_in_chunks(raw[:len(raw) // 2], 4096)
+        self.assertIsInstance(raised.exception, ijson.JSONError)
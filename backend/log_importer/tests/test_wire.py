@@ -0,0 +1,103 @@
+import json
+import unittest
+from unittest import mock
+from django.test import RequestFactory, SimpleTestCase
+from ..obtained import SlotMap, slot_map
+from ..wire import (
+    build_dictionary, compact_activities, compact_log_body, encode, expand_player_log, items_index, msgpack,
+    wire_format,
+)
+from .test_snapshots import regrouped_log
+
+DECODERS = {"compact": json.loads}
+if msgpack is not None:
+    DECODERS["msgpack"] = lambda body: msgpack.unpackb(body, raw=False)
+
+
+class CompactRoundTripTests(SimpleTestCase):
+    """ compact_player_log -> encode -> decode -> expand_player_log gives back the log. """
+
+    def round_trip(self, player_log, slots, fmt):
+        body = {"status": "success", "data": player_log}
+        with mock.patch.object(slot_map, "get", return_value=slots):
+            decoded = DECODERS[fmt](encode(compact_log_body(body), fmt))
+        dictionary = DECODERS[fmt](encode(build_dictionary(slots, items_index.get(), []), fmt))
+        self.assertEqual(decoded["data"]["slots_version"], dictionary["slots_version"])
+        return {**decoded, "data": expand_player_log(decoded["data"], dictionary)}
+
+    def test_round_trip(self):
+        player_log = {**regrouped_log(), "username": "Stub", "version": 3, "hash": "abc"}
+        for fmt in DECODERS:
+            with self.subTest(fmt=fmt):
+                self.assertEqual(self.round_trip(player_log, slot_map.get(), fmt),
+                                 {"status": "success", "data": player_log})
+
+    def test_items_without_a_slot(self):
+        player_log = regrouped_log()
+        slots = slot_map.get()
+        # An older item_slots.json that lacks the last ten ids
+        older = SlotMap(slots.version - 1, slots.item_ids[:-10].tolist())
+        unslotted = {int(item_id) for item_id in slots.item_ids[-10:]}
+        expected = json.loads(json.dumps(player_log))
+        for subcats in expected["sections"].values():
+            for entry in subcats.values():
+                for item in entry["items"]:
+                    if item["id"] in unslotted:
+                        # The dictionary has no name for them; the id stands in
+                        item["name"] = str(item["id"])
+        for fmt in DECODERS:
+            with self.subTest(fmt=fmt):
+                self.assertEqual(self.round_trip(player_log, older, fmt)["data"], expected)
+
+    def test_compact_activities(self):
+        slots = slot_map.get()
+        item_ids = slots.item_ids[:3].tolist()
+        activities = [
+            {"activity_index": 1, "completions_per_hour_main": 45.0, "completions_per_hour_iron": 34.0,
+             "maps": [{"item_id": item_ids[0], "drop_rate_attempts": 100.0, "neither_inverse": None},
+                      {"item_id": item_ids[1], "drop_rate_attempts": None, "neither_inverse": 0.01}]},
+            {"activity_index": 2, "completions_per_hour_main": 30.0, "completions_per_hour_iron": 29.0, "maps": []},
+            {"activity_index": 3, "completions_per_hour_main": 20.0, "completions_per_hour_iron": 20.0,
+             "maps": [{"item_id": 999999999, "drop_rate_attempts": 50.0, "neither_inverse": None}]},
+        ]
+        for fmt in DECODERS:
+            with self.subTest(fmt=fmt):
+                compact = DECODERS[fmt](encode(compact_activities(activities, slots), fmt))
+                offsets = compact["activities"]["map_offsets"]
+                self.assertEqual(offsets, [0, 2, 2, 3])
+                for i, activity in enumerate(activities):
+                    maps = compact["maps"]
+                    rows = range(offsets[i], offsets[i + 1])
+                    self.assertEqual(
+                        [(slots.item_ids[maps["slot"][r]] if maps["slot"][r] >= 0 else -maps["slot"][r],
+                          maps["drop_rate_attempts"][r], maps["neither_inverse"][r]) for r in rows],
+                        [(m["item_id"], m["drop_rate_attempts"], m["neither_inverse"]) for m in activity["maps"]],
+                    )
+
+
+class WireFormatTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def fmt(self, query="", accept=""):
+        return wire_format(self.factory.get(f"/log_importer/collection-log/{query}", HTTP_ACCEPT=accept))
+
+    def test_negotiation(self):
+        self.assertEqual(self.fmt(), "json")
+        self.assertEqual(self.fmt(accept="application/vnd.collectionlog.compact+json"), "compact")
+        self.assertEqual(self.fmt(accept="application/x-msgpack;q=0.9, application/json"),
+                         "json" if msgpack is None else "msgpack")
+        # ?format= wins over Accept
+        self.assertEqual(self.fmt("?format=json", accept="application/msgpack"), "json")
+        with self.assertRaisesMessage(ValueError, "format must be one of json, compact, msgpack"):
+            self.fmt("?format=xml")
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_with_msgpack(self):
+        self.assertEqual(self.fmt("?format=msgpack"), "msgpack")
+
+    def test_without_msgpack(self):
+        with mock.patch("log_importer.wire.msgpack", None):
+            self.assertEqual(self.fmt(accept="application/msgpack"), "json")
+            with self.assertRaisesMessage(ValueError, "MessagePack is not available"):
+                self.fmt("?format=msgpack")
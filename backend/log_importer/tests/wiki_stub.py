@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+
+class StubWiki:
+    """
+    A local stand-in for the OSRS wiki, enough for fetch_item_images:
+
+    - /w/Special:Lookup?type=item&id=N redirects to /w/<title> for ids in `lookups`
+      ({item id: page title}); unknown ids stay on Special:Lookup.
+    - /images/<file> answers 200 for names in `images`, 404 otherwise.
+    - /w/<title> serves a page whose infobox shows `infoboxes[title]`, if any.
+    - /api.php answers prop=images from `page_images` ({title: [file titles]}),
+      at most `api_page_size` images per response with "continue", and
+      prop=imageinfo from `file_urls` ({file title: url}).
+
+    `fail_once` maps request paths (with query string) to a status returned the first
+    time each is requested. Every request is recorded in `requests` as
+    (monotonic time, path, query dict).
+    """
+
+    def __init__(self, lookups=None, images=(), infoboxes=None, page_images=None, file_urls=None,
+                 fail_once=None, api_page_size=500):
+        self.lookups = dict(lookups or {})
+        self.images = set(images)
+        self.infoboxes = dict(infoboxes or {})
+        self.page_images = dict(page_images or {})
+        self.file_urls = dict(file_urls or {})
+        self.fail_once = dict(fail_once or {})
+        self.api_page_size = api_page_size
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def requests_to(self, path):
+        return [r for r in self.requests if urlsplit(r[1]).path == path]
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handle(self, handler):
+        parts = urlsplit(handler.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        with self._lock:
+            self.requests.append((time.monotonic(), handler.path, query))
+            failure = self.fail_once.pop(handler.path, None)
+        if failure:
+            return self._send(handler, failure, b"", retry_after="0")
+
+        path = unquote(parts.path)
+        if path == "/w/Special:Lookup":
+            title = self.lookups.get(int(query.get("id", 0)))
+            if title is None:
+                return self._send(handler, 200, b"<html>Nothing found</html>", "text/html")
+            return self._send(handler, 302, b"", location="/w/" + quote(title.replace(" ", "_")))
+        if path.startswith("/images/"):
+            found = path[len("/images/"):] in self.images
+            return self._send(handler, 200 if found else 404, b"", "image/png")
+        if path.startswith("/w/"):
+            title = path[len("/w/"):].replace("_", " ")
+            src = self.infoboxes.get(title)
+            cell = f'<td class="infobox-image"><img src="{src}"></td>' if src else "<td></td>"
+            return self._send(handler, 200, f"<html><table><tr>{cell}</tr></table></html>".encode(), "text/html")
+        if path == "/api.php":
+            return self._send(handler, 200, json.dumps(self._api(query)).encode(), "application/json")
+        self._send(handler, 404, b"")
+
+    def _api(self, query):
+        normalized, titles = [], []
+        for title in query["titles"].split("|"):
+            if "_" in title:
+                normalized.append({"from": title, "to": title.replace("_", " ")})
+            titles.append(title.replace("_", " "))
+
+        pages = {}
+        for index, title in enumerate(titles):
+            known = title in self.page_images or title in self.file_urls
+            pages[str(index + 1) if known else str(-index - 1)] = {"title": title} if known else {"title": title, "missing": ""}
+        result = {"query": {"pages": pages}}
+        if normalized:
+            result["query"]["normalized"] = normalized
+
+        if query.get("prop") == "imageinfo":
+            for page in pages.values():
+                if page["title"] in self.file_urls:
+                    page["imageinfo"] = [{"url": self.file_urls[page["title"]]}]
+            return result
+
+        # prop=images: one flat list across the requested pages, paged like MediaWiki's imcontinue
+        listed = [(page, image) for page in pages.values() for image in self.page_images.get(page["title"], [])]
+        offset = int(query.get("imcontinue", 0))
+        for page, image in listed[offset:offset + self.api_page_size]:
+            page.setdefault("images", []).append({"title": image})
+        if offset + self.api_page_size < len(listed):
+            result["continue"] = {"imcontinue": str(offset + self.api_page_size), "continue": "||"}
+        return result
+
+    def _send(self, handler, status, body, content_type="text/plain", location=None, retry_after=None):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        if location:
+            handler.send_header("Location", location)
+        if retry_after is not None:
+            handler.send_header("Retry-After", retry_after)
+        handler.end_headers()
+        handler.wfile.write(body)
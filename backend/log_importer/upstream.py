@@ -0,0 +1,501 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+import httpx
+import ijson
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from .singleflight import Flight, shared_flight_store
+from .snapshots import (
+    has_items, load_snapshot, normalize_username, save_snapshot, storable_username, stored_layout, with_snapshot_meta,
+)
+from .static_data import sections_index
+
+
+# Item fields the frontend reads; the rest of each upstream item is dropped while parsing
+KEPT_ITEM_FIELDS = {field: field for field in ("id", "name", "count", "date")}
+SUMMARY_FIELDS = frozenset(["accountType", "total_collections_finished", "total_collections_available"])
+STREAM_CHUNK_SIZE = 16 * 1024
+# Failures that mean TempleOSRS is down or slow rather than that the request was bad
+UPSTREAM_UNAVAILABLE = (requests.RequestException, httpx.HTTPError, ijson.JSONError)
+# What clients are told about those, without the URLs and socket details they carry
+UPSTREAM_UNAVAILABLE_MESSAGE = "Failed to fetch data from API. TempleOSRS is unavailable."
+
+
+class UpstreamError(Exception):
+    """ Raised when TempleOSRS answers with a non-200 status. """
+
+    def __init__(self, status_code):
+        super().__init__(f"Failed to fetch data from API. Status code: {status_code}")
+        self.status_code = status_code
+
+
+class PlayerNotFound(UpstreamError):
+    """
+    Raised when TempleOSRS has no collection log for a name: it answers 200 with an
+    error document (or no items) for unknown and never-synced players.
+    """
+
+    def __init__(self):
+        Exception.__init__(self, "Player not found on TempleOSRS")
+        self.status_code = 404
+
+
+def check_player_log(player_log):
+    """ Returns a freshly fetched player_log if it holds any items, else raises PlayerNotFound. """
+    if not has_items(player_log):
+        raise PlayerNotFound()
+    return player_log
+
+
+def player_log_params(username):
+    return {
+        "player": username,
+        "categories": "all",
+        "includenames": "1",
+        "includemissingitems": "1"
+    }
+
+
+def request_player_log(username):
+    """ Performs the blocking upstream call and returns the parsed JSON document. """
+    response = requests.get(
+        settings.TEMPLE_LOG_URL,
+        params=player_log_params(username),
+        timeout=(settings.TEMPLE_CONNECT_TIMEOUT, settings.TEMPLE_READ_TIMEOUT),
+    )
+    if response.status_code != 200:
+        raise UpstreamError(response.status_code)
+    return response.json()
+
+
+def stream_player_log(username):
+    """ Performs the blocking upstream call, regrouping the body as it arrives. """
+    with requests.get(
+        settings.TEMPLE_LOG_URL,
+        params=player_log_params(username),
+        timeout=(settings.TEMPLE_CONNECT_TIMEOUT, settings.TEMPLE_READ_TIMEOUT),
+        stream=True,
+    ) as response:
+        if response.status_code != 200:
+            raise UpstreamError(response.status_code)
+        parser = PlayerLogParser(sections_index.get())
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            parser.feed(chunk)
+        return parser.close()
+
+
+# One pooled keep-alive client per event loop: under an ASGI server that is a single
+# long-lived client per worker. Under WSGI every async view call runs on a loop of its
+# own, so each client is closed when its loop shuts down (see _client_lifetime).
+_async_clients = weakref.WeakKeyDictionary()
+
+
+async def _client_lifetime(client):
+    """
+    Keeps a loop's client open for as long as the loop runs. Loops finalize pending
+    async generators on shutdown (asyncio.run and asgiref's async_to_sync both do),
+    which runs the finally block and closes the client's connections.
+    """
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+async def get_async_client():
+    """
+    Returns the running loop's pooled client. Up to TEMPLE_MAX_CONNECTIONS calls are
+    in flight at once; httpx queues any beyond that for a free connection.
+    """
+    loop = asyncio.get_running_loop()
+    pooled = _async_clients.get(loop)
+    if pooled is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.TEMPLE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TEMPLE_MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(settings.TEMPLE_READ_TIMEOUT, connect=settings.TEMPLE_CONNECT_TIMEOUT),
+        )
+        lifetime = _client_lifetime(client)
+        pooled = _async_clients[loop] = (client, lifetime)
+        # Starting the generator registers it with the loop for shutdown
+        await lifetime.asend(None)
+    return pooled[0]
+
+
+async def request_player_log_async(username):
+    """ Non-blocking equivalent of request_player_log on the loop's pooled client. """
+    client = await get_async_client()
+    response = await client.get(settings.TEMPLE_LOG_URL, params=player_log_params(username))
+    if response.status_code != 200:
+        raise UpstreamError(response.status_code)
+    return response.json()
+
+
+async def stream_player_log_async(username):
+    """ Non-blocking equivalent of stream_player_log on the loop's pooled client. """
+    client = await get_async_client()
+    async with client.stream("GET", settings.TEMPLE_LOG_URL, params=player_log_params(username)) as response:
+        if response.status_code != 200:
+            raise UpstreamError(response.status_code)
+        parser = PlayerLogParser(sections_index.get())
+        async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+            parser.feed(chunk)
+    return parser.close()
+
+
+class PlayerLogParser:
+    """
+    Incremental parser for the TempleOSRS collection log response.
+
+    Bytes are fed in as they arrive; items are regrouped into sections straight
+    off the parser, keeping only KEPT_ITEM_FIELDS, and items of sub-categories
+    sections.json does not use are skipped. The upstream document is never held
+    in memory as a whole. close() returns the same structure as build_player_log.
+
+    The parser works on ijson's basic events and tracks its own position, since
+    the documented layout is shallow: {"data": {<summary>, "items": {subcat: [item]}}}.
+    """
+
+    def __init__(self, index):
+        self._grouper = index.grouper()
+        self._summary = {}
+        self._events = ijson.sendable_list()
+        self._parser = ijson.basic_parse_coro(self._events, use_float=True)
+        # Keys of the enclosing maps (None for arrays), outermost first
+        self._path = []
+        self._subcat = None
+        self._wanted = False
+        self._item = None
+
+    def feed(self, chunk):
+        self._parser.send(chunk)
+        self._consume()
+
+    def close(self):
+        self._parser.close()
+        self._consume()
+        return {
+            "accountType": self._summary.get("accountType", "Unknown"),
+            "uniqueObtained": self._summary.get("total_collections_finished", 0),
+            "uniqueItems": self._summary.get("total_collections_available", 0),
+            "sections": self._grouper.sections(),
+        }
+
+    def _consume(self):
+        path = self._path
+        for event, value in self._events:
+            depth = len(path)
+            if event == "map_key":
+                path[-1] = value
+                if depth == 3 and path[1] == "items" and path[0] == "data":
+                    self._subcat = value
+                    self._wanted = self._grouper.wants(value)
+            elif event == "start_map":
+                # An item is a map inside data.items.<subcat>[]
+                if depth == 4 and self._wanted and path[3] is None and path[1] == "items" and path[0] == "data":
+                    self._item = {}
+                path.append(None)
+            elif event == "start_array":
+                path.append(None)
+            elif event == "end_map":
+                path.pop()
+                if depth == 5 and self._item is not None:
+                    self._grouper.add(self._subcat, self._item)
+                    self._item = None
+            elif event == "end_array":
+                path.pop()
+            elif depth == 5 and self._item is not None:
+                # Key with the shared constant, not the parser's fresh copy of the name
+                field = KEPT_ITEM_FIELDS.get(path[4])
+                if field is not None:
+                    self._item[field] = value
+            elif depth == 2 and path[0] == "data" and path[1] in SUMMARY_FIELDS:
+                self._summary[path[1]] = value
+        del self._events[:]
+
+
+def build_player_log(api_json):
+    """
+    Regroups an already parsed upstream player log into the sections from sections.json.
+    Non-streaming counterpart of PlayerLogParser, which keeps only KEPT_ITEM_FIELDS.
+    """
+    # The new API response puts the data under "data"
+    data = api_json.get("data", {})
+    # The API returns the items grouped by sub-category (e.g., "abyssal_sire");
+    # the order from sections.json is used as-is (no extra sorting)
+    return {
+        "accountType": data.get("accountType", "Unknown"),
+        "uniqueObtained": data.get("total_collections_finished", 0),
+        "uniqueItems": data.get("total_collections_available", 0),
+        "sections": sections_index.get().regroup(data.get("items", {})),
+    }
+
+
+def load_player_log(username, force_refresh=False):
+    """
+    A player's regrouped log: the stored snapshot if it is younger than
+    PLAYER_SNAPSHOT_FRESH_AGE (unless force_refresh), else a fresh upstream fetch,
+    which is then stored as the new snapshot (in its stored_layout, so both read the
+    same). Either way it carries the snapshot's version and hash. Raises PlayerNotFound, and stores nothing, when TempleOSRS has
+    no log for the name or the name is too long to be a player's.
+    """
+    if not storable_username(username):
+        raise PlayerNotFound()
+    if not force_refresh:
+        snapshot = load_snapshot(username, max_age=settings.PLAYER_SNAPSHOT_FRESH_AGE)
+        if snapshot is not None:
+            return with_snapshot_meta(*snapshot)
+    player_log = stored_layout(check_player_log(stream_player_log(username)))
+    return with_snapshot_meta(player_log, save_snapshot(username, player_log))
+
+
+async def load_player_log_async(username, force_refresh=False):
+    if not storable_username(username):
+        raise PlayerNotFound()
+    if not force_refresh:
+        snapshot = await sync_to_async(load_snapshot)(username, max_age=settings.PLAYER_SNAPSHOT_FRESH_AGE)
+        if snapshot is not None:
+            return with_snapshot_meta(*snapshot)
+    player_log = stored_layout(check_player_log(await stream_player_log_async(username)))
+    return with_snapshot_meta(player_log, await sync_to_async(save_snapshot)(username, player_log))
+
+
+class PlayerLogCache:
+    """
+    Bounded LRU of regrouped player logs keyed by normalized username.
+
+    An entry younger than `ttl` seconds is served as-is. Up to `stale_ttl`
+    seconds after that it is still served, but a background refresh is started
+    so the next request sees fresh data. Anything older is refetched inline.
+
+    Misses are single-flight: concurrent requests for the same player wait on
+    the one fetch already in progress and share its result. With a `shared`
+    SharedFlightStore this also holds across worker processes.
+
+    `fetch(username, force_refresh)` produces the value on a miss.
+    """
+
+    def __init__(self, fetch, ttl=300, stale_ttl=600, max_entries=512, shared=None):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.shared_hits = 0
+        self.refresh_errors = 0
+
+    def get(self, username, force_refresh=False):
+        """
+        Returns (payload, cache_status, coalesced). cache_status is hit, stale, miss,
+        refresh or coalesced (served by another request's fetch); coalesced is how many
+        other requests shared the same upstream fetch.
+        """
+        key = normalize_username(username)
+        looked_up = time.monotonic()
+        cached = self._lookup(key, username, force_refresh)
+        if cached is not None:
+            return cached + (0,)
+        flight, leader = self._join(key, looked_up)
+        if not leader:
+            return flight.future.result(), "coalesced", flight.waiters
+
+        started = time.time()
+        status = "refresh" if force_refresh else "miss"
+        try:
+            if self.shared is None:
+                payload = self.fetch(username, force_refresh)
+            else:
+                with self.shared.lock(key):
+                    payload = self._read_shared(key, force_refresh, started)
+                    if payload is None:
+                        payload = self.fetch(username, force_refresh)
+                        self.shared.write(key, payload)
+                    else:
+                        status = "coalesced"
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, payload)
+        return payload, status, flight.waiters
+
+    async def aget(self, username, fetch, force_refresh=False):
+        """ Same as get(), but awaits `fetch` (a coroutine function, same arguments) when this request has to fetch. """
+        key = normalize_username(username)
+        looked_up = time.monotonic()
+        cached = self._lookup(key, username, force_refresh)
+        if cached is not None:
+            return cached + (0,)
+        flight, leader = self._join(key, looked_up)
+        if not leader:
+            # Shielded so a disconnecting client cannot cancel the fetch the others share.
+            payload = await asyncio.shield(asyncio.wrap_future(flight.future))
+            return payload, "coalesced", flight.waiters
+
+        started = time.time()
+        status = "refresh" if force_refresh else "miss"
+        try:
+            if self.shared is None:
+                payload = await fetch(username, force_refresh)
+            else:
+                handle = await asyncio.to_thread(self.shared.acquire, key)
+                try:
+                    payload = self._read_shared(key, force_refresh, started)
+                    if payload is None:
+                        payload = await fetch(username, force_refresh)
+                        self.shared.write(key, payload)
+                    else:
+                        status = "coalesced"
+                finally:
+                    self.shared.release(handle)
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, payload)
+        return payload, status, flight.waiters
+
+    def _join(self, key, looked_up):
+        """
+        Returns (flight, leader): the key's in-progress fetch, or a new one this request
+        must run. A fetch that landed after the cache lookup at `looked_up` is reused too.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                entry = self._entries.get(key)
+                if entry is None or entry[0] < looked_up:
+                    flight = self._flights[key] = Flight()
+                    return flight, True
+                flight = Flight()
+                flight.future.set_result(entry[1])
+            flight.waiters += 1
+            self.coalesced += 1
+            return flight, False
+
+    def _land(self, key, flight, payload=None, error=None):
+        """ Caches a successful result and wakes the requests waiting on the flight. """
+        with self._lock:
+            if error is None:
+                self._put(key, payload)
+            self._flights.pop(key, None)
+        if error is None:
+            flight.future.set_result(payload)
+        else:
+            flight.future.set_exception(error)
+
+    def _read_shared(self, key, force_refresh, started):
+        """
+        Called with the key's lock file held: returns the result another process wrote
+        while this one waited (or, without force_refresh, within the TTL), else None.
+        """
+        written_after = started if force_refresh else time.time() - self.ttl
+        payload = self.shared.read(key, written_after)
+        if payload is not None:
+            with self._lock:
+                self.shared_hits += 1
+        return payload
+
+    def _lookup(self, key, username, force_refresh):
+        """
+        Serves a fresh or stale entry, starting a background refresh for stale ones.
+        Returns None when the caller has to fetch.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = None if force_refresh else self._entries.get(key)
+            if entry is not None:
+                fetched_at, payload = entry
+                age = now - fetched_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload, "hit"
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    start_refresh = key not in self._refreshing
+                    if start_refresh:
+                        self._refreshing.add(key)
+                else:
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+        # Refreshes run on a thread with the blocking fetch, so they outlive the request
+        # whether it was served by a sync worker or an event loop.
+        if start_refresh:
+            threading.Thread(target=self._refresh, args=(key, username), daemon=True).start()
+        return entry[1], "stale"
+
+    def _refresh(self, key, username):
+        try:
+            payload = self.fetch(username, False)
+        except Exception:
+            with self._lock:
+                self.refresh_errors += 1
+        else:
+            self._store(key, payload)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+            # fetch stores snapshots, and Django does not close a background thread's connections
+            connections.close_all()
+
+    def _store(self, key, payload):
+        with self._lock:
+            self._put(key, payload)
+
+    def _put(self, key, payload):
+        self._entries[key] = (time.monotonic(), payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, username=None):
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(normalize_username(username), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "shared_hits": self.shared_hits,
+                "in_flight": len(self._flights),
+                "refresh_errors": self.refresh_errors,
+                "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            }
+
+
+player_log_cache = PlayerLogCache(
+    load_player_log,
+    ttl=getattr(settings, "TEMPLE_LOG_CACHE_TTL", 300),
+    stale_ttl=getattr(settings, "TEMPLE_LOG_CACHE_STALE_TTL", 600),
+    max_entries=getattr(settings, "TEMPLE_LOG_CACHE_MAX_ENTRIES", 512),
+    shared=shared_flight_store(getattr(settings, "TEMPLE_LOG_SHARED_DIR", "")),
+)
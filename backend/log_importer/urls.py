@@ -1,10 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('collection-log/', views.handle_collection_log, name='collection_log'),
+    path('collection-log/', views.handle_collection_log_async if settings.ASYNC_COLLECTION_LOG
+         else views.handle_collection_log, name='collection_log'),
+    path('collection-log/async/', views.handle_collection_log_async, name='collection_log_async'),
+    path('collection-log/sync/', views.sync_collection_log, name='collection_log_sync'),
+    path('collection-log/cache-stats/', views.collection_log_cache_stats, name='collection_log_cache_stats'),
     path('get-collection-log/', views.get_collection_log, name='get_collection_log'),
+    path('compare-players/', views.compare_players, name='compare_players'),
     path('get-activities-data/', views.get_activities_data, name='get_activities_data'),
+    path('rank-activities/', views.rank_activities_view, name='rank_activities'),
+    path('rank-players/', views.rank_players_view, name='rank_players'),
+    path('expected-completion/', views.expected_completion_view, name='expected_completion'),
+    path('simulate-completion/', views.simulate_completion_view, name='simulate_completion'),
+    path('plan-route/', views.plan_route_view, name='plan_route'),
+    path('ranking-session/', views.create_ranking_session, name='create_ranking_session'),
+    path('ranking-session/<str:session_id>/', views.ranking_session_view, name='ranking_session'),
     path('get-completion-rates/', views.get_completion_rates, name='get-completion-rates'),
     path('items-json/', views.items_json_view, name='items_json_view'),
+    path('wire-dictionary/', views.wire_dictionary, name='wire_dictionary'),
 ]
@@ -1,10 +1,121 @@
-import os
 import json
-import requests
+import secrets
+import numpy as np
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from django.views.decorators.csrf import csrf_exempt
-from .models import Item, CompletionRate, ActivityMap
+from .models import Player
+from .ranking import rank_activities, next_fastest_item
+from .ranking_sessions import new_session, ranking_sessions
+from .completion import expected_completion_times, simulation_tables
+from .planner import plan_route
+from .batch_ranking import rank_players
+from .simulation import DEFAULT_CHUNK_SIZE, run_simulation, summarize
+from .upstream import player_log_cache, load_player_log_async, UpstreamError, UPSTREAM_UNAVAILABLE
+from .snapshots import load_changes, load_snapshot, normalize_username, obtained_json, player_obtained, with_snapshot_meta
+from .obtained import ObtainedSet, slot_map
+from .static_data import sections_index, items_payload
+from .activity_data import activities_payload, completion_rates_payload
+from .encoding import EncodedCache, JsonResponse, StreamingJsonResponse, dumps
+from .wire import WIRE_FORMATS, compact_log_body, compact_payloads, encode, wire_format
+
+# Encoded sections of recently served snapshots, by snapshot hash: a log only changes
+# when its hash does, so repeat requests skip encoding the section tree. Fresh logs are
+# in snapshots.stored_layout, so a hash reads the same fetched or rebuilt from the DB
+encoded_sections = EncodedCache(settings.ENCODED_LOG_CACHE_SIZE)
+
+def encoded_response(request, payload, max_age=0):
+    """
+    Serves an EncodedPayload: picks the encoding the client accepts and answers
+    304 when If-None-Match already names the current ETag.
+    """
+    encoding, body, etag = payload.negotiate(request.META.get("HTTP_ACCEPT_ENCODING"))
+    if payload.matches(request.META.get("HTTP_IF_NONE_MATCH")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type=payload.content_type)
+        if encoding != "identity":
+            response["Content-Encoding"] = encoding
+    response["ETag"] = etag
+    response["Vary"] = "Accept-Encoding"
+    response["Cache-Control"] = f"public, max-age={max_age}" if max_age else "no-cache"
+    return response
+
+
+def sections_error():
+    """ The 500 response to send when sections.json cannot be loaded, or None. """
+    try:
+        sections_index.get()
+    except Exception as e:
+        return JsonResponse({
+            "status": "error",
+            "message": f"Failed to load sections.json: {str(e)}"
+        }, status=500)
+    return None
+
+
+def format_error(request):
+    """ (wire format, None) for a request, or (None, 406 response) for a format this server can't produce. """
+    try:
+        return wire_format(request), None
+    except ValueError as e:
+        return None, JsonResponse({'status': 'error', 'message': str(e)}, status=406)
+
+
+def with_encoded_sections(body):
+    """ A response body whose data is a stored log, with the log's sections swapped for their cached encoding. """
+    data = body['data']
+    if not data.get('hash'):
+        return body
+    sections = encoded_sections.get((data['hash'], sections_index.digest), data['sections'])
+    return {**body, 'data': {**data, 'sections': sections}}
+
+
+def log_response(body, fmt='json'):
+    """
+    Serves a collection-log response body as plain JSON, or with the log in the
+    compact wire format (compact JSON or MessagePack, see wire.py). Plain JSON is
+    streamed a sub-category at a time with STREAM_LOG_RESPONSES.
+    """
+    if fmt == 'json' and settings.STREAM_LOG_RESPONSES:
+        response = StreamingJsonResponse(body, depth=4)
+    elif fmt == 'json':
+        response = JsonResponse(with_encoded_sections(body), depth=2)
+    else:
+        response = HttpResponse(encode(compact_log_body(body), fmt), content_type=WIRE_FORMATS[fmt])
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def snapshot_response(username, snapshot, cache_status='snapshot', fmt='json'):
+    """ Serves a stored snapshot (from snapshots.load_snapshot) in the collection-log shape. """
+    player_log, player = snapshot
+    return log_response({
+        'status': 'success',
+        'data': {'username': username, **with_snapshot_meta(player_log, player)},
+        'cache': cache_status,
+        'coalesced': 0,
+        'fetchedAt': player.fetched_at.isoformat()
+    }, fmt)
+
+
+def snapshot_fallback(username, fmt='json'):
+    """ The player's last stored snapshot as a response, for when TempleOSRS is unavailable; None if there is none. """
+    snapshot = load_snapshot(username)
+    return snapshot_response(username, snapshot, fmt=fmt) if snapshot is not None else None
+
+
+def collection_log_response(username, player_log, cache_status, coalesced, fmt='json'):
+    final_data = {'username': username, **player_log}
+    return log_response({
+        'status': 'success',
+        'data': final_data,
+        'cache': cache_status,
+        'coalesced': coalesced
+    }, fmt)
+
 
 @csrf_exempt
 def handle_collection_log(request):
@@ -19,98 +130,199 @@ def handle_collection_log(request):
             username = request_data.get('username')
             if not username:
                 return JsonResponse({'status': 'error', 'message': 'Username is required'})
+            fmt, error = format_error(request)
+            if error:
+                return error
 
-            # Construct the API URL and parameters to fetch the full collection log
-            api_url = "https://templeosrs.com/api/collection-log/player_collection_log.php"
-            params = {
-                "player": username,
-                "categories": "all",
-                "includenames": "1",
-                "includemissingitems": "1"
-            }
+            error = sections_error()
+            if error:
+                return error
 
-            response = requests.get(api_url, params=params, timeout=10)
-            if response.status_code != 200:
-                return JsonResponse({
+            # Fetch and regroup the full collection log, reusing a recent result for this
+            # player if cached, or waiting on a fetch for them that is already in progress
+            force_refresh = bool(request_data.get('force_refresh', False))
+            try:
+                player_log, cache_status, coalesced = player_log_cache.get(username, force_refresh=force_refresh)
+            except UpstreamError as e:
+                # TempleOSRS errors out or times out: fall back to the last stored snapshot
+                fallback = snapshot_fallback(username, fmt) if e.status_code >= 500 else None
+                return fallback or JsonResponse({
                     'status': 'error',
-                    'message': f'Failed to fetch data from API. Status code: {response.status_code}'
-                }, status=response.status_code)
-
-            api_json = response.json()
-            # The new API response puts the data under "data"
-            data = api_json.get("data", {})
-            account_type = data.get("accountType", "Unknown")
-
-            # Overall stats from the API response
-            unique_obtained = data.get("total_collections_finished", 0)
-            unique_items = data.get("total_collections_available", 0)
-            # The API returns the items grouped by sub-category (e.g., "abyssal_sire")
-            items_data = data.get("items", {})
-
-            # Load your pre-generated sections mapping (assumed to be in your static directory)
-            sections_path = os.path.join(settings.BASE_DIR, "log_importer", "static", "sections.json")
+                    'message': str(e)
+                }, status=e.status_code)
+            except UPSTREAM_UNAVAILABLE:
+                fallback = snapshot_fallback(username, fmt)
+                if fallback is None:
+                    raise
+                return fallback
+
+            return collection_log_response(username, player_log, cache_status, coalesced, fmt)
+        except Exception as e:
+            return JsonResponse({'status': 'error', 'message': str(e)})
+    return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
+
+
+async def handle_collection_log_async(request):
+    """
+    Async variant of handle_collection_log for ASGI servers: the upstream call is
+    awaited on a pooled keep-alive client, so a worker is not held while it is in flight.
+    """
+    if request.method == 'POST':
+        try:
+            request_data = json.loads(request.body)
+            username = request_data.get('username')
+            if not username:
+                return JsonResponse({'status': 'error', 'message': 'Username is required'})
+            fmt, error = format_error(request)
+            if error:
+                return error
+
+            error = sections_error()
+            if error:
+                return error
+
+            force_refresh = bool(request_data.get('force_refresh', False))
             try:
-                with open(sections_path, "r", encoding="utf-8") as f:
-                    sections_mapping = json.load(f)
-            except Exception as e:
-                return JsonResponse({
-                    "status": "error",
-                    "message": f"Failed to load sections.json: {str(e)}"
-                }, status=500)
-
-            # Build the new structure by grouping sub-categories into your major sections
-            final_sections = {}
-            for major_section, subcats in sections_mapping.items():
-                final_sections[major_section] = {}
-                # For each sub-category in this major section...
-                for subcat, valid_item_ids in subcats.items():
-                    # Retrieve the list of items from the API response (may be empty)
-                    subcat_items = items_data.get(subcat, [])
-                    # Filter the items by validating that the item's id is one we expect
-                    filtered_items = [
-                        item for item in subcat_items
-                        if str(item.get("id")) in valid_item_ids
-                    ]
-                    # Create the sub-category entry with a killCount placeholder
-                    final_sections[major_section][subcat] = {
-                        "items": filtered_items,
-                        "killCount": {"name": "Unknown", "amount": 0}
-                    }
-
-            # Use the order from sections.json as-is (no extra sorting)
-            final_data = {
-                "username": username,
-                "accountType": account_type,
-                "uniqueObtained": unique_obtained,
-                "uniqueItems": unique_items,
-                "sections": final_sections
-            }
+                player_log, cache_status, coalesced = await player_log_cache.aget(
+                    username, load_player_log_async, force_refresh=force_refresh
+                )
+            except UpstreamError as e:
+                fallback = await sync_to_async(snapshot_fallback)(username, fmt) if e.status_code >= 500 else None
+                return fallback or JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=e.status_code)
+            except UPSTREAM_UNAVAILABLE:
+                fallback = await sync_to_async(snapshot_fallback)(username, fmt)
+                if fallback is None:
+                    raise
+                return fallback
 
-            return JsonResponse({'status': 'success', 'data': final_data})
+            return collection_log_response(username, player_log, cache_status, coalesced, fmt)
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)})
     return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
 
 
+# csrf_exempt in Django 4.2 wraps views in a sync function, which would hide the coroutine.
+handle_collection_log_async.csrf_exempt = True
+
+
+@csrf_exempt
+def sync_collection_log(request):
+    """
+    Delta sync for clients that already hold a player's log. The body names the snapshot
+    the client has ({"username", "version", "hash"}); the reply is "unchanged", a
+    "delta" with only the slots changed or added since that version, or "full" when
+    the client's copy is too old (or unknown) to patch.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
+    try:
+        request_data = json.loads(request.body)
+        username = request_data.get('username')
+        if not username:
+            return JsonResponse({'status': 'error', 'message': 'Username is required'})
+        client_version = request_data.get('version')
+        client_hash = request_data.get('hash')
+
+        error = sections_error()
+        if error:
+            return error
+
+        # Refresh the stored snapshot as handle_collection_log would; if TempleOSRS is
+        # unavailable the client is synced against the last stored one instead
+        cache_status = 'snapshot'
+        try:
+            _, cache_status, _ = player_log_cache.get(username, force_refresh=bool(request_data.get('force_refresh', False)))
+        except UpstreamError as e:
+            if e.status_code < 500:
+                return JsonResponse({'status': 'error', 'message': str(e)}, status=e.status_code)
+        except UPSTREAM_UNAVAILABLE:
+            pass
+
+        player = Player.objects.filter(key=normalize_username(username)).first()
+        if player is None or player.fetched_at is None:
+            return JsonResponse({'status': 'error', 'message': 'No stored collection log for this player'}, status=404)
+
+        response = {'status': 'success', 'cache': cache_status, 'version': player.version, 'hash': player.snapshot_hash}
+        if client_hash == player.snapshot_hash or (client_hash is None and client_version == player.version):
+            response['mode'] = 'unchanged'
+        elif isinstance(client_version, int) and player.resync_version <= client_version < player.version:
+            response['mode'] = 'delta'
+            response['data'] = {
+                'username': username,
+                'accountType': player.account_type or 'Unknown',
+                'uniqueObtained': player.unique_obtained,
+                'uniqueItems': player.unique_items,
+                'changes': load_changes(player, client_version),
+                'obtained': obtained_json(player),
+            }
+        else:
+            player_log, player = load_snapshot(username)
+            response['mode'] = 'full'
+            response['data'] = {'username': username, **with_snapshot_meta(player_log, player)}
+            return JsonResponse(with_encoded_sections(response), depth=2)
+        return JsonResponse(response)
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)})
+
+
+def collection_log_cache_stats(request):
+    """ Hit/miss counters for the TempleOSRS player log cache. """
+    return JsonResponse({'status': 'success', 'data': player_log_cache.stats()})
+
+
 def get_collection_log(request):
-    """ Fetches all collection log items and their obtained status. """
-    items = Item.objects.all()
-    data = [{'id': item.id, 'name': item.name, 'obtained': item.obtained} for item in items]
-    return JsonResponse({'status': 'success', 'data': data})
+    """ Serves a player's last stored collection log snapshot straight from the DB, without calling TempleOSRS. """
+    username = request.GET.get('username')
+    if not username:
+        return JsonResponse({'status': 'error', 'message': 'Username is required'})
+    fmt, error = format_error(request)
+    if error:
+        return error
+    snapshot = load_snapshot(username)
+    if snapshot is None:
+        return JsonResponse({'status': 'error', 'message': 'No stored collection log for this player'}, status=404)
+    return snapshot_response(snapshot[1].username, snapshot, cache_status='db', fmt=fmt)
+
+
+def compare_players(request):
+    """
+    Diffs two players' stored collection logs (?a=<name>&b=<name>): the items only
+    one of them has and how many they share, computed on their obtained bitmaps.
+    """
+    names = [request.GET.get('a'), request.GET.get('b')]
+    if not all(names):
+        return JsonResponse({'status': 'error', 'message': 'Both usernames (a, b) are required'})
+    players = {p.key: p for p in Player.objects.filter(key__in=[normalize_username(n) for n in names])}
+    slots = slot_map.get()
+    sets = []
+    for name in names:
+        player = players.get(normalize_username(name))
+        if player is None or player.fetched_at is None:
+            return JsonResponse({'status': 'error', 'message': f'No stored collection log for {name}'}, status=404)
+        sets.append((player, player_obtained(player, slots)))
+
+    (player_a, a), (player_b, b) = sets
+    only_a, only_b = a - b, b - a
+    return JsonResponse({
+        'status': 'success',
+        'data': {
+            'a': {'username': player_a.username, 'obtained': len(a), 'only': only_a.item_ids().tolist()},
+            'b': {'username': player_b.username, 'obtained': len(b), 'only': only_b.item_ids().tolist()},
+            'shared': len(a & b),
+        }
+    })
 
 
 def get_completion_rates(request):
-    """Fetches default completion rates including extra metadata"""
-    try:
-        completion_rates = list(CompletionRate.objects.values(
-            "activity_name", 
-            "completions_per_hour_main", 
-            "completions_per_hour_iron",
-            "extra_time_to_first_completion",
-            "notes",
-            "verification_source"
-        ))
-        return JsonResponse({"status": "success", "data": completion_rates})
+    """
+    Fetches default completion rates including extra metadata.
+    Pre-encoded like get_activities_data, per activities version.
+    """
+    try:
+        return encoded_response(request, completion_rates_payload.get())
     except Exception as e:
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
 
@@ -120,40 +332,379 @@ def get_activities_data(request):
     """
     Returns raw data for each activity. 
     The frontend will perform calculations.
+    The payload is a pre-encoded snapshot rebuilt only when import_completion_rates
+    bumps the activities version; its ETag carries that version.
+    ?format=compact|msgpack (or the matching Accept) serves it in the compact wire
+    format instead, with item slots and activity indexes in place of names.
     """
     if request.method == 'GET':
-        activities = CompletionRate.objects.all()
-        data = []
-        for activity in activities:
-            maps_qs = ActivityMap.objects.filter(completion_rate=activity)
-            maps_data = [
-                {
-                    "item_id": m.item_id,
-                    "item_name": m.item_name,
-                    "drop_rate_attempts": m.drop_rate_attempts,
-                    "neither_inverse": m.neither_inverse,
-                }
-                for m in maps_qs
-            ]
-            data.append({
-                "activity_index": activity.activity_index,
-                "activity_name": activity.activity_name,
-                "completions_per_hour_main": activity.completions_per_hour_main,
-                "completions_per_hour_iron": activity.completions_per_hour_iron,
-                "maps": maps_data
-            })
-        return JsonResponse({"status": "success", "data": data}, safe=False)
+        fmt, error = format_error(request)
+        if error:
+            return error
+        payload = activities_payload.get() if fmt == 'json' else compact_payloads.get("activities", fmt)
+        response = encoded_response(request, payload)
+        patch_vary_headers(response, ['Accept'])
+        return response
     
     return JsonResponse({"status": "error", "message": "Invalid method"}, status=405)
 
 
+def ranking_request(request_data):
+    """
+    Reads the obtained items, is_iron and user_completion_rates of a ranking request
+    body. Returns (obtained, is_iron, user_rates, None), or (None, None, None, error response).
+    """
+    if 'obtained' in request_data:
+        try:
+            obtained = ObtainedSet.from_json(slot_map.get(), request_data['obtained'])
+        except ValueError as e:
+            return None, None, None, JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    else:
+        obtained = request_data.get('completed_items', [])
+        if not isinstance(obtained, list):
+            return None, None, None, JsonResponse({'status': 'error', 'message': 'completed_items must be a list'}, status=400)
+    user_rates = request_data.get('user_completion_rates') or {}
+    if not isinstance(user_rates, dict):
+        return None, None, None, JsonResponse({'status': 'error', 'message': 'user_completion_rates must be an object'}, status=400)
+    return obtained, bool(request_data.get('is_iron', False)), user_rates, None
+
+
+def disabled_activities(value):
+    """
+    Activity names a request turns off, from the frontend's disabledActivities
+    ({name: true}) or a plain list of names. None if the value is neither.
+    """
+    if value is None:
+        return set()
+    if isinstance(value, dict):
+        return {name for name, disabled in value.items() if disabled}
+    if isinstance(value, list) and all(isinstance(name, str) for name in value):
+        return set(value)
+    return None
+
+
+def top_count(value, default=10):
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return default
+
+
+@csrf_exempt
+def rank_activities_view(request):
+    """
+    Computes time to next log slot and the fastest slot for every activity in one pass.
+    Expects {"completed_items": [...], "is_iron": bool, "user_completion_rates": {...}}
+    and returns the same rows the frontend's calculateActivityData builds, fastest first.
+    Instead of completed_items the body may carry the "obtained" bitmap a collection log
+    response includes ({"version": int, "bits": base64}).
+    """
+    if request.method == 'POST':
+        try:
+            request_data = json.loads(request.body or b"{}")
+        except json.JSONDecodeError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+
+        completed_items, is_iron, user_rates, error = ranking_request(request_data)
+        if error:
+            return error
+
+        try:
+            ranked = rank_activities(completed_items, is_iron, user_rates)
+        except Exception as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+        return JsonResponse({
+            'status': 'success',
+            'data': ranked,
+            'next_fastest_item': next_fastest_item(ranked),
+        })
+
+    return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
+
+
+@csrf_exempt
+def rank_players_view(request):
+    """
+    Top activities for many players in one request, e.g. a whole clan. Takes
+    {"usernames": [...], "top": 10, "is_iron": bool (default: each player's account type),
+    "user_completion_rates": {...}, "disabled_activities": {...}} and streams
+    newline-delimited JSON: one line per player as their log is loaded and scored,
+    then a summary line.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
+    try:
+        request_data = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+
+    usernames = request_data.get('usernames')
+    if not isinstance(usernames, list) or not usernames or not all(isinstance(u, str) and u.strip() for u in usernames):
+        return JsonResponse({'status': 'error', 'message': 'usernames must be a non-empty list of names'}, status=400)
+    if len(usernames) > settings.BATCH_RANKING_MAX_PLAYERS:
+        return JsonResponse({'status': 'error', 'message': (
+            f'At most {settings.BATCH_RANKING_MAX_PLAYERS} usernames per request'
+        )}, status=400)
+    user_rates = request_data.get('user_completion_rates') or {}
+    if not isinstance(user_rates, dict):
+        return JsonResponse({'status': 'error', 'message': 'user_completion_rates must be an object'}, status=400)
+    disabled = disabled_activities(request_data.get('disabled_activities'))
+    if disabled is None:
+        return JsonResponse({'status': 'error', 'message': 'disabled_activities must be an object or a list'}, status=400)
+    error = sections_error()
+    if error:
+        return error
+    is_iron = request_data.get('is_iron')
+    is_iron = bool(is_iron) if is_iron is not None else None
+
+    def stream():
+        players = errors = 0
+        for result in rank_players(usernames, is_iron, user_rates, disabled, top_count(request_data.get('top')),
+                                   settings.BATCH_RANKING_CONCURRENCY):
+            players += 1
+            errors += result['status'] == 'error'
+            yield dumps(result) + b'\n'
+        yield dumps({'status': 'done', 'players': players, 'errors': errors}) + b'\n'
+
+    return StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+
+
+@csrf_exempt
+def expected_completion_view(request):
+    """
+    Expected hours to finish every missing slot of each activity (not just the next
+    one), for the same body rank-activities takes. total_hours sums the activities
+    with a known rate; slots shared between activities count once per activity.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
+    try:
+        request_data = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+
+    completed_items, is_iron, user_rates, error = ranking_request(request_data)
+    if error:
+        return error
+    try:
+        rows = expected_completion_times(completed_items, is_iron, user_rates)
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+    return JsonResponse({
+        'status': 'success',
+        'data': rows,
+        'total_hours': sum(row['expected_hours'] or 0.0 for row in rows),
+    })
+
+
+@csrf_exempt
+def simulate_completion_view(request):
+    """
+    Monte Carlo estimate of the hours to the next 1..target_slots new slots when always
+    doing the activity rank-activities puts first. Takes the rank-activities body plus
+    "target_slots", "trials", "seed", "percentiles" and "disabled_activities", and
+    streams newline-delimited JSON: a progress line per finished chunk of trials, then
+    the summary. The same seed always gives the same summary.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
+    try:
+        request_data = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+
+    completed_items, is_iron, user_rates, error = ranking_request(request_data)
+    if error:
+        return error
+    disabled = disabled_activities(request_data.get('disabled_activities'))
+    if disabled is None:
+        return JsonResponse({'status': 'error', 'message': 'disabled_activities must be an object or a list'}, status=400)
+    try:
+        target = int(request_data.get('target_slots', 50))
+        trials = int(request_data.get('trials', 2000))
+        seed = int(request_data['seed']) if request_data.get('seed') is not None else secrets.randbits(32)
+        percentiles = [float(p) for p in request_data.get('percentiles', [50, 90])]
+    except (TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'target_slots, trials, seed and percentiles must be numbers'}, status=400)
+    if not 1 <= target <= settings.SIMULATION_MAX_SLOTS or not 1 <= trials <= settings.SIMULATION_MAX_TRIALS:
+        return JsonResponse({'status': 'error', 'message': (
+            f'target_slots must be 1-{settings.SIMULATION_MAX_SLOTS} and trials 1-{settings.SIMULATION_MAX_TRIALS}'
+        )}, status=400)
+    if seed < 0 or not all(0 <= p <= 100 for p in percentiles):
+        return JsonResponse({'status': 'error', 'message': 'seed must be positive and percentiles 0-100'}, status=400)
+
+    try:
+        tables = simulation_tables(completed_items, is_iron, user_rates, disabled)
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+    def stream():
+        chunks, done = {}, 0
+        for index, hours in run_simulation(tables, target, trials, DEFAULT_CHUNK_SIZE, settings.SIMULATION_WORKERS, seed):
+            chunks[index] = hours
+            done += len(hours)
+            yield dumps({'status': 'progress', 'done': done, 'trials': trials}) + b'\n'
+        # Chunks are stacked in seed order, whichever worker finished first
+        hours = np.concatenate([chunks[index] for index in sorted(chunks)])
+        yield dumps({
+            'status': 'success',
+            'seed': seed,
+            'trials': trials,
+            'data': summarize(hours, percentiles),
+        }) + b'\n'
+
+    return StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+
+
+@csrf_exempt
+def plan_route_view(request):
+    """
+    Ordered schedule of activities and target items to reach "target_slots" new slots
+    or spend "max_hours" (either or both), taking the fastest activity at each step.
+    Takes the rank-activities body plus those and "disabled_activities".
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
+    try:
+        request_data = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+
+    completed_items, is_iron, user_rates, error = ranking_request(request_data)
+    if error:
+        return error
+    disabled = disabled_activities(request_data.get('disabled_activities'))
+    if disabled is None:
+        return JsonResponse({'status': 'error', 'message': 'disabled_activities must be an object or a list'}, status=400)
+    try:
+        target = request_data.get('target_slots')
+        target = int(target) if target is not None else None
+        max_hours = request_data.get('max_hours')
+        max_hours = float(max_hours) if max_hours is not None else None
+    except (TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'target_slots and max_hours must be numbers'}, status=400)
+    if target is None and max_hours is None:
+        return JsonResponse({'status': 'error', 'message': 'target_slots or max_hours is required'}, status=400)
+
+    try:
+        plan = plan_route(completed_items, is_iron, user_rates, disabled,
+                          target_slots=target, max_hours=max_hours, max_steps=settings.PLAN_MAX_STEPS)
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+    return JsonResponse({
+        'status': 'success',
+        'data': plan,
+        'slots': len(plan),
+        'total_hours': plan[-1]['total_hours'] if plan else 0.0,
+    })
+
+
+@csrf_exempt
+def create_ranking_session(request):
+    """
+    Starts a ranking session for a client that ticks items off one at a time. Takes
+    the rank-activities body plus an optional "top" (default 10) and returns the
+    session id with the top activities. Sessions live in this process's memory.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
+    try:
+        request_data = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+
+    completed_items, is_iron, user_rates, error = ranking_request(request_data)
+    if error:
+        return error
+    try:
+        session = new_session(completed_items, is_iron, user_rates)
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+    session_id = ranking_sessions.create(session)
+    top = session.top(top_count(request_data.get('top')))
+    return JsonResponse({
+        'status': 'success',
+        'session': session_id,
+        'data': top,
+        'next_fastest_item': next_fastest_item(top),
+    })
+
+
+@csrf_exempt
+def ranking_session_view(request, session_id):
+    """
+    GET returns the session's top activities (?top=N); POST marks items obtained with
+    {"item_ids": [...], "obtained": true} (false unticks them) and returns the activities
+    that changed plus the new top; DELETE ends the session.
+    """
+    session = ranking_sessions.get(session_id)
+    if session is None:
+        return JsonResponse({'status': 'error', 'message': 'Unknown or expired ranking session'}, status=404)
+
+    if request.method == 'DELETE':
+        ranking_sessions.delete(session_id)
+        return JsonResponse({'status': 'success'})
+
+    if request.method == 'GET':
+        with session.lock:
+            session.refresh()
+            top = session.top(top_count(request.GET.get('top')))
+        return JsonResponse({'status': 'success', 'data': top, 'next_fastest_item': next_fastest_item(top)})
+
+    if request.method == 'POST':
+        try:
+            request_data = json.loads(request.body or b"{}")
+        except json.JSONDecodeError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+        item_ids = request_data.get('item_ids')
+        if item_ids is None and 'item_id' in request_data:
+            item_ids = [request_data['item_id']]
+        try:
+            item_ids = [int(item_id) for item_id in item_ids]
+        except (TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'item_ids must be a list of item ids'}, status=400)
+
+        with session.lock:
+            session.refresh()
+            changed = session.obtain(item_ids, bool(request_data.get('obtained', True)))
+            top = session.top(top_count(request_data.get('top')))
+            changed = [session.result(i) for i in changed]
+        return JsonResponse({
+            'status': 'success',
+            'changed': changed,
+            'data': top,
+            'next_fastest_item': next_fastest_item(top),
+        })
+
+    return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
+
+
 def items_json_view(request):
-    json_path = os.path.join(settings.BASE_DIR, "log_importer", "static", "items.json")
+    """
+    Serves items.json from pre-encoded bytes (gzip/brotli when accepted) with a
+    strong ETag, answering 304 when the client already holds the current version.
+    """
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return JsonResponse(data, safe=True)
+        payload = items_payload.get()
     except FileNotFoundError:
         return JsonResponse({"error": "items.json not found"}, status=404)
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON format in items.json"}, status=500)
+
+    return encoded_response(request, payload, max_age=settings.ITEMS_JSON_MAX_AGE)
+
+
+def wire_dictionary(request):
+    """
+    What the compact wire format's integer ids refer to: per item slot the item id,
+    name, image and wiki URL, and per activity_index the activity name. Changes only
+    with items.json, item_slots.json and the activities data, so clients cache it
+    through its ETag. JSON, or MessagePack with ?format=msgpack.
+    """
+    fmt, error = format_error(request)
+    if error:
+        return error
+    response = encoded_response(request, compact_payloads.get("dictionary", "msgpack" if fmt == "msgpack" else "compact"),
+                                max_age=settings.ITEMS_JSON_MAX_AGE)
+    patch_vary_headers(response, ['Accept'])
+    return response
@@ -0,0 +1,205 @@
+import json
+import threading
+from .activity_data import ACTIVITIES, build_activities_data, data_version
+from .encoding import dumps
+from .obtained import slot_map
+from .static_data import EncodedPayload, WatchedFile
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; the compact format is also served as JSON
+    msgpack = None
+
+COMPACT_FORMAT = "compact-v1"
+COMPACT_JSON_TYPE = "application/vnd.collectionlog.compact+json"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+# ?format= values, and what each is served as
+WIRE_FORMATS = {"json": "application/json", "compact": COMPACT_JSON_TYPE, "msgpack": MSGPACK_TYPES[0]}
+
+items_index = WatchedFile("items.json", json.loads)
+
+
+def wire_format(request):
+    """
+    The representation a request asks for: "json" (the default), "compact"
+    (columnar JSON) or "msgpack" (the compact form in MessagePack). ?format= wins
+    over Accept; raises ValueError for an unknown ?format= or msgpack without the
+    library. Accept only picks msgpack when it is installed.
+    """
+    requested = request.GET.get("format")
+    if requested:
+        if requested not in WIRE_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(WIRE_FORMATS)}")
+        if requested == "msgpack" and msgpack is None:
+            raise ValueError("MessagePack is not available on this server")
+        return requested
+    accept = request.META.get("HTTP_ACCEPT", "")
+    media_types = {part.split(";")[0].strip().lower() for part in accept.split(",")}
+    if msgpack is not None and not media_types.isdisjoint(MSGPACK_TYPES):
+        return "msgpack"
+    if COMPACT_JSON_TYPE in media_types:
+        return "compact"
+    return "json"
+
+
+def encode(data, fmt):
+    """ A compact document as body bytes in "compact" (JSON) or "msgpack" form. """
+    if fmt == "msgpack":
+        return msgpack.packb(data, use_bin_type=True)
+    return dumps(data)
+
+
+def compact_log_body(body):
+    """ A collection-log response body ({"status", "data": log, ...}) with its log in compact form. """
+    return {**body, "data": compact_player_log(body["data"])}
+
+
+def encoded_payload(data, fmt, tag=None):
+    """ A cached EncodedPayload of a compact document in "compact" or "msgpack" form. """
+    return EncodedPayload(data, tag=tag, serialize=lambda d: encode(d, fmt), content_type=WIRE_FORMATS[fmt])
+
+
+def item_slot_column(item_ids, slots):
+    """
+    The SlotMap slot of each id; an id without a slot is written as its negation
+    (ids are positive), so the column stays lossless.
+    """
+    found = slots.slots(item_ids)
+    return [slot if slot >= 0 else -int(item_id) for slot, item_id in zip(found.tolist(), item_ids)]
+
+
+def compact_player_log(player_log, slots=None):
+    """
+    A regrouped player log in columnar form. Every sub-category becomes
+    [name, kill count name, kill count, slots, counts, dates], the item names and
+    other per-item strings being left to the dictionary. Everything else in the
+    log (username, accountType, version, hash, obtained, ...) is kept as is.
+    """
+    slots = slots or slot_map.get()
+    compact = {key: value for key, value in player_log.items() if key != "sections"}
+    compact["format"] = COMPACT_FORMAT
+    compact["slots_version"] = slots.version
+    sections = []
+    for major_section, subcats in player_log["sections"].items():
+        entries = []
+        for subcat, entry in subcats.items():
+            items = entry["items"]
+            kill_count = entry.get("killCount") or {}
+            entries.append([
+                subcat,
+                kill_count.get("name"),
+                kill_count.get("amount"),
+                item_slot_column([int(item["id"]) for item in items], slots),
+                [item.get("count") or 0 for item in items],
+                [item.get("date") for item in items],
+            ])
+        sections.append([major_section, entries])
+    compact["sections"] = sections
+    return compact
+
+
+def expand_player_log(compact, dictionary):
+    """ Inverse of compact_player_log, with item names taken from the dictionary. """
+    item_ids = dictionary["items"]["ids"]
+    names = dictionary["items"]["names"]
+    player_log = {key: value for key, value in compact.items() if key not in ("sections", "format", "slots_version")}
+    sections = {}
+    for major_section, entries in compact["sections"]:
+        subcats = sections[major_section] = {}
+        for subcat, kill_count_name, kill_count, slot_column, counts, dates in entries:
+            items = []
+            for slot, count, date in zip(slot_column, counts, dates):
+                item_id = item_ids[slot] if slot >= 0 else -slot
+                items.append({"id": item_id, "name": names[slot] if slot >= 0 else str(item_id),
+                              "count": count, "date": date})
+            subcats[subcat] = {"items": items, "killCount": {"name": kill_count_name, "amount": kill_count}}
+    player_log["sections"] = sections
+    return player_log
+
+
+def compact_activities(activities, slots=None):
+    """
+    get_activities_data rows as columns: per activity its index, rates and CSR
+    offsets into the map columns (activity i owns maps offsets[i]:offsets[i + 1]);
+    per map row its item slot and drop rates. Names are in the dictionary.
+    """
+    slots = slots or slot_map.get()
+    offsets = [0]
+    maps = [m for activity in activities for m in activity["maps"]]
+    for activity in activities:
+        offsets.append(offsets[-1] + len(activity["maps"]))
+    return {
+        "format": COMPACT_FORMAT,
+        "slots_version": slots.version,
+        "activities": {
+            "activity_index": [a["activity_index"] for a in activities],
+            "completions_per_hour_main": [a["completions_per_hour_main"] for a in activities],
+            "completions_per_hour_iron": [a["completions_per_hour_iron"] for a in activities],
+            "map_offsets": offsets,
+        },
+        "maps": {
+            "slot": item_slot_column([int(m["item_id"]) for m in maps], slots),
+            "drop_rate_attempts": [m["drop_rate_attempts"] for m in maps],
+            "neither_inverse": [m["neither_inverse"] for m in maps],
+        },
+    }
+
+
+def build_dictionary(slots, items, activities):
+    """
+    What the compact ids refer to: per slot the item id, name, image and wiki URL
+    (from items.json), and per activity_index the activity name.
+    """
+    by_id = {int(item["id"]): item for item in items.values()}
+    ids = slots.item_ids.tolist()
+    return {
+        "status": "success",
+        "format": COMPACT_FORMAT,
+        "slots_version": slots.version,
+        "items": {
+            "ids": ids,
+            "names": [by_id.get(item_id, {}).get("name") for item_id in ids],
+            "image_urls": [by_id.get(item_id, {}).get("imageUrl") for item_id in ids],
+            "wiki_urls": [by_id.get(item_id, {}).get("wikiPageUrl") for item_id in ids],
+        },
+        "activities": {
+            "activity_index": [a["activity_index"] for a in activities],
+            "names": [a["activity_name"] for a in activities],
+        },
+    }
+
+
+class CompactPayloads:
+    """
+    Encoded compact documents, per wire format, that only change with their
+    sources: the dictionary (items.json, item_slots.json, activities version) and
+    the compact activities (item_slots.json, activities version).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sources = None
+        self._payloads = {}
+
+    def get(self, name, fmt):
+        sources = (slot_map.get(), items_index.get(), data_version(ACTIVITIES))
+        with self._lock:
+            if self._sources is None or any(a is not b and a != b for a, b in zip(sources, self._sources)):
+                self._sources = sources
+                self._payloads = {}
+            payload = self._payloads.get((name, fmt))
+        if payload is None:
+            slots, items, version = sources
+            activities = build_activities_data()
+            if name == "dictionary":
+                payload = encoded_payload(build_dictionary(slots, items, activities), fmt)
+            else:
+                data = {"status": "success", "data": compact_activities(activities, slots)}
+                payload = encoded_payload(data, fmt, tag=f"activities-v{version}-s{slots.version}-{fmt}")
+            with self._lock:
+                if self._sources is sources:
+                    self._payloads[(name, fmt)] = payload
+        return payload
+
+
+compact_payloads = CompactPayloads()
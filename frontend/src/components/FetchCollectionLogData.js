@@ -252,12 +252,45 @@ function FetchCollectionLogData({ onUploadComplete }) {
     }
   };
 
+  // Apply a sync response to the stored log: "delta" only carries the changed slots
+  const applySyncResponse = (saved, sync) => {
+    if (sync.mode === 'full') return sync.data;
+    const logData = JSON.parse(JSON.stringify(saved));
+    logData.version = sync.version;
+    logData.hash = sync.hash;
+    if (sync.mode === 'delta') {
+      const { changes, ...summary } = sync.data;
+      Object.assign(logData, summary);
+      Object.entries(changes).forEach(([section, subsections]) => {
+        Object.entries(subsections).forEach(([subsection, slots]) => {
+          const items = logData.sections[section][subsection].items;
+          slots.forEach(({ index, item }) => { items[index] = item; });
+        });
+      });
+    }
+    return logData;
+  };
+
   // .net API fetch for username-based data
   const handleFetchUserData = () => {
     if (!username.trim()) {
       setUploadStatus('Please enter a username.');
       return;
     }
+    // Refreshing the player we already hold: only ask for what changed since our snapshot
+    if (savedLogData?.version && savedLogData.username?.toLowerCase() === username.trim().toLowerCase()) {
+      fetch(`${BACKEND_URL}/log_importer/collection-log/sync/`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ username, version: savedLogData.version, hash: savedLogData.hash }),
+      })
+        .then(response => response.json())
+        .then(sync => processFetchedLogData(
+          sync.status === 'success' ? { status: 'success', data: applySyncResponse(savedLogData, sync) } : sync
+        ))
+        .catch(error => setUploadStatus(`Error fetching data: ${error}`));
+      return;
+    }
     fetch(`${BACKEND_URL}/log_importer/collection-log/`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },